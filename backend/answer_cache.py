@@ -0,0 +1,115 @@
+# answer_cache.py
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from telemetry import debug, span
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "question", "answer", "sources", "created_at")
+
+    def __init__(self, scope, vector, question, answer, sources):
+        self.scope = scope
+        self.vector = vector
+        self.question = question
+        self.answer = answer
+        self.sources = sources
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by document scope and matched by question meaning: a new question reuses a cached
+    answer when its embedding's cosine similarity to a cached question in the same scope clears
+    `threshold`. Entries expire after `ttl_seconds` and the least recently used are evicted past `max_entries`.
+    """
+
+    def __init__(self, embeddings: Embeddings, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope_key(doc_ids: Iterable[str]) -> Tuple[str, ...]:
+        return tuple(sorted(doc_ids))
+
+    def embed_question(self, question: str) -> np.ndarray:
+        with span("query_embed"):
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_questions(self, questions: List[str]) -> np.ndarray:
+        """Normalized embeddings for several questions in one forward pass (rows match embed_question)."""
+        with span("query_embed"):
+            vectors = np.asarray(self.embeddings.embed_documents(list(questions)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def lookup(self, doc_ids: Iterable[str], question: str,
+               vector: Optional[np.ndarray] = None) -> Optional[Tuple[str, List[Document], float]]:
+        """Returns (answer, sources, similarity) for the closest cached question, or None."""
+        scope = self.scope_key(doc_ids)
+        with self._lock:
+            self._expire()
+            candidates = [(entry_id, e) for entry_id, e in self._entries.items() if e.scope == scope]
+        if not candidates:
+            self.misses += 1
+            return None
+        vector = self.embed_question(question) if vector is None else vector
+        similarities = np.stack([e.vector for _, e in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        entry_id, entry = candidates[best]
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+        self.hits += 1
+        debug(f"[Answer Cache] Hit ({similarities[best]:.3f}) for '{question}' via '{entry.question}'.")
+        return entry.answer, entry.sources, float(similarities[best])
+
+    def store(self, doc_ids: Iterable[str], question: str, answer: str, sources: List[Document],
+              vector: Optional[np.ndarray] = None) -> None:
+        vector = self.embed_question(question) if vector is None else vector
+        with self._lock:
+            self._entries[next(self._ids)] = _Entry(self.scope_key(doc_ids), vector, question, answer, sources)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: Optional[str] = None) -> int:
+        """Drop entries whose scope includes `doc_id` (all entries when None)."""
+        with self._lock:
+            stale = [i for i, e in self._entries.items() if doc_id is None or doc_id in e.scope]
+            for entry_id in stale:
+                del self._entries[entry_id]
+        if stale:
+            debug(f"[Answer Cache] Invalidated {len(stale)} entries.")
+        return len(stale)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [i for i, e in self._entries.items() if e.created_at < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
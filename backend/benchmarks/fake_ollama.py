@@ -0,0 +1,130 @@
+# fake_ollama.py
+# Local stand-in for the Ollama HTTP API, so benchmarks measure our pipeline rather than a model.
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+CHARS_PER_TOKEN = 4 # For the prompt_eval_count the stand-in reports
+
+# Canned extraction answer; each call only returns the fields its prompt asked for
+EXTRACTION_FIELDS = {
+    "issuing_agency": "Department of Benchmark Services",
+    "solicitation_number": "RFP-BENCH-001",
+    "submission_details": {"deadline_date": "2025-03-14", "deadline_time": "14:00 CT",
+                           "submission_method": "Electronic submission via the procurement portal"},
+    "formatting_requirements": {"page_limits": [{"section": "technical volume", "page_limit": 30}],
+                                "font_details": "Times New Roman 12pt", "line_spacing": "single",
+                                "required_sections": ["Table of Contents", "Executive Summary"]},
+    "eligibility_criteria": [{"requirement_type": "Registration", "details": "Active SAM.gov registration",
+                              "is_mandatory": True}],
+}
+FIELDS_PATTERN = re.compile(r"Fields to extract: (.*)")
+
+
+class FakeOllamaServer:
+    """
+    Serves /api/generate (streamed NDJSON or a single JSON object, like Ollama) with configurable latency:
+    `prompt_ms_per_1k_chars` before the first token and `token_latency_ms` per generated token.
+    Extraction prompts get a valid JSON answer; RAG prompts get `answer_tokens` words of filler.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_latency_ms: float = 5.0,
+                 prompt_ms_per_1k_chars: float = 2.0, answer_tokens: int = 48):
+        self.token_latency_ms = token_latency_ms
+        self.prompt_ms_per_1k_chars = prompt_ms_per_1k_chars
+        self.answer_tokens = answer_tokens
+        self.stats = {"requests": 0, "prompt_chars": 0, "completion_tokens": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def response_tokens(self, prompt: str) -> List[str]:
+        match = FIELDS_PATTERN.search(prompt)
+        if match:
+            fields = [f.strip() for f in match.group(1).split(",")]
+            answer = {f: EXTRACTION_FIELDS[f] for f in fields if f in EXTRACTION_FIELDS}
+            text = json.dumps(answer) + "\n```"
+            # Roughly token-sized pieces so streaming latency scales with the answer length
+            return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+        return [f"token{i} " for i in range(self.answer_tokens)]
+
+    def _record(self, prompt_chars: int, completion_tokens: int) -> None:
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_chars"] += prompt_chars
+            self.stats["completion_tokens"] += completion_tokens
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args): # Keep benchmark output clean
+                pass
+
+            def _send_json(self, status: int, payload: Dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": "fake:latest"}]})
+                else:
+                    self._send_json(200, {"status": "Ollama is running"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": f"unsupported endpoint {self.path}"})
+                    return
+                prompt = request.get("prompt") or ""
+                tokens = server.response_tokens(prompt)
+                server._record(len(prompt), len(tokens))
+                time.sleep(server.prompt_ms_per_1k_chars * len(prompt) / 1000 / 1000)
+                final = {"model": request.get("model"), "done": True, "response": "",
+                         "prompt_eval_count": len(prompt) // CHARS_PER_TOKEN, "eval_count": len(tokens)}
+
+                if request.get("stream") is False:
+                    time.sleep(server.token_latency_ms * len(tokens) / 1000)
+                    self._send_json(200, {**final, "response": "".join(tokens)})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(server.token_latency_ms / 1000)
+                    self._write_chunk({"model": request.get("model"), "response": token, "done": False})
+                self._write_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, payload: Dict) -> None:
+                line = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
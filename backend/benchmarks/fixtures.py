@@ -0,0 +1,114 @@
+# fixtures.py
+# Benchmark documents: the sample RFPs in uploads/ plus deterministic synthetic RFPs of any page count.
+import random
+from pathlib import Path
+from typing import List
+
+UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
+
+LINES_PER_PAGE = 48
+LINE_WIDTH = 95
+
+_VOCABULARY = (
+    "contractor shall provide services support system data management staff training report schedule "
+    "quality assurance county department program project deliverable milestone maintenance network security "
+    "compliance review approval invoice payment warranty license software hardware installation facility "
+    "operations emergency response coordination documentation performance standard requirement vendor "
+    "proposal evaluation criteria award contract period renewal option scope task personnel supervisor"
+).split()
+
+_SECTION_TEMPLATES = {
+    "submission": [
+        "Proposals are due no later than {month} {day}, 2025 at {hour}:00 PM Central Time.",
+        "Submit proposals electronically via the procurement portal; late submissions will not be considered.",
+        "The closing date for questions is {month} {qday}, 2025.",
+    ],
+    "formatting": [
+        "The technical proposal shall not exceed {pages} pages, excluding appendices.",
+        "Use Times New Roman {font}pt font with single line spacing and one-inch margins.",
+        "Include a Table of Contents and an Executive Summary.",
+    ],
+    "eligibility": [
+        "Offerors must be registered in SAM.gov and hold a current state business license.",
+        "Offerors must demonstrate a minimum of {years} years of experience with similar programs.",
+        "Proof of insurance with $1,000,000 general liability coverage is required.",
+    ],
+}
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October"]
+
+
+def upload_fixtures() -> List[Path]:
+    return sorted(UPLOADS_DIR.glob("*.pdf"))
+
+
+def _prose_line(rng: random.Random) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < LINE_WIDTH - 12:
+        words.append(rng.choice(_VOCABULARY))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_rfp_pages(page_count: int, seed: int = 0) -> List[List[str]]:
+    """
+    Text lines per page for a synthetic RFP: a cover page, then mostly scope-of-work prose and pricing
+    tables, with submission, formatting and eligibility clauses sprinkled in like a real solicitation.
+    """
+    rng = random.Random(seed)
+    pages = [[
+        "REQUEST FOR PROPOSALS", f"Solicitation No. RFP-{seed:04d}-{page_count}",
+        "Issued by the Department of Benchmark Services", "",
+    ] + [_prose_line(rng) for _ in range(LINES_PER_PAGE - 4)]]
+    for page_number in range(1, page_count):
+        lines = [f"RFP-{seed:04d}-{page_count}   Page {page_number + 1} of {page_count}", ""]
+        if page_number % 7 == 3:
+            lines.append("PRICING SCHEDULE")
+            lines += [f"Item {rng.randint(100, 999)}  {rng.choice(_VOCABULARY)} {rng.choice(_VOCABULARY)}  "
+                      f"${rng.randint(50, 9000)}.00" for _ in range(LINES_PER_PAGE - 3)]
+        else:
+            while len(lines) < LINES_PER_PAGE:
+                if rng.random() < 0.03:
+                    section = rng.choice(list(_SECTION_TEMPLATES))
+                    lines.append(rng.choice(_SECTION_TEMPLATES[section]).format(
+                        month=rng.choice(_MONTHS), day=rng.randint(1, 28), qday=rng.randint(1, 28),
+                        hour=rng.randint(1, 4), pages=rng.choice([20, 25, 30, 40]), font=rng.choice([11, 12]),
+                        years=rng.randint(3, 10)))
+                else:
+                    lines.append(_prose_line(rng))
+        pages.append(lines)
+    return pages
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(pages: List[List[str]], path: Path) -> Path:
+    """Minimal PDF (Helvetica, one text stream per page) that pypdf extracts line by line."""
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, lines in zip(page_ids, pages):
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {page_id + 1} 0 R >>".encode())
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length " + str(len(data)).encode() + b" >>\nstream\n" + data + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+    return path
+
+
+def synthetic_fixture(page_count: int, directory: Path, seed: int = 0) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    return write_text_pdf(synthetic_rfp_pages(page_count, seed), directory / f"synthetic_rfp_{page_count}p.pdf")
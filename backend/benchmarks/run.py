@@ -0,0 +1,268 @@
+# run.py
+# Offline benchmark: ingestion throughput, query latency percentiles, structured extraction wall time and
+# peak RSS, against a local fake Ollama. Run from backend/:
+#   python -m benchmarks.run --synthetic-pages 50,200 --queries 40 --output bench.json
+#   python -m benchmarks.run --compare bench.json   # rerun and print changes against a previous result
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.fixtures import synthetic_fixture, upload_fixtures
+
+# A compliance-checklist style question set; cycled to reach --queries
+CHECKLIST = [
+    "What is the proposal submission deadline?",
+    "How must proposals be submitted?",
+    "Who is the issuing agency?",
+    "What is the solicitation number?",
+    "What is the page limit for the technical proposal?",
+    "What font and font size are required?",
+    "What line spacing is required?",
+    "Which sections must the proposal include?",
+    "What certifications are required of offerors?",
+    "Is SAM.gov registration required?",
+    "What insurance coverage is required?",
+    "How many years of experience are required?",
+    "What is the contract period and are there renewal options?",
+    "How will proposals be evaluated?",
+    "Is there a pre-proposal conference?",
+    "What is the deadline for questions?",
+    "What pricing information must be submitted?",
+    "Are there small business participation requirements?",
+    "What are the invoicing and payment terms?",
+    "What reports must the contractor deliver?",
+]
+
+
+def log(message: str) -> None:
+    # stdout belongs to the application's own logging; progress goes to stderr
+    print(f"[Bench] {message}", file=sys.stderr, flush=True)
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic feature-hashing embeddings, to benchmark the pipeline without the transformer model."""
+
+    def __init__(self, size: int = 768, **kwargs): # Accepts (and ignores) HuggingFaceEmbeddings arguments
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(token.encode()).hexdigest()[:8], 16) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 / 1024 / 1024 if sys.platform == "darwin" else 1 / 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {"count": len(samples_ms), "mean_ms": round(float(np.mean(samples_ms)), 2), "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2), "max_ms": round(float(max(samples_ms)), 2)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def configure_environment(work_dir: Path, base_url: str, reranker: str) -> None:
+    """Point every cache and the Ollama client at throwaway locations; must run before importing rag."""
+    for name, sub in (("CORPUS_DIR", "corpus"), ("INGEST_CACHE_DIR", "ingest"), ("DENSE_INDEX_DIR", "dense"),
+                      ("RAG_SPILL_DIR", "instances"), ("ANALYSIS_CACHE_DIR", "analysis")):
+        os.environ[name] = str(work_dir / sub)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    os.environ["RERANKER_BACKEND"] = reranker
+    os.environ["ANSWER_CACHE_THRESHOLD"] = "2" # Cosine never reaches 2: every query does the full work
+
+
+def bench_ingest(rag, path: Path) -> Dict:
+    system = rag.base_system.spawn()
+    started = time.perf_counter()
+    system.load_single_document(str(path), executor=rag.job_manager.process_pool)
+    loaded = time.perf_counter()
+    system.setup_retrievers()
+    system.setup_rag()
+    finished = time.perf_counter()
+    pages, chunks, total_s = len(system.documents), len(system.splits), finished - started
+    return {
+        "system": system,
+        "result": {
+            "fixture": path.name, "pages": pages, "chunks": chunks,
+            "parse_embed_s": round(loaded - started, 3), "index_s": round(finished - loaded, 3),
+            "total_s": round(total_s, 3), "pages_per_s": round(pages / total_s, 2),
+            "chunks_per_s": round(chunks / total_s, 2), "ingest_stats": system.ingest_stats,
+        },
+    }
+
+
+def bench_queries(system, queries: int, batch: bool) -> Dict:
+    questions = [CHECKLIST[i % len(CHECKLIST)] for i in range(queries)]
+    retrieval_ms, query_ms = [], []
+    for question in questions:
+        started = time.perf_counter()
+        system.retrieve(question)
+        retrieval_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        system.query(question)
+        query_ms.append((time.perf_counter() - started) * 1000)
+    result = {"retrieval": percentiles(retrieval_ms), "query": percentiles(query_ms)}
+    if batch:
+        started = time.perf_counter()
+        _, timings = system.query_batch(list(CHECKLIST))
+        result["batch"] = {"questions": len(CHECKLIST), "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+                           "timings": timings}
+    return result
+
+
+def bench_extraction(analysis, system) -> Dict:
+    started = time.perf_counter()
+    result = analysis.extract_structured_rfp_data(system.full_text, use_cache=False, embeddings=system.embeddings)
+    return {"wall_s": round(time.perf_counter() - started, 3), "error": result.get("error"),
+            "extraction_stats": result.get("extraction_stats")}
+
+
+def flatten(node, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves keyed by path; list items are keyed by their fixture name."""
+    flat = {}
+    if isinstance(node, dict):
+        for key, value in node.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(node, list):
+        for i, value in enumerate(node):
+            label = value.get("fixture", i) if isinstance(value, dict) else i
+            flat.update(flatten(value, f"{prefix}[{label}]"))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        flat[prefix] = float(node)
+    return flat
+
+
+def compare(current: Dict, baseline: Dict) -> List[Dict]:
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    rows = []
+    for key in sorted(now.keys() & before.keys()):
+        if before[key]:
+            rows.append({"metric": key, "baseline": before[key], "current": now[key],
+                         "change_pct": round((now[key] - before[key]) / abs(before[key]) * 100, 1)})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Offline ingestion/query/extraction benchmark.")
+    parser.add_argument("--fixtures", default="uploads,synthetic", help="Comma list of: uploads, synthetic")
+    parser.add_argument("--synthetic-pages", default="50,200", help="Page counts of the synthetic RFPs")
+    parser.add_argument("--queries", type=int, default=40, help="Queries per document")
+    parser.add_argument("--no-batch", action="store_true", help="Skip the /query/batch measurement")
+    parser.add_argument("--no-extraction", action="store_true", help="Skip structured extraction")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0, help="Fake Ollama per-token latency")
+    parser.add_argument("--prompt-ms-per-1k-chars", type=float, default=2.0, help="Fake Ollama prompt processing cost")
+    parser.add_argument("--embeddings", choices=["hf", "hash"], default="hf",
+                        help="hf = the real sentence-transformers model; hash = cheap deterministic stand-in")
+    parser.add_argument("--reranker", default="none", help="RERANKER_BACKEND for the run (none, local, cohere, auto)")
+    parser.add_argument("--output", help="Write the JSON result here (default: cache/bench/<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous result JSON to compare against")
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(token_latency_ms=args.token_latency_ms,
+                              prompt_ms_per_1k_chars=args.prompt_ms_per_1k_chars).start()
+    work_dir = Path(tempfile.mkdtemp(prefix="rfp-bench-"))
+    configure_environment(work_dir, server.base_url, args.reranker)
+    if args.embeddings == "hash":
+        # rag builds its base system at import time; swap the model class in before that happens
+        import langchain_community.embeddings
+        langchain_community.embeddings.HuggingFaceEmbeddings = HashEmbeddings
+    log(f"Fake Ollama at {server.base_url}, working directory {work_dir}")
+
+    import rag
+    import models.analysis as analysis
+    import telemetry
+
+    fixtures: List[Path] = []
+    kinds = {kind.strip() for kind in args.fixtures.split(",")}
+    if "uploads" in kinds:
+        fixtures += upload_fixtures()
+    if "synthetic" in kinds:
+        for seed, pages in enumerate(int(p) for p in args.synthetic_pages.split(",") if p.strip()):
+            fixtures.append(synthetic_fixture(pages, work_dir / "fixtures", seed=seed))
+
+    # Start the parsing processes up front so the first document doesn't pay for their spawn
+    for future in [rag.job_manager.process_pool.submit(int) for _ in range(rag.INGEST_WORKERS)]:
+        future.result()
+
+    ingest, queries, extraction = [], [], []
+    run_started = time.perf_counter()
+    for path in fixtures:
+        log(f"Ingesting {path.name}")
+        measured = bench_ingest(rag, path)
+        system = measured["system"]
+        ingest.append(measured["result"])
+        log(f"Querying {path.name} ({args.queries} queries)")
+        queries.append({"fixture": path.name, **bench_queries(system, args.queries, batch=not args.no_batch)})
+        if not args.no_extraction:
+            log(f"Extracting {path.name}")
+            extraction.append({"fixture": path.name, **bench_extraction(analysis, system)})
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_revision": git_revision(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": {
+            "ingest": ingest, "queries": queries, "extraction": extraction,
+            "wall_s": round(time.perf_counter() - run_started, 3), "peak_rss_mb": peak_rss_mb(),
+            "fake_ollama": dict(server.stats),
+            "stages": {labels[0]: {"count": count, "total_s": round(total, 3)}
+                       for labels, (total, count) in sorted(telemetry.STAGE_SECONDS.totals().items())},
+        },
+    }
+    if args.compare:
+        report["comparison"] = compare(report, json.loads(Path(args.compare).read_text()))
+
+    output = Path(args.output or Path("cache/bench") / f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    log(f"Results written to {output}")
+    for row in report.get("comparison", []):
+        if abs(row["change_pct"]) >= 5:
+            log(f"{row['metric']}: {row['baseline']:g} -> {row['current']:g} ({row['change_pct']:+.1f}%)")
+
+    rag.job_manager.shutdown()
+    server.stop()
+    return report
+
+
+if __name__ == "__main__":
+    main()
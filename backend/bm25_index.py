@@ -0,0 +1,308 @@
+# bm25_index.py
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from telemetry import debug
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SparseBM25Index:
+    """
+    Okapi BM25 over an inverted index with NumPy postings.
+
+    Every chunk occupies a slot; each term keeps two parallel arrays (slot ids, term frequencies), sorted
+    by slot. A document's chunks occupy one contiguous slot range, so a query scoped to some documents
+    slices each of its terms' postings to those ranges with a binary search. Scoring then runs only over
+    the postings the query touches, and latency doesn't grow with the rest of the corpus.
+    Removed chunks are tombstoned and the postings are compacted once tombstones pile up.
+
+    On disk, chunk text and metadata live in one segment file per document, written when the document
+    is added and deleted when it is removed; a save only rewrites the postings and the vocabulary.
+    """
+
+    COMPACT_RATIO = 0.3 # Compact when this fraction of slots is dead
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.post_slots: List[np.ndarray] = [] # term id -> slot ids (int32)
+        self.post_tf: List[np.ndarray] = [] # term id -> term frequencies (float32)
+        self.df = np.zeros(0, dtype=np.int32) # live documents containing each term
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.slot_owner = np.zeros(0, dtype=np.int32) # slot -> owner ordinal (doc_id)
+        self.owner_ordinals: Dict[str, int] = {}
+        self.owner_ranges: Dict[str, Tuple[int, int]] = {} # live doc_id -> [start, end) slots
+        self.slot_docs: List[Optional[Document]] = []
+        self.total_length = 0.0
+        self.live_count = 0
+        self._unsaved_segments: set = set() # doc_ids added since the last save
+        self._removed_segments: set = set() # doc_ids whose segment file should go at the next save
+        self._lock = threading.RLock()
+
+    # --- Mutation ---
+
+    def add_documents(self, doc_id: str, documents: List[Document]) -> None:
+        """Index a document's chunks under `doc_id`. Re-adding a doc_id replaces its previous chunks."""
+        with self._lock:
+            if doc_id in self.owner_ranges:
+                self.remove_document(doc_id)
+            owner = self.owner_ordinals.setdefault(doc_id, len(self.owner_ordinals))
+            first_slot = len(self.slot_docs)
+            new_slots: Dict[int, List[int]] = defaultdict(list)
+            new_tfs: Dict[int, List[int]] = defaultdict(list)
+            lengths = np.zeros(len(documents), dtype=np.float32)
+
+            for offset, doc in enumerate(documents):
+                slot = first_slot + offset
+                tokens = tokenize(doc.page_content)
+                lengths[offset] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = self._new_term(term)
+                    new_slots[term_id].append(slot)
+                    new_tfs[term_id].append(tf)
+                self.slot_docs.append(Document(page_content=doc.page_content, metadata=dict(doc.metadata)))
+
+            # One concatenate per touched term per batch keeps incremental adds cheap
+            for term_id, slots in new_slots.items():
+                self.post_slots[term_id] = np.concatenate([self.post_slots[term_id], np.asarray(slots, dtype=np.int32)])
+                self.post_tf[term_id] = np.concatenate([self.post_tf[term_id], np.asarray(new_tfs[term_id], dtype=np.float32)])
+                self.df[term_id] += len(slots)
+
+            self.doc_lengths = np.concatenate([self.doc_lengths, lengths])
+            self.alive = np.concatenate([self.alive, np.ones(len(documents), dtype=bool)])
+            self.slot_owner = np.concatenate([self.slot_owner, np.full(len(documents), owner, dtype=np.int32)])
+            self.owner_ranges[doc_id] = (first_slot, first_slot + len(documents))
+            self._unsaved_segments.add(doc_id)
+            self._removed_segments.discard(doc_id)
+            self.total_length += float(lengths.sum())
+            self.live_count += len(documents)
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Tombstone a document's chunks without touching any other document."""
+        with self._lock:
+            owned = self.owner_ranges.pop(doc_id, None)
+            if owned is None:
+                return False
+            slots = range(*owned)
+            for slot in slots:
+                doc = self.slot_docs[slot]
+                for term in set(tokenize(doc.page_content)):
+                    self.df[self.vocab[term]] -= 1
+                self.total_length -= float(self.doc_lengths[slot])
+                self.alive[slot] = False
+                self.slot_docs[slot] = None
+            self.live_count -= len(slots)
+            self._unsaved_segments.discard(doc_id)
+            self._removed_segments.add(doc_id)
+            if len(self.slot_docs) and 1 - self.live_count / len(self.slot_docs) > self.COMPACT_RATIO:
+                self.compact()
+            return True
+
+    def compact(self) -> None:
+        """Drop dead slots and renumber postings."""
+        with self._lock:
+            remap = np.full(len(self.slot_docs), -1, dtype=np.int32)
+            live_slots = np.flatnonzero(self.alive)
+            remap[live_slots] = np.arange(len(live_slots), dtype=np.int32)
+            for term_id in range(len(self.post_slots)):
+                keep = self.alive[self.post_slots[term_id]]
+                self.post_slots[term_id] = remap[self.post_slots[term_id][keep]]
+                self.post_tf[term_id] = self.post_tf[term_id][keep]
+            self.doc_lengths = self.doc_lengths[live_slots]
+            self.slot_owner = self.slot_owner[live_slots]
+            self.slot_docs = [self.slot_docs[i] for i in live_slots]
+            self.alive = np.ones(len(live_slots), dtype=bool)
+            # Live documents have every slot alive, so each range just shifts down
+            self.owner_ranges = {
+                doc_id: (int(remap[start]), int(remap[start]) + end - start)
+                for doc_id, (start, end) in self.owner_ranges.items()
+            }
+            debug(f"[BM25] Compacted index to {len(live_slots)} live chunks.")
+
+    def _new_term(self, term: str) -> int:
+        term_id = len(self.vocab)
+        self.vocab[term] = term_id
+        self.post_slots.append(np.zeros(0, dtype=np.int32))
+        self.post_tf.append(np.zeros(0, dtype=np.float32))
+        if term_id >= len(self.df): # Grow df geometrically
+            self.df = np.concatenate([self.df, np.zeros(max(1024, len(self.df)), dtype=np.int32)])
+        return term_id
+
+    # --- Query ---
+
+    def has_document(self, doc_id: str) -> bool:
+        return doc_id in self.owner_ranges
+
+    def _term_postings(self, term_id: int, ranges: Optional[List[Tuple[int, int]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """A term's live (slots, tfs), restricted to the given slot ranges when scoped."""
+        slots, tf = self.post_slots[term_id], self.post_tf[term_id]
+        if ranges is None:
+            if self.live_count < len(self.slot_docs): # Tombstones pending compaction
+                keep = self.alive[slots]
+                slots, tf = slots[keep], tf[keep]
+            return slots, tf
+        bounds = np.searchsorted(slots, np.asarray(ranges, dtype=np.int64).ravel()).reshape(-1, 2)
+        pieces = [(lo, hi) for lo, hi in bounds if hi > lo]
+        if len(pieces) == 1:
+            lo, hi = pieces[0]
+            return slots[lo:hi], tf[lo:hi]
+        return (np.concatenate([slots[lo:hi] for lo, hi in pieces] or [slots[:0]]),
+                np.concatenate([tf[lo:hi] for lo, hi in pieces] or [tf[:0]]))
+
+    def scored_slots(self, query: str, doc_ids: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(slots, BM25 scores) of the live, in-scope chunks matching at least one query term."""
+        empty = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        with self._lock:
+            if not self.live_count:
+                return empty
+            ranges = None
+            if doc_ids is not None:
+                ranges = sorted(self.owner_ranges[d] for d in set(doc_ids) if d in self.owner_ranges)
+                if not ranges:
+                    return empty
+            avgdl = self.total_length / self.live_count or 1.0
+            touched, contributions = [], []
+            for term, qtf in Counter(tokenize(query)).items():
+                term_id = self.vocab.get(term)
+                if term_id is None or self.df[term_id] <= 0:
+                    continue
+                slots, tf = self._term_postings(term_id, ranges)
+                if not len(slots):
+                    continue
+                df = float(self.df[term_id])
+                idf = math.log((self.live_count - df + 0.5) / (df + 0.5) + 1.0)
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[slots] / avgdl)
+                touched.append(slots)
+                contributions.append(qtf * idf * tf * (self.k1 + 1) / (tf + norm))
+            if not touched:
+                return empty
+            slots, inverse = np.unique(np.concatenate(touched), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(contributions)).astype(np.float32)
+            return slots, scores
+
+    def search(self, query: str, k: int = 10, doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[Document, float]]:
+        """Top-k chunks with a positive BM25 score, best first."""
+        with self._lock:
+            slots, scores = self.scored_slots(query, doc_ids)
+            positive = scores > 0
+            slots, scores = slots[positive], scores[positive]
+            if not len(slots) or k <= 0:
+                return []
+            if len(slots) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                slots, scores = slots[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self.slot_docs[slots[i]], float(scores[i])) for i in order]
+
+    # --- Persistence ---
+
+    @staticmethod
+    def _segment_path(path: Path, doc_id: str) -> Path:
+        return path / "segments" / f"{doc_id}.json"
+
+    def save(self, directory: str) -> None:
+        """Write new documents' segments, the postings and the vocabulary; remove deleted documents' segments."""
+        with self._lock:
+            if self.live_count < len(self.slot_docs):
+                self.compact()
+            path = Path(directory)
+            (path / "segments").mkdir(parents=True, exist_ok=True)
+            # Segments first, so the postings never reference a document whose text isn't on disk yet
+            for doc_id in self._unsaved_segments:
+                docs = [{"page_content": self.slot_docs[slot].page_content, "metadata": self.slot_docs[slot].metadata}
+                        for slot in range(*self.owner_ranges[doc_id])]
+                segment = self._segment_path(path, doc_id)
+                segment.with_suffix(".tmp").write_text(json.dumps(docs))
+                segment.with_suffix(".tmp").replace(segment)
+            lengths = np.asarray([len(p) for p in self.post_slots], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            empty_i, empty_f = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            np.savez(
+                path / "postings.tmp.npz",
+                offsets=offsets,
+                slots=np.concatenate(self.post_slots) if self.post_slots else empty_i,
+                tf=np.concatenate(self.post_tf) if self.post_tf else empty_f,
+                df=self.df[:len(self.vocab)],
+                doc_lengths=self.doc_lengths,
+                slot_owner=self.slot_owner,
+            )
+            meta = {
+                "k1": self.k1, "b": self.b,
+                "terms": sorted(self.vocab, key=self.vocab.get),
+                "owner_ordinals": self.owner_ordinals,
+                "owners": list(self.owner_ranges), # Live documents; their slots are read back from slot_owner
+            }
+            (path / "meta.tmp.json").write_text(json.dumps(meta))
+            (path / "postings.tmp.npz").replace(path / "postings.npz")
+            (path / "meta.tmp.json").replace(path / "meta.json")
+            for doc_id in self._removed_segments:
+                self._segment_path(path, doc_id).unlink(missing_ok=True)
+            self._unsaved_segments.clear()
+            self._removed_segments.clear()
+
+    @classmethod
+    def load(cls, directory: str) -> "SparseBM25Index":
+        path = Path(directory)
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = np.load(path / "postings.npz")
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index.vocab = {term: i for i, term in enumerate(meta["terms"])}
+        offsets, slots, tf = arrays["offsets"], arrays["slots"], arrays["tf"]
+        index.post_slots = [slots[offsets[i]:offsets[i + 1]].copy() for i in range(len(index.vocab))]
+        index.post_tf = [tf[offsets[i]:offsets[i + 1]].copy() for i in range(len(index.vocab))]
+        index.df = arrays["df"].astype(np.int32)
+        index.doc_lengths = arrays["doc_lengths"].astype(np.float32)
+        index.slot_owner = arrays["slot_owner"].astype(np.int32)
+        index.alive = np.ones(len(index.doc_lengths), dtype=bool)
+        index.owner_ordinals = meta["owner_ordinals"]
+        if "docs" in meta: # Older layout: every chunk's text inline in meta.json; split into segments at the next save
+            index.owner_ranges = {doc_id: (min(slots), max(slots) + 1) if slots else (0, 0)
+                                  for doc_id, slots in meta["owner_slots"].items()}
+            index.slot_docs = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in meta["docs"]]
+            index._unsaved_segments = set(index.owner_ranges)
+        else:
+            ordinal_owner = {ordinal: doc_id for doc_id, ordinal in index.owner_ordinals.items()}
+            # Saved indexes are compacted, so slot_owner is a run of equal ordinals per document
+            starts = np.flatnonzero(np.diff(index.slot_owner, prepend=-1)) if len(index.slot_owner) else []
+            ends = list(starts[1:]) + [len(index.slot_owner)]
+            runs = {ordinal_owner[int(index.slot_owner[start])]: (int(start), int(end)) for start, end in zip(starts, ends)}
+            if not set(runs) <= set(meta["owners"]):
+                raise ValueError("postings reference documents that are not in the saved document list")
+            index.owner_ranges = {doc_id: runs.get(doc_id, (0, 0)) for doc_id in meta["owners"]} # (0, 0): no chunks
+            index.slot_docs = [None] * len(index.doc_lengths)
+            for doc_id, (start, end) in index.owner_ranges.items():
+                docs = json.loads(cls._segment_path(path, doc_id).read_text())
+                if len(docs) != end - start:
+                    raise ValueError(f"segment {doc_id} has {len(docs)} chunks, postings expect {end - start}")
+                for slot, d in zip(range(start, end), docs):
+                    index.slot_docs[slot] = Document(page_content=d["page_content"], metadata=d["metadata"])
+        index.total_length = float(index.doc_lengths.sum())
+        index.live_count = len(index.slot_docs)
+        return index
+
+    @classmethod
+    def load_or_create(cls, directory: str) -> "SparseBM25Index":
+        if (Path(directory) / "meta.json").exists():
+            try:
+                return cls.load(directory)
+            except Exception as e:
+                print(f"[BM25] Warning: could not load index from {directory}, starting empty: {e}")
+        return cls()
+
@@ -0,0 +1,133 @@
+# context.py
+# Context assembly for RAG answers: retrieved chunks merged by their source offsets (no repeated overlap),
+# optionally widened to a parent window, packed by relevance into a token budget and laid out in document order.
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from models.packing import estimate_tokens
+from telemetry import debug, span
+
+# Estimated prompt tokens the assembled context may take (0 = no cap). Ollama's default num_ctx is
+# 2048, which also has to hold the question, the prompt template and the answer.
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1200"))
+RAG_CHARS_PER_TOKEN = float(os.getenv("RAG_CHARS_PER_TOKEN", "3.0"))
+# Hits shorter than this many characters are widened to a window of this size around them (0 = off).
+# Needs the page text, so it only applies to the instance's own document.
+RAG_CONTEXT_PARENT_CHARS = int(os.getenv("RAG_CONTEXT_PARENT_CHARS", "0"))
+# The splitter drops the separator ("\n\n", "\n" or " ") between consecutive chunks, so spans this close are adjacent
+ADJACENT_GAP_CHARS = 2
+BLOCK_SEPARATOR = "\n\n" # Same separator LangChain's "stuff" chain puts between documents
+
+PageKey = Tuple[Optional[str], Any] # (doc_id, page)
+PageLookup = Callable[[PageKey], Optional[str]]
+
+
+class _Block:
+    """A contiguous span of one page: one or more merged hits, ranked by its best hit."""
+
+    def __init__(self, key: PageKey, start: Optional[int], end: Optional[int], text: str, rank: int):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.text = text
+        self.rank = rank
+
+
+def page_key(doc: Document) -> PageKey:
+    return doc.metadata.get("doc_id") or doc.metadata.get("source"), doc.metadata.get("page")
+
+
+def _widen(start: int, end: int, page_text: str, window: int) -> Tuple[int, int]:
+    """`window` characters centred on [start, end), clipped to the page and snapped outward to whitespace."""
+    if end - start >= window:
+        return start, end
+    pad = (window - (end - start)) // 2
+    start, end = max(0, start - pad), min(len(page_text), end + pad)
+    while start > 0 and not page_text[start - 1].isspace():
+        start -= 1
+    while end < len(page_text) and not page_text[end].isspace():
+        end += 1
+    return start, end
+
+
+def _merge_page(key: PageKey, hits: List[Tuple[int, int, str, int]], page_text: Optional[str]) -> List[_Block]:
+    """Merges one page's (start, end, text, rank) hits whose spans overlap or touch, reading the overlap once."""
+    blocks: List[_Block] = []
+    for start, end, text, rank in sorted(hits):
+        current = blocks[-1] if blocks else None
+        if current is None or start > current.end + ADJACENT_GAP_CHARS:
+            blocks.append(_Block(key, start, end, text, rank))
+            continue
+        current.rank = min(current.rank, rank)
+        if end <= current.end:
+            continue # Contained in the block already
+        if page_text is not None:
+            current.text = page_text[current.start:end]
+        elif start >= current.end: # Adjacent: the dropped separator is lost, a space stands in
+            current.text = f"{current.text} {text}"
+        else:
+            current.text += text[current.end - start:]
+        current.end = end
+    return blocks
+
+
+def assemble_context(docs: List[Document], token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+                     page_text: Optional[PageLookup] = None, parent_chars: int = RAG_CONTEXT_PARENT_CHARS,
+                     chars_per_token: float = RAG_CHARS_PER_TOKEN) -> str:
+    """
+    Prompt context for `docs` (ranked best first). Hits on the same page whose `start_index` spans
+    overlap or touch become one block; blocks are picked by their best hit's rank while their estimated
+    tokens fit `token_budget`, then joined in document order. `page_text((doc_id, page))` returns the
+    page a chunk was split from, if known: merged blocks are then cut from it exactly and short hits
+    widened to `parent_chars`. Chunks without offsets are kept as they are, minus exact repeats.
+    """
+    with span("context_assembly"):
+        page_text = page_text or (lambda key: None)
+        pages: Dict[PageKey, List[Tuple[int, int, str, int]]] = {}
+        blocks: List[_Block] = []
+        for rank, doc in enumerate(docs):
+            key, start = page_key(doc), doc.metadata.get("start_index")
+            if not isinstance(start, int) or start < 0: # Splits cached before offsets were recorded
+                blocks.append(_Block(key, None, None, doc.page_content, rank))
+                continue
+            end = start + len(doc.page_content)
+            text = doc.page_content
+            source = page_text(key)
+            if parent_chars > 0 and source is not None:
+                start, end = _widen(start, end, source, parent_chars)
+                text = source[start:end]
+            pages.setdefault(key, []).append((start, end, text, rank))
+        for key, hits in pages.items():
+            blocks.extend(_merge_page(key, hits, page_text(key)))
+
+        selected: List[_Block] = []
+        used = 0
+        for block in sorted(blocks, key=lambda b: b.rank):
+            if any(block.text in other.text for other in selected): # Text already selected, e.g. an offset-less chunk or a copy in another document
+                continue
+            tokens = estimate_tokens(block.text, chars_per_token)
+            if token_budget > 0 and used + tokens > token_budget:
+                if selected:
+                    continue # A shorter, lower-ranked block may still fit
+                block.text = block.text[:int(token_budget * chars_per_token)] # The best hit alone overflows
+                tokens = token_budget
+            selected.append(block)
+            used += tokens
+
+        # Documents in order of their best hit, then pages and offsets within each
+        doc_rank: Dict[Any, int] = {}
+        for block in sorted(selected, key=lambda b: b.rank):
+            doc_rank.setdefault(block.key[0], block.rank)
+        selected.sort(key=lambda b: (doc_rank[b.key[0]], _sortable(b.key[1]),
+                                     b.start if b.start is not None else -1, b.rank))
+        debug(f"[Context] {len(docs)} chunks -> {len(blocks)} blocks, {len(selected)} kept "
+              f"(~{used} tokens, budget {token_budget or 'off'}).")
+        return BLOCK_SEPARATOR.join(block.text for block in selected)
+
+
+def _sortable(page: Any) -> Tuple[int, Any]:
+    # Pages are ints for PDFs and absent for text files; keep unknown pages last
+    return (0, page) if isinstance(page, int) else (1, str(page))
+
@@ -0,0 +1,145 @@
+# corpus.py
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from bm25_index import SparseBM25Index
+from telemetry import debug
+
+CORPUS_COLLECTION_NAME = "rfp_corpus"
+UPSERT_BATCH_SIZE = 1000 # Stay well under Chroma's max batch size
+
+
+def doc_filter(doc_ids: List[str]) -> Dict:
+    """Chroma metadata filter restricting results to the given document IDs."""
+    if len(doc_ids) == 1:
+        return {"doc_id": doc_ids[0]}
+    return {"doc_id": {"$in": list(doc_ids)}}
+
+
+class DocumentCorpus:
+    """
+    Persistent Chroma collection holding every uploaded RFP, plus a BM25 lexical index stored next to it.
+    Each chunk carries `doc_id` / `chunk_id` metadata, so documents can be scoped and deleted independently.
+    A small JSON manifest next to the collection records what has been indexed.
+    """
+
+    def __init__(self, persist_directory: str, embeddings: Embeddings):
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.persist_directory / "documents.json"
+        self.vectorstore = Chroma(
+            collection_name=CORPUS_COLLECTION_NAME,
+            embedding_function=embeddings,
+            persist_directory=str(self.persist_directory),
+        )
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Dict] = self._load_manifest()
+        self.lexical_dir = self.persist_directory / "bm25"
+        self.lexical_index = SparseBM25Index.load_or_create(str(self.lexical_dir))
+        self._backfill_lexical_index()
+        debug(f"[Corpus] Opened corpus at {self.persist_directory} with {len(self._manifest)} documents.")
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except Exception as e:
+            print(f"[Corpus] Warning: could not read manifest, starting empty: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._manifest, indent=2))
+        tmp_path.replace(self.manifest_path)
+
+    def _backfill_lexical_index(self) -> None:
+        """Add documents indexed before the lexical index existed (or whose index files were lost)."""
+        missing = [doc_id for doc_id in self._manifest if not self.lexical_index.has_document(doc_id)]
+        for doc_id in missing:
+            self.lexical_index.add_documents(doc_id, self.get_splits([doc_id]))
+        if missing:
+            self.lexical_index.save(str(self.lexical_dir))
+            debug(f"[Corpus] Backfilled BM25 index with {len(missing)} documents.")
+
+    def has_document(self, doc_id: str) -> bool:
+        return doc_id in self._manifest
+
+    def list_documents(self) -> List[Dict]:
+        return [{"doc_id": doc_id, **info} for doc_id, info in self._manifest.items()]
+
+    def add_document(self, doc_id: str, filename: str, splits: List[Document], vectors) -> None:
+        """Index a document's chunks with precomputed vectors. Re-adding an indexed document is a no-op."""
+        with self._lock:
+            if doc_id in self._manifest:
+                debug(f"[Corpus] Document {doc_id[:12]} already indexed, skipping.")
+                return
+            collection = self.vectorstore._collection
+            for start in range(0, len(splits), UPSERT_BATCH_SIZE):
+                batch = splits[start:start + UPSERT_BATCH_SIZE]
+                collection.upsert(
+                    ids=[doc.metadata["chunk_id"] for doc in batch],
+                    embeddings=np.asarray(vectors[start:start + UPSERT_BATCH_SIZE], dtype=np.float32).tolist(),
+                    metadatas=[doc.metadata for doc in batch],
+                    documents=[doc.page_content for doc in batch],
+                )
+            self.lexical_index.add_documents(doc_id, splits)
+            self.lexical_index.save(str(self.lexical_dir))
+            self._manifest[doc_id] = {"filename": filename, "chunks": len(splits), "indexed_at": time.time()}
+            self._save_manifest()
+        debug(f"[Corpus] Indexed document {doc_id[:12]} ({filename}) with {len(splits)} chunks.")
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Remove a document's vectors; other documents are untouched."""
+        with self._lock:
+            if doc_id not in self._manifest:
+                return False
+            self.vectorstore._collection.delete(where={"doc_id": doc_id})
+            self.lexical_index.remove_document(doc_id)
+            self.lexical_index.save(str(self.lexical_dir))
+            del self._manifest[doc_id]
+            self._save_manifest()
+        debug(f"[Corpus] Deleted document {doc_id[:12]}.")
+        return True
+
+    def get_splits(self, doc_ids: List[str]) -> List[Document]:
+        """Fetch the stored chunks for the given documents, in document/chunk order."""
+        result = self.vectorstore._collection.get(where=doc_filter(doc_ids), include=["documents", "metadatas"])
+        splits = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"], result["metadatas"])
+        ]
+        splits.sort(key=lambda d: (doc_ids.index(d.metadata.get("doc_id")) if d.metadata.get("doc_id") in doc_ids else len(doc_ids),
+                                   d.metadata.get("chunk_index", 0)))
+        return splits
+
+    def similarity_search(self, query: str, k: int = 10, doc_ids: Optional[List[str]] = None) -> List[Tuple[Document, float]]:
+        """Dense (document, relevance score) results, optionally scoped to some documents."""
+        return self.vectorstore.similarity_search_with_relevance_scores(
+            query, k=k, filter=doc_filter(doc_ids) if doc_ids else None
+        )
+
+    def similarity_search_by_vectors(self, vectors, k: int = 10,
+                                     doc_ids: Optional[List[str]] = None) -> List[List[Tuple[Document, float]]]:
+        """similarity_search for several precomputed query vectors in a single Chroma query."""
+        if not len(vectors):
+            return []
+        results = self.vectorstore._collection.query(
+            query_embeddings=np.asarray(vectors, dtype=np.float32).tolist(), n_results=k,
+            where=doc_filter(doc_ids) if doc_ids else None, include=["documents", "metadatas", "distances"],
+        )
+        relevance = self.vectorstore._select_relevance_score_fn()
+        return [
+            [(Document(page_content=text, metadata=metadata or {}), relevance(distance))
+             for text, metadata, distance in zip(texts, metadatas, distances)]
+            for texts, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"])
+        ]
+
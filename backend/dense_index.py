@@ -0,0 +1,87 @@
+# dense_index.py
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+DENSE_INDEX_DIR = os.getenv("DENSE_INDEX_DIR", "cache/dense")
+DENSE_INDEX_DTYPE = os.getenv("DENSE_INDEX_DTYPE", "float32").lower() # float32 | float16
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    array = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return array / norms
+
+
+class DenseVectorIndex:
+    """
+    Exact cosine top-k over one contiguous matrix of normalized embeddings.
+
+    Saved as a plain .npy file and opened with mmap, so several worker processes serving the same
+    document share the OS page cache instead of each holding a copy. A query is one matrix-vector
+    product plus argpartition.
+    """
+
+    def __init__(self, vectors: np.ndarray, documents: List[Document]):
+        if len(vectors) != len(documents):
+            raise ValueError(f"Vector count {len(vectors)} does not match document count {len(documents)}.")
+        self.vectors = vectors
+        self.documents = documents
+
+    @classmethod
+    def build(cls, vectors, documents: List[Document], directory: Optional[str] = None,
+              dtype: str = DENSE_INDEX_DTYPE) -> "DenseVectorIndex":
+        matrix = normalize_rows(vectors).astype(np.float16 if dtype == "float16" else np.float32)
+        if directory is None:
+            return cls(matrix, documents)
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.tmp.npy", matrix)
+        (path / "documents.tmp.json").write_text(json.dumps(
+            [{"page_content": d.page_content, "metadata": d.metadata} for d in documents]
+        ))
+        (path / "vectors.tmp.npy").replace(path / "vectors.npy")
+        (path / "documents.tmp.json").replace(path / "documents.json")
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "DenseVectorIndex":
+        path = Path(directory)
+        vectors = np.load(path / "vectors.npy", mmap_mode="r" if mmap else None)
+        documents = [Document(page_content=d["page_content"], metadata=d["metadata"])
+                     for d in json.loads((path / "documents.json").read_text())]
+        return cls(vectors, documents)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        path = Path(directory)
+        return (path / "vectors.npy").exists() and (path / "documents.json").exists()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search(self, query_vector, k: int = 10) -> List[Tuple[Document, float]]:
+        query = normalize_rows([query_vector])[0]
+        scores = self.vectors @ query.astype(self.vectors.dtype)
+        return [(self.documents[i], float(scores[i])) for i in self._top_k(np.asarray(scores, dtype=np.float32), k)]
+
+    def search_batch(self, query_vectors, k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """search() for several queries as one matrix-matrix product."""
+        if not len(query_vectors):
+            return []
+        queries = normalize_rows(query_vectors).astype(self.vectors.dtype)
+        scores = np.asarray(self.vectors @ queries.T, dtype=np.float32) # (documents, queries)
+        return [[(self.documents[i], float(column[i])) for i in self._top_k(column, k)] for column in scores.T]
+
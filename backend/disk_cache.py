@@ -0,0 +1,101 @@
+# disk_cache.py
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from telemetry import debug
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's contents in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a stable key from content hashes and settings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Pickle-per-entry cache on disk with a total size cap.
+    Entries are evicted least-recently-used first (file mtime is bumped on every hit).
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                value = pickle.load(f)
+            os.utime(path, None) # Mark as recently used
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[Cache] Dropping unreadable entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        # Write to a temp file first so readers never see a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.directory.glob("*.pkl"))
+
+    def evict(self) -> int:
+        """Remove least-recently-used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for p in self.directory.glob("*.pkl"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            if removed:
+                debug(f"[Cache] Evicted {removed} entries from {self.directory} (now {total} bytes).")
+            return removed
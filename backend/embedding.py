@@ -0,0 +1,87 @@
+# embedding.py
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Cached vectors are stored exactly by default; float16 (half the size) and int8 (a quarter) are lossy opt-ins
+VECTOR_STORAGE_DTYPE = os.getenv("VECTOR_STORAGE_DTYPE", "float32").lower() # float32 | float16 | int8
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace/case-insensitive form used to spot repeated headers, footers and boilerplate."""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStage:
+    """
+    Embeds chunk texts with each unique (normalized) text sent to the model only once,
+    in batches of `batch_size`. Counters report how many model calls dedup saved.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBED_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self._seen: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self.requested = 0
+        self.embedded = 0
+
+    @property
+    def saved(self) -> int:
+        return self.requested - self.embedded
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            todo: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in self._seen and key not in todo:
+                    todo[key] = text
+            self.requested += len(texts)
+            self.embedded += len(todo)
+        todo_keys = list(todo)
+        for start in range(0, len(todo_keys), self.batch_size):
+            batch_keys = todo_keys[start:start + self.batch_size]
+            vectors = self.embeddings.embed_documents([todo[k] for k in batch_keys])
+            with self._lock:
+                self._seen.update(zip(batch_keys, vectors))
+        return [self._seen[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        return {"chunks": self.requested, "embedded": self.embedded, "saved_by_dedup": self.saved}
+
+
+# --- Compact vector storage ---
+
+def encode_vectors(vectors, dtype: str = VECTOR_STORAGE_DTYPE) -> Dict:
+    """Pack vectors for storage as float32, float16 or per-row symmetric int8."""
+    array = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return {"dtype": "float16", "data": array.astype(np.float16)}
+    if dtype == "int8":
+        scale = np.abs(array).max(axis=1, keepdims=True) / 127.0 if len(array) else np.zeros((0, 1), np.float32)
+        scale[scale == 0] = 1.0
+        return {"dtype": "int8", "data": np.round(array / scale).astype(np.int8), "scale": scale.astype(np.float32)}
+    return {"dtype": "float32", "data": array}
+
+
+def decode_vectors(packed) -> np.ndarray:
+    """Inverse of encode_vectors. Plain lists (older cache entries) pass through as float32."""
+    if not isinstance(packed, dict):
+        return np.asarray(packed, dtype=np.float32)
+    if packed["dtype"] == "int8":
+        return packed["data"].astype(np.float32) * packed["scale"]
+    return packed["data"].astype(np.float32)
+
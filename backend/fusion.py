@@ -0,0 +1,147 @@
+# fusion.py
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from telemetry import span, submit
+
+ScoredDocs = List[Tuple[Document, float]]
+SearchFn = Callable[[str, int], ScoredDocs]
+BatchVectorSearchFn = Callable[[np.ndarray, int], List[ScoredDocs]]
+
+FUSION_METHODS = ("rrf", "score")
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Shared by every fusion retriever; each query needs one thread per source
+_search_pool = ThreadPoolExecutor(max_workers=int(os.getenv("FUSION_THREADS", "8")), thread_name_prefix="fusion")
+
+
+def chunk_key(doc: Document) -> str:
+    """Fusion identity: the corpus chunk ID, falling back to content for untagged documents."""
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def retrieval_options(k: Optional[int] = None, weights: Optional[Sequence[float]] = None,
+                      method: Optional[str] = None) -> Dict[str, Any]:
+    """Validated per-request fusion overrides, unset ones omitted. Raises ValueError on a bad value."""
+    options: Dict[str, Any] = {}
+    if k is not None:
+        if isinstance(k, bool) or not isinstance(k, int) or k <= 0:
+            raise ValueError(f"k must be a positive integer, got {k!r}.")
+        options["k"] = k
+    if weights is not None:
+        weights = list(weights)
+        valid = len(weights) == 2 and all(
+            isinstance(w, (int, float)) and not isinstance(w, bool) and math.isfinite(w) and w >= 0 for w in weights)
+        if not valid or not any(weights):
+            raise ValueError(f"weights must be two finite, non-negative numbers (dense, lexical), not both zero; got {weights!r}.")
+        options["weights"] = [float(w) for w in weights]
+    if method is not None:
+        if method not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{method}'. Expected one of {FUSION_METHODS}.")
+        options["method"] = method
+    return options
+
+
+def fuse(result_lists: Sequence[ScoredDocs], weights: Sequence[float], method: str = "rrf",
+         rrf_k: int = RRF_K) -> ScoredDocs:
+    """
+    Fuse ranked (document, score) lists by chunk ID.
+
+    "rrf": weighted reciprocal-rank fusion, sum_i w_i / (rrf_k + rank_i).
+    "score": weighted sum of per-source min-max normalized scores (missing = 0).
+    Computed on a (sources x candidates) array; returns documents best first with the fused score.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}'. Expected one of {FUSION_METHODS}.")
+    index: Dict[str, int] = {}
+    docs: List[Document] = []
+    for results in result_lists:
+        for doc, _ in results:
+            key = chunk_key(doc)
+            if key not in index:
+                index[key] = len(docs)
+                docs.append(doc)
+    if not docs:
+        return []
+
+    n_sources, n_docs = len(result_lists), len(docs)
+    contributions = np.zeros((n_sources, n_docs), dtype=np.float32)
+    for s, results in enumerate(result_lists):
+        if not results:
+            continue
+        cols = np.fromiter((index[chunk_key(doc)] for doc, _ in results), dtype=np.int64, count=len(results))
+        if method == "rrf":
+            contributions[s, cols] = 1.0 / (rrf_k + np.arange(1, len(results) + 1, dtype=np.float32))
+        else:
+            scores = np.fromiter((score for _, score in results), dtype=np.float32, count=len(results))
+            spread = scores.max() - scores.min()
+            contributions[s, cols] = (scores - scores.min()) / spread if spread > 0 else 1.0
+    fused = np.asarray(weights, dtype=np.float32) @ contributions
+    order = np.argsort(-fused, kind="stable")
+    return [(docs[i], float(fused[i])) for i in order]
+
+
+class HybridFusionRetriever(BaseRetriever):
+    """
+    Runs dense and lexical search concurrently and fuses them by chunk ID (replaces EnsembleRetriever).
+    Returned documents carry `fused_score` in their metadata for the reranker and the API.
+    """
+
+    dense_search: Any # SearchFn
+    lexical_search: Any # SearchFn
+    dense_search_batch: Any = None # BatchVectorSearchFn, for search_batch with precomputed query vectors
+    k: int = 10
+    weights: List[float] = [0.7, 0.3]
+    method: str = "rrf"
+    rrf_k: int = RRF_K
+
+    def with_options(self, k: Optional[int] = None, weights: Optional[List[float]] = None,
+                     method: Optional[str] = None) -> "HybridFusionRetriever":
+        """Copy with per-request overrides (checked by retrieval_options); unset options keep this retriever's values."""
+        return self.copy(update=retrieval_options(k, weights, method))
+
+    def search(self, query: str, query_vector: Optional[np.ndarray] = None) -> ScoredDocs:
+        """Fused results for `query`; a precomputed `query_vector` saves the dense side from embedding it again."""
+        if query_vector is not None and self.dense_search_batch is not None:
+            dense_future = submit(_search_pool, lambda: self.dense_search_batch(np.asarray([query_vector]), self.k)[0])
+        else:
+            dense_future = submit(_search_pool, self.dense_search, query, self.k)
+        lexical_future = submit(_search_pool, self.lexical_search, query, self.k)
+        dense, lexical = dense_future.result(), lexical_future.result()
+        with span("fusion"):
+            return fuse([dense, lexical], self.weights, self.method, self.rrf_k)[:self.k]
+
+    def search_batch(self, queries: Sequence[str], query_vectors: np.ndarray) -> List[ScoredDocs]:
+        """
+        search() for several queries: one batched dense call on the precomputed query vectors while
+        the lexical searches run in parallel, then per-query fusion.
+        """
+        if self.dense_search_batch is None:
+            return [self.search(query) for query in queries]
+        dense_future = submit(_search_pool, self.dense_search_batch, query_vectors, self.k)
+        lexical_results = [future.result() for future in
+                           [submit(_search_pool, self.lexical_search, query, self.k) for query in queries]]
+        dense_results = dense_future.result()
+        with span("fusion"):
+            return [
+                fuse([dense, lexical], self.weights, self.method, self.rrf_k)[:self.k]
+                for dense, lexical in zip(dense_results, lexical_results)
+            ]
+
+    @staticmethod
+    def with_fused_scores(scored: ScoredDocs) -> List[Document]:
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "fused_score": score})
+            for doc, score in scored
+        ]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                query_vector: Optional[np.ndarray] = None) -> List[Document]:
+        return self.with_fused_scores(self.search(query, query_vector))
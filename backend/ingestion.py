@@ -0,0 +1,159 @@
+# ingestion.py
+# Side-effect-free document parsing, splitting and the streaming ingestion pipeline.
+# Page extraction functions are importable from worker processes.
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_community.document_loaders import TextLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from embedding import EMBED_BATCH_SIZE
+from telemetry import debug, span, timed_iter
+
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+INGEST_MAX_INFLIGHT_TASKS = int(os.getenv("INGEST_MAX_INFLIGHT_TASKS", "4"))
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "4"))
+
+_DONE = object() # End-of-stream marker between pipeline stages
+
+
+def make_text_splitter(chunk_size: int, chunk_overlap: int, separators: Sequence[str]) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=list(separators),
+        add_start_index=True, # Offsets within the page let context assembly merge overlapping hits
+    )
+
+
+def count_pdf_pages(file_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[Document]:
+    """Worker entry point: text of pages [start, end), with the same metadata PyPDFLoader produces."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [
+        Document(page_content=reader.pages[i].extract_text(), metadata={"source": file_path, "page": i})
+        for i in range(start, min(end, len(reader.pages)))
+    ]
+
+
+def stream_pages(file_path: str, executor: Optional[Executor] = None,
+                 pages_per_task: int = INGEST_PAGES_PER_TASK,
+                 max_inflight: int = INGEST_MAX_INFLIGHT_TASKS) -> Tuple[int, Iterator[Document]]:
+    """
+    Returns (page_count, iterator of pages in order). PDF page ranges are extracted in parallel on
+    `executor`, with at most `max_inflight` ranges outstanding so memory stays bounded.
+    """
+    if file_path.endswith('.txt'):
+        return 1, iter(TextLoader(file_path).load())
+    if not file_path.endswith('.pdf'):
+        raise ValueError(f"Unsupported file type: {Path(file_path).suffix}")
+
+    page_count = count_pdf_pages(file_path)
+    ranges = deque((start, start + pages_per_task) for start in range(0, page_count, pages_per_task))
+
+    def generate() -> Iterator[Document]:
+        if executor is None:
+            for start, end in ranges:
+                yield from extract_pdf_pages(file_path, start, end)
+            return
+        inflight = deque()
+        while ranges or inflight:
+            while ranges and len(inflight) < max_inflight:
+                inflight.append(executor.submit(extract_pdf_pages, file_path, *ranges.popleft()))
+            yield from inflight.popleft().result() # In-order; later ranges keep extracting meanwhile
+
+    debug(f"[Ingest] Streaming {page_count} pages from {file_path}")
+    return page_count, generate()
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: page extraction (process pool) -> splitter (thread) -> embedder (caller's thread).
+    Chunks move to the embedder in fixed-size batches through a bounded queue, so extraction, splitting
+    and embedding overlap and only a few batches are in flight between stages.
+    """
+
+    def __init__(self, text_splitter: RecursiveCharacterTextSplitter,
+                 embed_batch: Callable[[List[str]], List[List[float]]],
+                 executor: Optional[Executor] = None, batch_size: int = EMBED_BATCH_SIZE,
+                 queue_batches: int = INGEST_QUEUE_BATCHES):
+        self.text_splitter = text_splitter
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.batch_size = batch_size
+        self.queue_batches = queue_batches
+
+    def run(self, file_path: str, progress: Optional[Callable[[str, float], None]] = None
+            ) -> Tuple[List[Document], List[Document], List[List[float]]]:
+        """Returns (pages, splits, vectors) with vectors aligned to splits."""
+        progress = progress or (lambda stage, fraction: None)
+        page_count, pages_iter = stream_pages(file_path, self.executor)
+        batches: "queue.Queue" = queue.Queue(maxsize=self.queue_batches)
+        pages: List[Document] = []
+        stop = threading.Event()
+
+        def split_stage() -> None:
+            try:
+                pending: List[Document] = []
+                for page in timed_iter("load", pages_iter): # Waiting on page extraction
+                    if stop.is_set():
+                        return
+                    pages.append(page)
+                    with span("split"):
+                        pending.extend(self.text_splitter.split_documents([page]))
+                    while len(pending) >= self.batch_size:
+                        batches.put((pending[:self.batch_size], len(pages)))
+                        pending = pending[self.batch_size:]
+                if pending:
+                    batches.put((pending, len(pages)))
+                batches.put(_DONE)
+            except BaseException as e:
+                batches.put(e)
+
+        splitter_thread = threading.Thread(target=split_stage, name="ingest-split", daemon=True)
+        splitter_thread.start()
+
+        splits: List[Document] = []
+        vectors: List[List[float]] = []
+        try:
+            while True:
+                item = batches.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                batch, pages_done = item
+                with span("embed"):
+                    vectors.extend(self.embed_batch([doc.page_content for doc in batch]))
+                splits.extend(batch)
+                progress("embedding", 0.1 + 0.7 * pages_done / max(page_count, 1))
+        finally:
+            stop.set()
+            while splitter_thread.is_alive(): # Unblock the splitter if we bailed out early
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    splitter_thread.join(timeout=0.1)
+
+        if not pages:
+            raise ValueError("Document loaded but resulted in no content.")
+        if not splits:
+            print("Warning: Text splitting resulted in zero chunks. Using full document text as one chunk.")
+            full_text = "\n\n".join([doc.page_content for doc in pages])
+            if not full_text: raise ValueError("Cannot proceed: No text content found.")
+            splits = [Document(page_content=full_text)]
+            vectors = self.embed_batch([full_text])
+        debug(f"[Ingest] {len(pages)} pages -> {len(splits)} chunks embedded in batches of {self.batch_size}.")
+        return pages, splits, vectors
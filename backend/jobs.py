@@ -0,0 +1,111 @@
+# jobs.py
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from telemetry import debug
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """Status record for one background job, updated by the job's worker thread."""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = JOB_QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, stage: str, progress: float) -> None:
+        self.stage = stage
+        self.progress = round(min(max(progress, 0.0), 1.0), 3)
+        debug(f"[Jobs] {self.job_id[:8]} {stage} ({self.progress:.0%})")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs off the event loop. Each job's orchestration runs on a small thread pool;
+    CPU-bound steps inside a job can be pushed to `process_pool` (spawned, so no torch state is forked).
+    """
+
+    def __init__(self, process_workers: int = 2, job_threads: int = 2, max_finished_jobs: int = 200):
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._threads = ThreadPoolExecutor(max_workers=job_threads, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.max_finished_jobs = max_finished_jobs
+
+    def submit(self, kind: str, target: Callable[[Job], Optional[Dict[str, Any]]], **params) -> Job:
+        """Queue `target(job)`; its return value becomes the job result."""
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._threads.submit(self._run, job, target)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    def _run(self, job: Job, target: Callable[[Job], Optional[Dict[str, Any]]]) -> None:
+        # Status changes come last, so a poller that sees a new status also sees the fields that go with it
+        job.started_at = time.time()
+        job.status = JOB_RUNNING
+        try:
+            result = target(job)
+        except Exception as e:
+            job.error = str(e)
+            job.stage = "failed"
+            job.finished_at = time.time()
+            job.status = JOB_FAILED
+            print(f"[Jobs] {job.job_id[:8]} failed: {e}")
+            traceback.print_exc()
+        else:
+            job.result = result
+            job.update("done", 1.0)
+            job.finished_at = time.time()
+            job.status = JOB_DONE
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.status in (JOB_DONE, JOB_FAILED)]
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.job_id]
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
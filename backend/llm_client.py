@@ -0,0 +1,231 @@
+# llm_client.py
+# One shared Ollama client for RAG answers and structured extraction: pooled keep-alive connections,
+# coalescing of identical in-flight prompts, bounded-concurrency admission and retries with backoff.
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from requests.adapters import HTTPAdapter
+
+from telemetry import LLM_REQUESTS, debug, span
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Requests allowed upstream at once across the whole process (match Ollama's OLLAMA_NUM_PARALLEL);
+# callers past that wait up to OLLAMA_ADMISSION_TIMEOUT seconds for a slot, then get OllamaBusyError
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+OLLAMA_ADMISSION_TIMEOUT = float(os.getenv("OLLAMA_ADMISSION_TIMEOUT", "300"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "16")) # Keep-alive connections kept open
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5")) # Seconds, doubled per attempt
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE") # How long Ollama keeps the model loaded, e.g. "30m"
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class OllamaBusyError(OllamaError):
+    """No upstream slot freed up within the admission timeout."""
+
+
+class _Retryable(Exception):
+    def __init__(self, cause: Exception):
+        super().__init__(str(cause))
+        self.cause = cause
+
+
+class OllamaClient:
+    """
+    Thread-safe client for Ollama's /api/generate.
+
+    - One requests.Session with a connection pool of `pool_size` keep-alive connections.
+    - At most `max_concurrency` requests upstream at once; others queue for a slot (admission control).
+    - Identical non-streaming requests (same model, prompt and options) that overlap in time share one
+      upstream call: later callers wait for the first one's result.
+    - Connection failures and 429/5xx responses are retried up to `max_retries` times with exponential
+      backoff and jitter. Read timeouts are not retried (the model is slow, not down). Streams are only
+      retried before their first byte.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+                 pool_size: int = OLLAMA_POOL_SIZE, max_retries: int = OLLAMA_MAX_RETRIES,
+                 retry_backoff: float = OLLAMA_RETRY_BACKOFF, admission_timeout: float = OLLAMA_ADMISSION_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.admission_timeout = admission_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(payload: Dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def generate(self, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """Non-streaming /api/generate; returns Ollama's JSON (response text plus token counts and timings)."""
+        payload = {**payload, "stream": False}
+        key = self.request_key(payload)
+        with self._lock:
+            shared = self._inflight.get(key)
+            if shared is None:
+                leader = self._inflight[key] = Future()
+        if shared is not None:
+            LLM_REQUESTS.inc("coalesced")
+            debug("[LLM] Identical request already in flight, waiting for its result.")
+            return shared.result()
+        try:
+            response = self._post(payload, timeout, stream=False)
+            result = response.json()
+            leader.set_result(result)
+            return result
+        except BaseException as e:
+            leader.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, payload: Dict, timeout: Optional[float] = None) -> Iterator[Dict]:
+        """Streaming /api/generate: yields each NDJSON message, holding an upstream slot until the stream ends."""
+        response = self._post({**payload, "stream": True}, timeout, stream=True)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+        finally:
+            response.close()
+            self._slots.release()
+
+    # --- Admission and retries ---
+
+    def _post(self, payload: Dict, timeout: Optional[float], stream: bool) -> requests.Response:
+        """POST with retries; each attempt holds an upstream slot. A streamed response keeps its slot (caller releases)."""
+        attempt = 0
+        while True:
+            with span("llm_admission"):
+                admitted = self._slots.acquire(timeout=self.admission_timeout)
+            if not admitted:
+                LLM_REQUESTS.inc("rejected")
+                raise OllamaBusyError(f"No Ollama slot free after {self.admission_timeout:.0f}s.")
+            try:
+                response = self._attempt(payload, timeout, stream)
+                LLM_REQUESTS.inc("upstream")
+                if not stream:
+                    self._slots.release()
+                return response
+            except _Retryable as e:
+                self._slots.release()
+                if attempt >= self.max_retries:
+                    LLM_REQUESTS.inc("failed")
+                    raise OllamaError(f"Ollama request failed after {attempt + 1} attempts: {e.cause}") from e.cause
+                delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                LLM_REQUESTS.inc("retried")
+                print(f"[LLM] Transient Ollama error ({e.cause}); retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                time.sleep(delay)
+            except BaseException:
+                self._slots.release()
+                LLM_REQUESTS.inc("failed")
+                raise
+
+    def _attempt(self, payload: Dict, timeout: Optional[float], stream: bool) -> requests.Response:
+        try:
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload, stream=stream, timeout=timeout)
+        except requests.ConnectionError as e: # Includes ConnectTimeout, not ReadTimeout
+            raise _Retryable(e)
+        if response.status_code == 200:
+            response.encoding = "utf-8"
+            return response
+        try:
+            detail = response.json().get("error")
+        except ValueError:
+            detail = response.text[:200]
+        response.close()
+        error = OllamaError(f"Ollama call failed with status code {response.status_code}. Details: {detail}")
+        if response.status_code in RETRY_STATUS_CODES:
+            raise _Retryable(error)
+        if response.status_code == 404:
+            raise OllamaError(f"Ollama model not found ({detail}); pull it with `ollama pull {payload.get('model')}`.")
+        raise error
+
+
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(base_url: str = OLLAMA_BASE_URL) -> OllamaClient:
+    """The process-wide client for `base_url`, so every LLM wrapper shares its pool and admission limit."""
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = OllamaClient(base_url)
+        return _clients[base_url]
+
+
+class PooledOllama(BaseLLM):
+    """
+    LangChain LLM over the shared OllamaClient (drop-in for langchain_community's Ollama for our use:
+    invoke/generate/stream). generation_info carries Ollama's final message, including
+    prompt_eval_count and eval_count.
+    """
+
+    model: str = "llama2"
+    base_url: str = OLLAMA_BASE_URL
+    temperature: Optional[float] = None
+    num_ctx: Optional[int] = None
+    num_predict: Optional[int] = None
+    timeout: Optional[float] = None
+    keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-pooled"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "base_url": self.base_url, "options": self._options(None)}
+
+    def _options(self, stop: Optional[List[str]]) -> Dict[str, Any]:
+        options = {"temperature": self.temperature, "num_ctx": self.num_ctx, "num_predict": self.num_predict,
+                   "stop": stop or None}
+        return {key: value for key, value in options.items() if value is not None}
+
+    def _payload(self, prompt: str, stop: Optional[List[str]]) -> Dict[str, Any]:
+        payload = {"model": self.model, "prompt": prompt, "options": self._options(stop)}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> LLMResult:
+        client = shared_client(self.base_url)
+        generations = []
+        for prompt in prompts:
+            result = client.generate(self._payload(prompt, stop), timeout=self.timeout)
+            info = {key: value for key, value in result.items() if key != "response"}
+            generations.append([Generation(text=result.get("response", ""), generation_info=info)])
+        return LLMResult(generations=generations)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for message in shared_client(self.base_url).stream(self._payload(prompt, stop), timeout=self.timeout):
+            chunk = GenerationChunk(text=message.get("response", ""),
+                                    generation_info=message if message.get("done") else None)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
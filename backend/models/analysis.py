@@ -1,13 +1,21 @@
 # analysis_models.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-from langchain_community.llms import Ollama
-from langchain.output_parsers import PydanticOutputParser
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import os
 import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+from langchain_core.embeddings import Embeddings
+from disk_cache import DiskCache, make_cache_key
+from llm_client import OLLAMA_BASE_URL, PooledOllama
+from telemetry import debug, span, submit
+from models.merging import MERGE_VERSION, IncrementalAnalysisMerger
+from models.routing import ALL_SECTIONS, SECTION_FIELDS, SINGLE_VALUED_SECTIONS, route_chunks, routing_fingerprint
+from models.packing import ANALYSIS_CHARS_PER_TOKEN, estimate_tokens, pack_segments
 
 # --- Define Structured Output Schemas using Pydantic ---
 
@@ -45,8 +53,25 @@ class RFPAnalysis(BaseModel):
 # Initialize LLM (ensure Ollama is running)
 # Use the same model name as in rag.py for consistency, or choose another if needed
 LLM_MODEL_NAME = os.getenv("OLLAMA_MODEL", "phi3:mini") # Default to mistral if not set
+# Chunks sent to Ollama at once, and how long a single chunk may take before it is dropped
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "4"))
+ANALYSIS_CHUNK_TIMEOUT = float(os.getenv("ANALYSIS_CHUNK_TIMEOUT", "180"))
+# Pre-filter chunks (models/routing.py) so only relevant ones, with only the schema sections they need, reach the LLM
+ANALYSIS_ROUTING = os.getenv("ANALYSIS_ROUTING", "true").lower() in ("1", "true", "yes")
+# Also route by embedding similarity to section prototypes. Off by default: it runs the embedding model over
+# every extraction chunk (which mpnet truncates to ~384 tokens), so the keyword detectors alone route
+ANALYSIS_ROUTING_EMBEDDINGS = os.getenv("ANALYSIS_ROUTING_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+# Context window requested from Ollama (its default is only 2048) and tokens reserved for the JSON answer;
+# routed chunks are packed into each call up to what is left
+ANALYSIS_NUM_CTX = int(os.getenv("ANALYSIS_NUM_CTX", "4096"))
+ANALYSIS_MAX_OUTPUT_TOKENS = int(os.getenv("ANALYSIS_MAX_OUTPUT_TOKENS", "1024"))
 try:
-    llm = Ollama(model=LLM_MODEL_NAME, base_url="http://localhost:11434", temperature=0.1)
+    # The HTTP timeout frees the worker thread of a chunk that was abandoned for running too long
+    # Same pooled client as RAG answers: shared connections and admission limit, and concurrent
+    # analyses of the same document collapse into one upstream call per pack
+    llm = PooledOllama(model=LLM_MODEL_NAME, base_url=OLLAMA_BASE_URL, temperature=0.1,
+                       timeout=ANALYSIS_CHUNK_TIMEOUT, num_ctx=ANALYSIS_NUM_CTX,
+                       num_predict=ANALYSIS_MAX_OUTPUT_TOKENS)
     print(f"[Analysis] Initialized Ollama LLM with model: {LLM_MODEL_NAME}")
 except Exception as e:
     print(f"[Analysis] ERROR initializing Ollama LLM: {e}")
@@ -58,196 +83,388 @@ text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=2000, # Larger chunk size for extraction might capture more context
     chunk_overlap=200,
     length_function=len,
-    separators=["\n\n", "\n", ". ", ", ", " ", ""] # Added ". " and ", "
+    separators=["\n\n", "\n", ". ", ", ", " ", ""], # Added ". " and ", "
+    add_start_index=True, # Offsets let the packer rejoin adjacent chunks without repeating their overlap
 )
 
+# --- Extraction Prompt ---
+# Bump PROMPT_VERSION whenever the prompt wording or RFPAnalysis schema changes meaningfully;
+# the template text and schema are part of the cache key as well, so edits also invalidate on their own.
+PROMPT_VERSION = "2"
+
+# Static prefix first: instructions plus the full compact schema are byte-identical on every call, so
+# Ollama can reuse their KV cache. Everything that varies (requested fields, RFP text) goes after it.
+EXTRACTION_PROMPT_PREFIX = """You are an expert assistant analyzing sections of a Request for Proposals (RFP).
+Read the RFP text at the end and extract ONLY information stated in it, following this JSON schema:
+{format_instructions}
+Rules:
+- Fill only the fields listed under "Fields to extract"; omit every other field.
+- If information for a field is not present in the text, omit the field or use null. Do not guess.
+- Respond with ONLY the JSON object in a ```json ... ``` block: no explanations or other text.
+"""
+
+EXTRACTION_PROMPT_SUFFIX = """
+Fields to extract: {fields}
+
+RFP Text:
+-------
+{rfp_section_text}
+-------
+
+Extracted Information (JSON):
+```json
+""" # Ends on the opening fence to guide the model
+
+EXTRACTION_PROMPT_TEMPLATE = EXTRACTION_PROMPT_PREFIX + EXTRACTION_PROMPT_SUFFIX
+
+# --- Extraction Result Cache ---
+# Whole-document results and per-pack results, so an unchanged document is free and an amendment
+# only re-runs the packs whose text changed.
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "cache/analysis")
+ANALYSIS_CACHE_MAX_MB = int(os.getenv("ANALYSIS_CACHE_MAX_MB", "256"))
+analysis_cache = DiskCache(ANALYSIS_CACHE_DIR, max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _prompt_fingerprint(format_instructions: str, fields: str = "") -> str:
+    return make_cache_key(PROMPT_VERSION, EXTRACTION_PROMPT_TEMPLATE, format_instructions, fields)
+
+def document_cache_key(text: str, prompt_fingerprint: str) -> str:
+    return make_cache_key(
+        "document", _text_hash(text), LLM_MODEL_NAME, text_splitter._chunk_size,
+        text_splitter._chunk_overlap, text_splitter._separators, ANALYSIS_NUM_CTX,
+        ANALYSIS_MAX_OUTPUT_TOKENS, ANALYSIS_CHARS_PER_TOKEN, prompt_fingerprint,
+    )
+
+def chunk_cache_key(chunk: str, prompt_fingerprint: str) -> str:
+    # Splitter and packing settings only decide where packs start and end; a pack's result depends on its text alone
+    return make_cache_key("chunk", _text_hash(chunk), LLM_MODEL_NAME, prompt_fingerprint)
+
+# --- Compact Schema and Per-Section Prompts ---
+def _compact_schema(node: Any) -> Any:
+    """JSON schema without titles and null defaults; they cost prompt tokens and carry nothing for the LLM."""
+    if isinstance(node, dict):
+        return {
+            k: _compact_schema(v) for k, v in node.items()
+            if not (k == "title" and isinstance(v, str)) and not (k == "default" and v is None)
+        }
+    if isinstance(node, list):
+        return [_compact_schema(v) for v in node]
+    return node
+
+def format_instructions_for(model: type) -> str:
+    """Minified JSON schema of `model` (built from the v2 schema; PydanticOutputParser only accepts v1 models)."""
+    schema = _compact_schema({k: v for k, v in model.model_json_schema().items() if k != "type"})
+    return json.dumps(schema, separators=(",", ":"))
+
+FORMAT_INSTRUCTIONS = format_instructions_for(RFPAnalysis)
+_section_prompts: Dict[Tuple[str, ...], Tuple[PromptTemplate, str, int]] = {}
+
+def section_prompt(sections: Tuple[str, ...]) -> Tuple[PromptTemplate, str, int]:
+    """
+    (prompt, prompt fingerprint, estimated prompt overhead in tokens) asking only for the fields of
+    `sections`, built once per section combination. The schema prefix is the same for all of them.
+    """
+    if sections not in _section_prompts:
+        fields = ", ".join(name for section in sections for name in SECTION_FIELDS[section])
+        prompt = PromptTemplate(
+            template=EXTRACTION_PROMPT_TEMPLATE,
+            input_variables=["rfp_section_text"],
+            partial_variables={"format_instructions": FORMAT_INSTRUCTIONS, "fields": fields},
+        )
+        overhead = estimate_tokens(prompt.format(rfp_section_text=""))
+        _section_prompts[sections] = (prompt, _prompt_fingerprint(FORMAT_INSTRUCTIONS, fields), overhead)
+    return _section_prompts[sections]
+
+def text_token_budget(sections: Tuple[str, ...]) -> int:
+    """Tokens left for RFP text in one call: context window minus prompt overhead and the reserved output."""
+    return ANALYSIS_NUM_CTX - ANALYSIS_MAX_OUTPUT_TOKENS - section_prompt(sections)[2]
+
 # --- Helper Function for Merging Results ---
 def merge_analysis_results(results: List[Dict]) -> Dict:
-    """Merges results from multiple chunks into a single consolidated dictionary."""
-    print(f"[Analysis Merge] Merging results from {len(results)} chunks...")
-    merged = RFPAnalysis().dict() # Start with an empty Pydantic model dict
-
-    # Simple fields: Take the first non-null value found
-    simple_fields = ['issuing_agency', 'solicitation_number']
-    for field in simple_fields:
-        for res in results:
-            if res.get(field):
-                merged[field] = res[field]
-                break # Found one, move to next field
-
-    # Nested objects: Merge fields within them, prioritizing non-nulls
-    # Submission Details
-    merged['submission_details'] = SubmissionDetail().dict()
-    submission_fields = ['deadline_date', 'deadline_time', 'submission_method']
-    for field in submission_fields:
-         for res in results:
-            if res.get('submission_details') and res['submission_details'].get(field):
-                merged['submission_details'][field] = res['submission_details'][field]
-                break
-
-    # Formatting Requirements
-    merged['formatting_requirements'] = FormattingRequirements().dict()
-    formatting_simple_fields = ['font_details', 'line_spacing']
-    for field in formatting_simple_fields:
-         for res in results:
-             if res.get('formatting_requirements') and res['formatting_requirements'].get(field):
-                 merged['formatting_requirements'][field] = res['formatting_requirements'][field]
-                 break
-
-    # Lists: Combine unique items
-    # Page Limits (handle potential duplicate sections)
-    seen_page_limits = set()
-    for res in results:
-        if res.get('formatting_requirements') and res['formatting_requirements'].get('page_limits'):
-            for limit in res['formatting_requirements']['page_limits']:
-                 limit_tuple = (limit.get('section', 'general'), limit.get('page_limit'))
-                 if limit_tuple[1] is not None and limit_tuple not in seen_page_limits:
-                      merged['formatting_requirements']['page_limits'].append(limit)
-                      seen_page_limits.add(limit_tuple)
-
-    # Required Sections
-    seen_sections = set()
-    for res in results:
-        if res.get('formatting_requirements') and res['formatting_requirements'].get('required_sections'):
-            for section in res['formatting_requirements']['required_sections']:
-                if section and section not in seen_sections:
-                     merged['formatting_requirements']['required_sections'].append(section)
-                     seen_sections.add(section)
-
-    # Eligibility Criteria (handle potential duplicate details for same type)
-    seen_eligibility = set()
-    for res in results:
-        if res.get('eligibility_criteria'):
-            for criterion in res['eligibility_criteria']:
-                 # Use type and details to check for uniqueness
-                 # Consider normalizing details (lowercase, strip) for better matching
-                 criterion_tuple = (criterion.get('requirement_type'), criterion.get('details', '').lower().strip())
-                 if criterion_tuple[0] and criterion_tuple[1] and criterion_tuple not in seen_eligibility:
-                      merged['eligibility_criteria'].append(criterion)
-                      seen_eligibility.add(criterion_tuple)
-
-    # Clean up empty nested objects if no details were found
-    if all(v is None for v in merged['submission_details'].values()):
-        merged['submission_details'] = None
-    if all(v is None or v == [] for v in merged['formatting_requirements'].values()):
-         merged['formatting_requirements'] = None
-
-    print("[Analysis Merge] Merging complete.")
-    return merged
+    """Merges results from multiple chunks (in document order) into a single consolidated dictionary."""
+    debug(f"[Analysis Merge] Merging results from {len(results)} chunks...")
+    merger = IncrementalAnalysisMerger()
+    for position, result in enumerate(results):
+        merger.add(result, position)
+    debug("[Analysis Merge] Merging complete.")
+    return merger.result()
 
 # --- Updated LLM Extraction Function ---
-def extract_structured_rfp_data(text: str) -> Dict:
+def _token_usage(prompt_text: str, raw_output: str, generation_info: Optional[Dict]) -> Dict[str, int]:
+    """Token counts reported by Ollama for one call, estimated when it reports none."""
+    info = generation_info or {}
+    return {
+        "prompt_tokens": info.get("prompt_eval_count", estimate_tokens(prompt_text)),
+        "completion_tokens": info.get("eval_count", estimate_tokens(raw_output)),
+        "estimated_prompt_tokens": estimate_tokens(prompt_text),
+    }
+
+def _extract_chunk(prompt: PromptTemplate, chunk: str, i: int, total: int) -> Tuple[Optional[Dict], Dict[str, int]]:
     """
-    Uses a dedicated analysis LLM to extract structured info from RFP text in chunks.
+    Runs the analysis LLM on one chunk (or pack of chunks). Returns (parsed dict, token usage); the dict
+    is None if the output could not be parsed. LLM invocation errors are raised to the caller.
     """
-    if not llm:
-        return {"error": "Analysis LLM not initialized. Cannot perform extraction."}
-    if not text:
-        return {"error": "No text provided for analysis."}
-
-    print(f"\n[Analysis Chunking] Splitting text (length: {len(text)} chars)...")
-    chunks = text_splitter.split_text(text)
-    print(f"[Analysis Chunking] Created {len(chunks)} chunks.")
-
-    all_chunk_results = []
-    has_errors = False
-    parser = PydanticOutputParser(pydantic_object=RFPAnalysis)
-
-    # --- MODIFIED: Stricter Prompt Template ---
-    prompt_template = """
-    You are an expert assistant analyzing sections of a Request for Proposals (RFP).
-    Carefully read the following RFP text section and extract ONLY the information relevant to this section that matches the JSON schema.
-    Format your output strictly according to the provided JSON schema.
-    If information for a field is not present IN THIS SECTION, omit the field or use null. Do not guess information from other potential sections.
-
-    IMPORTANT: Your response MUST be ONLY the JSON object requested, enclosed in triple backticks using the json format marker (```json ... ```).
-    Do NOT include any explanations, apologies, greetings, or any other text outside the ```json ... ``` block.
-
-    {format_instructions}
+    debug(f"[Analysis Processing] Processing chunk {i + 1}/{total} using {LLM_MODEL_NAME}...")
+    _input = prompt.format_prompt(rfp_section_text=chunk)
+    with span("extraction_chunk"):
+        generation = llm.generate([_input.to_string()]).generations[0][0] # generate() keeps Ollama's token counts
+    raw_output = generation.text # Store raw output
+    usage = _token_usage(_input.to_string(), raw_output, generation.generation_info)
+    with span("extraction_parse"):
+        return _parse_chunk_output(raw_output, i), usage
+
+def _parse_chunk_output(raw_output: str, i: int) -> Optional[Dict]:
+    """Validated dict from one chunk's raw LLM output, or None if it is not schema-conforming JSON."""
+    cleaned_output = "" # Initialize cleaned output string
+
+    # --- ADDED: Clean the raw output ---
+    # Remove potential markdown fences and surrounding whitespace/newlines
+    if raw_output.strip().startswith("```json"):
+        cleaned_output = raw_output.strip()[7:] # Remove ```json
+    elif raw_output.strip().startswith("```"):
+         cleaned_output = raw_output.strip()[3:] # Remove ```
+    else:
+         cleaned_output = raw_output
 
-    RFP Text Section:
-    -------
-    {rfp_section_text}
-    -------
+    if cleaned_output.strip().endswith("```"):
+        cleaned_output = cleaned_output.strip()[:-3] # Remove trailing ```
 
-    Extracted Information from this section (JSON):
-    ```json
-    """ # Add the opening fence to guide the model
+    cleaned_output = cleaned_output.strip() # Final strip
+    # ---------------------------------
 
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["rfp_section_text"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+    # print(f"[Analysis DEBUG] Cleaned Output chunk {i+1}:\n{cleaned_output}\n") # Debug cleaned output
 
-    for i, chunk in enumerate(chunks):
-        print(f"[Analysis Processing] Processing chunk {i + 1}/{len(chunks)} using {LLM_MODEL_NAME}...")
-        cleaned_output = "" # Initialize cleaned output string
-        raw_output = "" # Initialize raw_output
+    # Attempt to parse the cleaned output
+    try:
+        # --- ADDED: Attempt to load as JSON first for better error context ---
         try:
-            _input = prompt.format_prompt(rfp_section_text=chunk)
-            raw_output = llm.invoke(_input.to_string()) # Store raw output
-
-            # --- ADDED: Clean the raw output ---
-            # Remove potential markdown fences and surrounding whitespace/newlines
-            if raw_output.strip().startswith("```json"):
-                cleaned_output = raw_output.strip()[7:] # Remove ```json
-            elif raw_output.strip().startswith("```"):
-                 cleaned_output = raw_output.strip()[3:] # Remove ```
-            else:
-                 cleaned_output = raw_output
-
-            if cleaned_output.strip().endswith("```"):
-                cleaned_output = cleaned_output.strip()[:-3] # Remove trailing ```
-
-            cleaned_output = cleaned_output.strip() # Final strip
-            # ---------------------------------
-
-            # print(f"[Analysis DEBUG] Cleaned Output chunk {i+1}:\n{cleaned_output}\n") # Debug cleaned output
-
-            # Attempt to parse the cleaned output
+             json_object = json.loads(cleaned_output)
+             parsed_output = RFPAnalysis.parse_obj(json_object) # Parse from dict
+        except json.JSONDecodeError as json_err:
+            # If basic JSON loading fails, re-raise a more informative error
+            raise ValueError(f"Output is not valid JSON: {json_err}") from json_err
+        except Exception as pydantic_err: # Catch Pydantic validation errors specifically
+            raise ValueError(f"JSON is valid, but does not match Pydantic schema: {pydantic_err}") from pydantic_err
+        # ----------------------------------------------------------------------
+
+        debug(f"[Analysis Processing] Chunk {i + 1} parsed successfully.")
+        return parsed_output.dict()
+
+    except Exception as parse_error:
+         # --- MODIFIED: Log the FULL cleaned output ---
+         print(f"[Analysis Processing] Warning: Failed to parse CLEANED output for chunk {i + 1}.")
+         print(f"  Parse Error Type: {type(parse_error).__name__}")
+         print(f"  Parse Error Details: {parse_error}")
+         debug(f"--- FULL Cleaned Output for Chunk {i+1} ---\n{cleaned_output}\n--- END Cleaned Output ---")
+         # ----------------------------------------------
+         return None
+
+def _run_chunks(prompts: List[PromptTemplate], chunks: List[str], indices: List[int],
+                max_concurrency: int, chunk_timeout: float) -> Iterator[Tuple[int, Optional[Dict], Optional[Dict[str, int]], bool]]:
+    """
+    Runs each chunk index in `indices` (using `prompts[i]`) with at most `max_concurrency` in-flight LLM
+    calls (1 = sequential) and yields (index, parsed dict or None, token usage or None, failed) as each
+    one completes. A chunk running longer than `chunk_timeout` seconds is abandoned so it cannot hold up the rest.
+    """
+    if max_concurrency <= 1:
+        for i in indices:
+            # Each chunk on its own worker, so an abandoned one can't delay the next past its deadline
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
             try:
-                # --- ADDED: Attempt to load as JSON first for better error context ---
+                result, usage = submit(executor, _extract_chunk, prompts[i], chunks[i], i, len(chunks)).result(timeout=chunk_timeout)
+            except FuturesTimeoutError:
+                print(f"[Analysis Processing] Chunk {i + 1} exceeded {chunk_timeout:.0f}s timeout, skipping it.")
+                yield i, None, None, True
+                continue
+            except Exception as llm_error:
+                print(f"[Analysis Processing] Error invoking Analysis LLM ({LLM_MODEL_NAME}) for chunk {i + 1}: {llm_error}")
+                yield i, None, None, True
+                continue
+            finally:
+                executor.shutdown(wait=False)
+            yield i, result, usage, False
+        return
+
+    started_at: Dict[int, float] = {}
+
+    def run(i: int, chunk: str) -> Tuple[Optional[Dict], Dict[str, int]]:
+        started_at[i] = time.monotonic() # Timeout counts from when the chunk gets a worker, not from queueing
+        return _extract_chunk(prompts[i], chunk, i, len(chunks))
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="analysis")
+    try:
+        futures = {submit(executor, run, i, chunks[i]): i for i in indices}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
                 try:
-                     json_object = json.loads(cleaned_output)
-                     parsed_output = RFPAnalysis.parse_obj(json_object) # Parse from dict
-                except json.JSONDecodeError as json_err:
-                    # If basic JSON loading fails, re-raise a more informative error
-                    raise ValueError(f"Output is not valid JSON: {json_err}") from json_err
-                except Exception as pydantic_err: # Catch Pydantic validation errors specifically
-                    raise ValueError(f"JSON is valid, but does not match Pydantic schema: {pydantic_err}") from pydantic_err
-                # ----------------------------------------------------------------------
-
-                all_chunk_results.append(parsed_output.dict())
-                print(f"[Analysis Processing] Chunk {i + 1} parsed successfully.")
-
-            except Exception as parse_error:
-                 # --- MODIFIED: Log the FULL cleaned output ---
-                 print(f"[Analysis Processing] Warning: Failed to parse CLEANED output for chunk {i + 1}.")
-                 print(f"  Parse Error Type: {type(parse_error).__name__}")
-                 print(f"  Parse Error Details: {parse_error}")
-                 print(f"--- FULL Cleaned Output for Chunk {i+1} ---")
-                 print(cleaned_output)
-                 print(f"--- END Cleaned Output ---")
-                 # ----------------------------------------------
-
-        except Exception as llm_error:
-            print(f"[Analysis Processing] Error invoking Analysis LLM ({LLM_MODEL_NAME}) for chunk {i + 1}: {llm_error}")
-            # Optionally log raw_output here too if LLM fails completely
-            # print(f"--- Raw Output (LLM Error) --- \n{raw_output}\n--- End Raw Output ---")
-            has_errors = True
-
-    if not all_chunk_results and has_errors:
-         return {"error": f"Analysis LLM ({LLM_MODEL_NAME}) invocation failed for all chunks."}
-    if not all_chunk_results:
-         return {"warning": "No structured data could be extracted from any chunk.", "details": {}}
+                    result, usage = future.result()
+                except Exception as llm_error:
+                    print(f"[Analysis Processing] Error invoking Analysis LLM ({LLM_MODEL_NAME}) for chunk {i + 1}: {llm_error}")
+                    yield i, None, None, True
+                    continue
+                yield i, result, usage, False
+            now = time.monotonic()
+            for future in list(pending):
+                i = futures[future]
+                if i in started_at and now - started_at[i] > chunk_timeout:
+                    print(f"[Analysis Processing] Chunk {i + 1} exceeded {chunk_timeout:.0f}s timeout, skipping it.")
+                    pending.discard(future)
+                    yield i, None, None, True
+    finally:
+        # Don't wait for abandoned chunks (or a consumer that stopped listening); their HTTP timeout releases the threads
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _sum_usage(usage: List[Optional[Dict[str, int]]]) -> Dict[str, int]:
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "estimated_prompt_tokens": 0}
+    for call in usage:
+        for key in totals:
+            totals[key] += (call or {}).get(key, 0)
+    totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+    return totals
+
+def extract_structured_rfp_data(text: str, max_concurrency: Optional[int] = None,
+                                chunk_timeout: Optional[float] = None, use_cache: bool = True,
+                                embeddings: Optional[Embeddings] = None, routing: Optional[bool] = None) -> Dict:
+    """
+    Uses a dedicated analysis LLM to extract structured info from RFP text in chunks.
+    With routing on, chunks are pre-filtered (keyword detectors, plus similarity to section prototypes
+    when `embeddings` is given and ANALYSIS_ROUTING_EMBEDDINGS is on) and each relevant chunk is asked only for the schema sections it can answer.
+    Routed chunks are then packed into as few calls as fit ANALYSIS_NUM_CTX, processed concurrently
+    (up to `max_concurrency` at once, 1 = sequential).
+    Document and per-pack results are cached on disk (see ANALYSIS_CACHE_DIR).
+    The result carries `extraction_stats`: chunk/pack counts and the tokens used for this document.
+    """
+    final: Dict = {}
+    for event in iter_structured_rfp_data(text, max_concurrency, chunk_timeout, use_cache, embeddings, routing):
+        final = event["analysis"]
+    return final
 
-    try:
-        final_merged_data = merge_analysis_results(all_chunk_results)
-        return final_merged_data
-    except Exception as merge_error:
-        print(f"[Analysis Merge] Error during merging: {merge_error}")
-        return {"error": f"Failed to merge results from chunks: {merge_error}"}
+def _partial_event(merger: IncrementalAnalysisMerger, completed: int, total: int) -> Dict:
+    return {"event": "partial", "analysis": merger.result(), "completed": completed, "total": total}
+
+def iter_structured_rfp_data(text: str, max_concurrency: Optional[int] = None,
+                             chunk_timeout: Optional[float] = None, use_cache: bool = True,
+                             embeddings: Optional[Embeddings] = None, routing: Optional[bool] = None) -> Iterator[Dict]:
+    """
+    extract_structured_rfp_data as a stream of events. Each pack result is folded into the running
+    analysis as it arrives, followed by {"event": "partial", "analysis", "completed", "total"} (cached
+    packs arrive together first). The last event is {"event": "result", "analysis": <the final result>}.
+    Packs that can answer the identity and submission sections run first so the agency and deadline show up early.
+    """
+    max_concurrency = max_concurrency or ANALYSIS_MAX_CONCURRENCY
+    chunk_timeout = chunk_timeout or ANALYSIS_CHUNK_TIMEOUT
+    routing = ANALYSIS_ROUTING if routing is None else routing
+    embeddings = embeddings if ANALYSIS_ROUTING_EMBEDDINGS else None # Only the router uses them
+    if not llm:
+        yield {"event": "result", "analysis": {"error": "Analysis LLM not initialized. Cannot perform extraction."}}
+        return
+    if not text:
+        yield {"event": "result", "analysis": {"error": "No text provided for analysis."}}
+        return
+
+    debug(f"\n[Analysis Chunking] Splitting text (length: {len(text)} chars)...")
+    segments = text_splitter.create_documents([text])
+    chunks = [segment.page_content for segment in segments]
+    spans = [(segment.metadata["start_index"], segment.metadata["start_index"] + len(segment.page_content))
+             for segment in segments]
+    debug(f"[Analysis Chunking] Created {len(chunks)} chunks.")
+
+    _, full_fingerprint, _ = section_prompt(ALL_SECTIONS)
+    routing_mode = routing_fingerprint(embeddings) if routing else "routing-off"
+
+    doc_key = document_cache_key(text, make_cache_key(full_fingerprint, routing_mode, MERGE_VERSION))
+    if use_cache:
+        cached_result = analysis_cache.get(doc_key)
+        if cached_result is not None:
+            debug("[Analysis Cache] Document result cache hit, skipping extraction.")
+            stats = {**cached_result.get("extraction_stats", {}), "llm_calls": 0, "tokens": _sum_usage([]),
+                     "document_cache_hit": True}
+            yield {"event": "result", "analysis": {**cached_result, "extraction_stats": stats}}
+            return
+
+    # --- Routing: which chunks need the LLM, and for which schema sections ---
+    routes: List[Tuple[str, ...]] = [ALL_SECTIONS] * len(chunks)
+    if routing:
+        with span("extraction_routing"):
+            routes = route_chunks(chunks, embeddings)
+        if not any(routes[1:]) and not any(s != "identity" for s in routes[0]):
+            print("[Analysis Routing] No section detectors fired; falling back to the full schema on every chunk.")
+            routes = [ALL_SECTIONS] * len(chunks)
+    routed = [i for i, sections in enumerate(routes) if sections]
+    debug(f"[Analysis Routing] {len(routed)}/{len(chunks)} chunks routed to the LLM, {len(chunks) - len(routed)} skipped.")
+
+    # --- Packing: as many routed chunks per call as fit the context window ---
+    with span("extraction_packing"):
+        packs = pack_segments(text, spans, routes, text_token_budget, ALL_SECTIONS)
+    pack_texts = [pack.text for pack in packs]
+    debug(f"[Analysis Packing] {len(routed)} routed chunks packed into {len(packs)} LLM calls "
+          f"(num_ctx={ANALYSIS_NUM_CTX}, {ANALYSIS_MAX_OUTPUT_TOKENS} tokens reserved for output).")
+
+    prompts: List[PromptTemplate] = []
+    pack_keys: List[str] = []
+    for pack in packs:
+        prompt, fingerprint, _ = section_prompt(pack.sections)
+        prompts.append(prompt)
+        pack_keys.append(chunk_cache_key(pack.text, fingerprint))
+
+    # --- Incremental merge: results are folded in as they arrive and not kept ---
+    merger = IncrementalAnalysisMerger()
+    to_run: List[int] = []
+    for i, key in enumerate(pack_keys):
+        cached = analysis_cache.get(key) if use_cache else None
+        if cached is None:
+            to_run.append(i)
+        else:
+            merger.add(cached, i)
+    completed = len(packs) - len(to_run)
+    debug(f"[Analysis Cache] {completed}/{len(packs)} packs served from cache.")
+    if completed:
+        yield _partial_event(merger, completed, len(packs))
+
+    to_run.sort(key=lambda i: (not any(s in SINGLE_VALUED_SECTIONS for s in packs[i].sections), i))
+    usage: List[Optional[Dict[str, int]]] = []
+    has_errors = False
+    incomplete = False # Some pack failed or came back unparseable: the merged result is partial
+    for i, result, call_usage, failed in _run_chunks(prompts, pack_texts, to_run, max_concurrency, chunk_timeout):
+        completed += 1
+        has_errors = has_errors or failed
+        incomplete = incomplete or result is None
+        usage.append(call_usage)
+        if result is not None: # Failed or unparseable packs are retried next time
+            analysis_cache.set(pack_keys[i], result)
+            with span("extraction_merge"):
+                merger.add(result, i)
+        yield _partial_event(merger, completed, len(packs))
+
+    tokens = _sum_usage(usage)
+    debug(f"[Analysis Tokens] {tokens['total_tokens']} tokens used ({tokens['prompt_tokens']} prompt, "
+          f"{tokens['completion_tokens']} completion) across {len(to_run)} LLM calls.")
+    extraction_stats = {
+        "chunks": len(chunks),
+        "skipped": len(chunks) - len(routed),
+        "packs": len(packs),
+        "sent_to_llm": sum(len(packs[i].indices) for i in to_run),
+        "llm_calls": len(to_run),
+        "cached": len(packs) - len(to_run),
+        "context_tokens": ANALYSIS_NUM_CTX,
+        "tokens": tokens,
+    }
+
+    if not merger.merged_count and has_errors:
+        final = {"error": f"Analysis LLM ({LLM_MODEL_NAME}) invocation failed for all chunks."}
+    elif not merger.merged_count:
+        final = {"warning": "No structured data could be extracted from any chunk.", "details": {},
+                 "extraction_stats": extraction_stats}
+    else:
+        final = {**merger.result(), "extraction_stats": extraction_stats}
+        if not incomplete: # Partial results must not stick; a rerun should retry the failed or unparseable packs
+            analysis_cache.set(doc_key, final)
+    yield {"event": "result", "analysis": final}
 
 
 # --- Example Usage ---
@@ -0,0 +1,168 @@
+# merging.py
+# Incremental merge of per-pack extraction results into one RFPAnalysis-shaped dict, with normalized
+# and fuzzy dedup keys for the list fields. Identifiers (numbers, single letters, roman numerals) must match
+# exactly: "ISO 9001" / "ISO 27001" or "Volume I" / "Volume II" are one character apart but different items.
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional, Tuple
+
+MERGE_VERSION = "2" # Bump when dedup rules change; part of the document result cache key
+# Two list items whose normalized text is at least this similar are treated as the same item
+ANALYSIS_DEDUP_SIMILARITY = float(os.getenv("ANALYSIS_DEDUP_SIMILARITY", "0.85"))
+
+SIMPLE_FIELDS = ("issuing_agency", "solicitation_number")
+SUBMISSION_FIELDS = ("deadline_date", "deadline_time", "submission_method")
+FORMATTING_FIELDS = ("font_details", "line_spacing")
+
+_FILLER_WORDS = {"a", "an", "the", "of", "and", "or", "must", "be", "is", "are", "shall", "should", "required",
+                 "requirement", "offeror", "offerors", "bidder", "bidders", "vendor", "vendors", "proposer", "proposers"}
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase words without punctuation, filler or plural s ("Must be registered in SAM.gov." -> "registered in sam gov")."""
+    words = re.findall(r"[a-z0-9$]+", str(text or "").lower())
+    return " ".join(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+                    for word in words if word not in _FILLER_WORDS)
+
+
+_IDENTIFIER_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[A-Za-z]+")
+_ROMAN_NUMERAL = re.compile(r"x{0,3}(?:ix|iv|v?i{0,3})")
+_DOTTED_ABBREVIATION = re.compile(r"\b(?:[A-Za-z]\.){2,}") # e.g., i.e., U.S.
+
+
+def identifier_tokens(text: Optional[str]) -> Tuple[str, ...]:
+    """Numbers, single letters and roman numerals in `text`, sorted ("Attachment B, Volume II" -> ("b", "ii"))."""
+    tokens = []
+    matches = _IDENTIFIER_TOKEN.finditer(_DOTTED_ABBREVIATION.sub(" ", str(text or "")))
+    for index, match in enumerate(matches):
+        token = match.group(0)
+        if token[0].isdigit():
+            tokens.append(token.replace(",", ""))
+        elif len(token) == 1:
+            # The article "a" is not an identifier; a capital "A" past the first word is ("Attachment A")
+            if token != "a" and not (token == "A" and index == 0):
+                tokens.append(token.lower())
+        elif _ROMAN_NUMERAL.fullmatch(token.lower()):
+            tokens.append(token.lower())
+    return tuple(sorted(tokens))
+
+
+def similar(a: str, b: str, threshold: float = ANALYSIS_DEDUP_SIMILARITY) -> bool:
+    if a == b:
+        return True
+    if not a or not b:
+        return False
+    # Cheap length bound first: ratio() can't reach the threshold when lengths differ too much
+    if 2 * min(len(a), len(b)) / (len(a) + len(b)) < threshold:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+class _DedupList:
+    """
+    Items kept in (position, arrival) order, skipping any whose key matches an existing item's key.
+    On a duplicate, the earlier item is kept and `combine(kept, other)` may copy details over from the other.
+    """
+
+    def __init__(self, threshold: float, combine: Optional[Callable[[Dict, Dict], None]] = None):
+        self.threshold = threshold
+        self.combine = combine
+        self.items: List[Tuple[Tuple[int, int], Tuple, Dict]] = [] # (order, key, item)
+        self._exact: Dict[Tuple, int] = {}
+
+    def add(self, key: Tuple, item, order: Tuple[int, int]) -> None:
+        match = self._exact.get(key)
+        if match is None:
+            match = next((i for i, (_, existing, _) in enumerate(self.items) if self._same(key, existing)), None)
+        if match is None:
+            self._exact[key] = len(self.items)
+            self.items.append((order, key, item))
+            return
+        existing_order, existing_key, existing = self.items[match]
+        kept, other = (item, existing) if order < existing_order else (existing, item)
+        if kept is item: # Keep document order deterministic whatever the arrival order
+            self.items[match] = (order, existing_key, item)
+        if self.combine is not None:
+            self.combine(kept, other)
+
+    def _same(self, a: Tuple, b: Tuple) -> bool:
+        # Keys are (exact part..., fuzzy text); the exact parts must match and the text must be similar
+        return a[:-1] == b[:-1] and similar(a[-1], b[-1], self.threshold)
+
+    def values(self) -> List:
+        return [item for _, _, item in sorted(self.items, key=lambda entry: entry[0])]
+
+
+def _combine_criteria(kept: Dict, other: Dict) -> None:
+    # A duplicate may be the only copy that says whether the requirement is mandatory
+    if kept.get("is_mandatory") is None and other.get("is_mandatory") is not None:
+        kept["is_mandatory"] = other["is_mandatory"]
+
+
+class IncrementalAnalysisMerger:
+    """
+    Folds per-pack results into a running analysis as they arrive (in any order), without keeping them.
+
+    `position` is the pack's index in the document. Scalars keep the value from the earliest position that
+    had one, and lists keep document order, so the final result doesn't depend on completion order.
+    List items are deduplicated on normalized text, fuzzily (ANALYSIS_DEDUP_SIMILARITY), once their
+    identifier tokens match exactly.
+    """
+
+    def __init__(self, threshold: float = ANALYSIS_DEDUP_SIMILARITY):
+        self._scalars: Dict[str, Tuple[int, object]] = {} # "field" or "object.field" -> (position, value)
+        self._page_limits = _DedupList(threshold)
+        self._sections = _DedupList(threshold)
+        self._eligibility = _DedupList(threshold, combine=_combine_criteria)
+        self._arrivals = 0
+        self.merged_count = 0
+
+    def add(self, result: Dict, position: int) -> None:
+        self.merged_count += 1
+        for field in SIMPLE_FIELDS:
+            self._set_scalar(field, result.get(field), position)
+        submission = result.get("submission_details") or {}
+        for field in SUBMISSION_FIELDS:
+            self._set_scalar(f"submission_details.{field}", submission.get(field), position)
+        formatting = result.get("formatting_requirements") or {}
+        for field in FORMATTING_FIELDS:
+            self._set_scalar(f"formatting_requirements.{field}", formatting.get(field), position)
+
+        for limit in formatting.get("page_limits") or []:
+            if limit.get("page_limit") is not None:
+                section = limit.get("section") or "general"
+                key = (limit.get("page_limit"), identifier_tokens(section), normalize_text(section))
+                self._page_limits.add(key, limit, self._order(position))
+        for section in formatting.get("required_sections") or []:
+            if section:
+                self._sections.add((identifier_tokens(section), normalize_text(section)), section, self._order(position))
+        for criterion in result.get("eligibility_criteria") or []:
+            requirement_type, details = criterion.get("requirement_type"), criterion.get("details")
+            if requirement_type and details:
+                key = (normalize_text(requirement_type), identifier_tokens(details), normalize_text(details))
+                self._eligibility.add(key, dict(criterion), self._order(position))
+
+    def _order(self, position: int) -> Tuple[int, int]:
+        self._arrivals += 1
+        return position, self._arrivals
+
+    def _set_scalar(self, key: str, value, position: int) -> None:
+        if value and (key not in self._scalars or position < self._scalars[key][0]):
+            self._scalars[key] = (position, value)
+
+    def _scalar(self, key: str):
+        return self._scalars.get(key, (None, None))[1]
+
+    def result(self) -> Dict:
+        """Current merged analysis, shaped like RFPAnalysis().dict() with empty nested objects as None."""
+        submission = {field: self._scalar(f"submission_details.{field}") for field in SUBMISSION_FIELDS}
+        formatting = {field: self._scalar(f"formatting_requirements.{field}") for field in FORMATTING_FIELDS}
+        formatting["page_limits"] = self._page_limits.values()
+        formatting["required_sections"] = self._sections.values()
+        return {
+            **{field: self._scalar(field) for field in SIMPLE_FIELDS},
+            "submission_details": submission if any(v is not None for v in submission.values()) else None,
+            "formatting_requirements": formatting if any(v not in (None, []) for v in formatting.values()) else None,
+            "eligibility_criteria": self._eligibility.values(),
+        }
@@ -0,0 +1,72 @@
+# packing.py
+# Token-budgeted packing of routed text segments into as few extraction LLM calls as fit the context window.
+import math
+import os
+from typing import Callable, List, Sequence, Tuple
+
+# Ollama models have no local tokenizer here, so token counts are estimated from characters.
+# 3 chars/token is conservative for English prose (most tokenizers average ~4), which keeps packed
+# prompts under num_ctx; Ollama silently truncates prompts that overflow it.
+ANALYSIS_CHARS_PER_TOKEN = float(os.getenv("ANALYSIS_CHARS_PER_TOKEN", "3.0"))
+GAP_MARKER = "\n[...]\n" # Joins non-adjacent segments inside one pack
+
+
+def estimate_tokens(text: str, chars_per_token: float = ANALYSIS_CHARS_PER_TOKEN) -> int:
+    return math.ceil(len(text) / chars_per_token)
+
+
+class Pack:
+    """Segments sent to the LLM in one call, with the union of the schema sections they need."""
+
+    def __init__(self, indices: List[int], sections: Tuple[str, ...], text: str):
+        self.indices = indices
+        self.sections = sections
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"Pack(segments={self.indices}, sections={self.sections}, chars={len(self.text)})"
+
+
+def pack_text(text: str, spans: Sequence[Tuple[int, int]]) -> str:
+    """Text covered by `spans` (in order), reading overlapping/adjacent spans once and marking gaps."""
+    parts: List[str] = []
+    run_start, run_end = spans[0]
+    for start, end in spans[1:]:
+        if start <= run_end:
+            run_end = max(run_end, end)
+        else:
+            parts.append(text[run_start:run_end])
+            run_start, run_end = start, end
+    parts.append(text[run_start:run_end])
+    return GAP_MARKER.join(parts)
+
+
+def pack_segments(text: str, spans: Sequence[Tuple[int, int]], routes: Sequence[Tuple[str, ...]],
+                  prompt_budget: Callable[[Tuple[str, ...]], int], section_order: Sequence[str],
+                  chars_per_token: float = ANALYSIS_CHARS_PER_TOKEN) -> List[Pack]:
+    """
+    Greedily packs routed segments (non-empty route), in document order, into packs whose estimated
+    text tokens fit `prompt_budget(sections)` for the pack's section union. `spans` are the segments'
+    (start, end) offsets into `text`. A segment that alone exceeds the budget still gets its own pack.
+    """
+    def union(a: Sequence[str], b: Sequence[str]) -> Tuple[str, ...]:
+        return tuple(s for s in section_order if s in a or s in b)
+
+    packs: List[Pack] = []
+    indices: List[int] = []
+    sections: Tuple[str, ...] = ()
+    for i, route in enumerate(routes):
+        if not route:
+            continue
+        if indices:
+            candidate_sections = union(sections, route)
+            candidate_text = pack_text(text, [spans[j] for j in indices + [i]])
+            if estimate_tokens(candidate_text, chars_per_token) <= prompt_budget(candidate_sections):
+                indices.append(i)
+                sections = candidate_sections
+                continue
+            packs.append(Pack(indices, sections, pack_text(text, [spans[j] for j in indices])))
+        indices, sections = [i], tuple(route)
+    if indices:
+        packs.append(Pack(indices, sections, pack_text(text, [spans[j] for j in indices])))
+    return packs
@@ -0,0 +1,108 @@
+# routing.py
+# Cheap pre-filter deciding which chunks go to the extraction LLM and which schema sections each needs.
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ROUTING_VERSION = "2" # Bump when detectors or prototypes change; part of the extraction cache key
+ROUTING_SIMILARITY_THRESHOLD = float(os.getenv("ROUTING_SIMILARITY_THRESHOLD", "0.35"))
+# Sections whose fields merge as "first non-null wins" take only their strongest few chunks matched by
+# embedding similarity alone; chunks a keyword detector fires on are always kept (e.g. an amended deadline)
+ROUTING_MAX_CHUNKS_PER_SECTION = int(os.getenv("ROUTING_MAX_CHUNKS_PER_SECTION", "3"))
+SINGLE_VALUED_SECTIONS = ("identity", "submission")
+
+# Schema sections and the RFPAnalysis fields each one covers
+SECTION_FIELDS: Dict[str, List[str]] = {
+    "identity": ["issuing_agency", "solicitation_number"],
+    "submission": ["submission_details"],
+    "formatting": ["formatting_requirements"],
+    "eligibility": ["eligibility_criteria"],
+}
+ALL_SECTIONS: Tuple[str, ...] = tuple(SECTION_FIELDS)
+
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+# Kept deliberately specific: page headers ("Page 3 of 40", "RFP 25-008") and boilerplate ("must be",
+# "submit") appear in nearly every chunk and would route everything.
+SECTION_PATTERNS: Dict[str, re.Pattern] = {
+    "identity": re.compile(
+        r"solicitation\s*(?:no|number|#)|issued by|issuing (?:agency|office|department)|contracting officer", re.I),
+    "submission": re.compile(
+        r"deadline|due (?:date|by|on)|(?:bids?|proposals?|responses?|submissions?) (?:are |is |shall be |must be )?due"
+        r"|no later than|closing date|sealed (?:bid|proposal)|submi(?:t|tted|ssion) (?:electronically|via|through|by mail)"
+        rf"|\b{_MONTHS}\s+\d{{1,2}},?\s+\d{{4}}|\b\d{{1,2}}:\d{{2}}\s*(?:a\.?\s?m|p\.?\s?m)", re.I),
+    "formatting": re.compile(
+        r"page limit|(?:not|no) (?:to )?exceed \d+ pages|limited to \d+ pages|\b\d+\s*-?\s*page (?:limit|maximum)"
+        r"|font|\b\d{1,2}\s*-?(?:pt|point)\b|times new roman|arial|calibri|line spacing|(?:single|double)[- ]spaced"
+        r"|margins?\b|table of contents|executive summary", re.I),
+    "eligibility": re.compile(
+        r"eligib|certificat|certified|licens|registered (?:with|in)|sam\.gov|insurance|years? of (?:\w+ )?experience"
+        r"|iso\s*\d+|bonds?\b|hubzone|small business|8\(a\)|minimum qualifications|must (?:possess|demonstrate)"
+        r"|minimum of \d+", re.I),
+}
+
+# Prototype queries for embedding-based routing (catches paraphrases the regexes miss)
+SECTION_PROTOTYPES: Dict[str, str] = {
+    "identity": "Name of the issuing agency and the RFP solicitation number.",
+    "submission": "Proposal submission deadline date and time, and how proposals must be submitted.",
+    "formatting": "Proposal formatting rules: page limits, font type and size, line spacing, required sections.",
+    "eligibility": "Offeror eligibility requirements: certifications, registrations, licenses, insurance, years of experience.",
+}
+
+
+def detect_sections(chunk: str) -> Dict[str, int]:
+    """Section -> number of distinct detector matches in `chunk` (sections with no match are omitted)."""
+    hits = {}
+    for section, pattern in SECTION_PATTERNS.items():
+        matches = {m.group(0).lower() for m in pattern.finditer(chunk)}
+        if matches:
+            hits[section] = len(matches)
+    return hits
+
+
+def route_chunks(chunks: Sequence[str], embeddings: Optional[Embeddings] = None,
+                 threshold: float = ROUTING_SIMILARITY_THRESHOLD,
+                 max_chunks_per_section: int = ROUTING_MAX_CHUNKS_PER_SECTION) -> List[Tuple[str, ...]]:
+    """
+    Schema sections to request for each chunk (empty tuple = skip the chunk).
+    Keyword/regex detectors run on every chunk; with `embeddings`, chunks similar enough to a
+    section's prototype query also get that section. For single-valued sections, chunks matched only
+    by similarity are capped at the `max_chunks_per_section` most similar; detector matches always stay.
+    The first chunk always gets "identity", since cover pages carry the agency and solicitation number.
+    """
+    detected = [detect_sections(chunk) for chunk in chunks]
+    scores = [{s: float(n) for s, n in hits.items()} for hits in detected]
+    if embeddings is not None and chunks:
+        try:
+            chunk_vectors = _normalize(embeddings.embed_documents(list(chunks)))
+            prototype_vectors = _normalize(embeddings.embed_documents(list(SECTION_PROTOTYPES.values())))
+            similarities = chunk_vectors @ prototype_vectors.T
+            for i, j in zip(*np.nonzero(similarities >= threshold)):
+                section = list(SECTION_PROTOTYPES)[j]
+                scores[i][section] = scores[i].get(section, 0.0) + float(similarities[i, j])
+        except Exception as e:
+            print(f"[Analysis Routing] Embedding routing failed, using keyword detectors only: {e}")
+    if scores:
+        scores[0]["identity"] = float("inf")
+
+    for section in SINGLE_VALUED_SECTIONS:
+        similar_only = [i for i, s in enumerate(scores) if section in s and section not in detected[i]]
+        ranked = sorted(similar_only, key=lambda i: -scores[i][section])
+        for i in ranked[max_chunks_per_section:]:
+            del scores[i][section]
+    # Keep schema order stable so prompts (and their cache keys) are deterministic
+    return [tuple(s for s in ALL_SECTIONS if s in chunk_scores) for chunk_scores in scores]
+
+
+def routing_fingerprint(embeddings: Optional[Embeddings]) -> str:
+    mode = f"embeddings:{getattr(embeddings, 'model_name', type(embeddings).__name__)}:{ROUTING_SIMILARITY_THRESHOLD}" if embeddings else "keywords"
+    return f"routing-v{ROUTING_VERSION}:{mode}:top{ROUTING_MAX_CHUNKS_PER_SECTION}"
+
+
+def _normalize(vectors) -> np.ndarray:
+    array = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return array / norms
@@ -1,34 +1,50 @@
 import os
-from typing import List, Tuple
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import shutil
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever, ContextualCompressionRetriever
-from langchain_cohere import CohereRerank
+from langchain.retrievers import ContextualCompressionRetriever
 from langchain_core.documents import Document
-from langchain_community.llms import Ollama
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from pydantic import BaseModel
 import cohere
+import numpy as np
+from disk_cache import DiskCache, file_sha256, make_cache_key
+from corpus import DocumentCorpus
+from ingestion import IngestionPipeline, make_text_splitter
+from embedding import EmbeddingStage, decode_vectors, encode_vectors
+from jobs import JobManager
+from rerankers import RERANKER_BACKEND, TimedCompressionRetriever, build_reranker, rerank_batch
+from answer_cache import SemanticAnswerCache
+from dense_index import DENSE_INDEX_DIR, DenseVectorIndex
+from fusion import HybridFusionRetriever, retrieval_options
+from registry import RAGRegistry, owned_memory_bytes
+from llm_client import OLLAMA_BASE_URL, OllamaBusyError, PooledOllama
+from context import PageKey, assemble_context
+import telemetry
+from telemetry import StageTimingCallback, debug, span, submit, timed
 
 # --- CORRECTED IMPORT ---
 try:
-    from models.analysis import extract_structured_rfp_data # Import the new function
-    print("[Import Check] Successfully imported extract_structured_rfp_data from models.analysis")
+    from models.analysis import extract_structured_rfp_data, iter_structured_rfp_data # Import the new functions
+    debug("[Import Check] Successfully imported extract_structured_rfp_data from models.analysis")
 except ImportError as e:
     print(f"Error: Could not import from models.analysis. Details: {e}")
     # Define a dummy function
     def extract_structured_rfp_data(text: str) -> dict:
         print("Warning: Using dummy extract_structured_rfp_data function.")
         return {"error": "Structured extraction module not loaded"}
+    def iter_structured_rfp_data(text: str, **kwargs):
+        yield {"event": "result", "analysis": extract_structured_rfp_data(text)}
 # -----------------------
 
 load_dotenv()
@@ -36,7 +52,7 @@ load_dotenv()
 # Check for Cohere API Key
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 if not COHERE_API_KEY:
-    print("Warning: COHERE_API_KEY not found in environment variables. Re-ranking will not work.")
+    print("Warning: COHERE_API_KEY not found in environment variables. Falling back to the local cross-encoder reranker.")
     # Or raise an exception if it's critical: raise ValueError("COHERE_API_KEY not set")
 
 # Initialize FastAPI app
@@ -49,8 +65,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """Request latency histogram, plus the request's stage spans as a Server-Timing header when TIMING_HEADERS is on."""
+    timings = telemetry.start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = getattr(request.scope.get("route"), "path", "unmatched") # Route template keeps label cardinality bounded
+    telemetry.REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    if telemetry.TIMING_HEADERS:
+        response.headers["Server-Timing"] = timings.server_timing(total_seconds=elapsed)
+    return response
+
 # Define the prompt template properly
 template = """Based on the following context, please answer the question.
 If the answer is explicitly stated in the context, use that information.
@@ -64,211 +94,688 @@ Answer:"""
 
 PROMPT = PromptTemplate(template=template, input_variables=["context", "question"])
 
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+RAG_CHUNK_SIZE = 500
+RAG_CHUNK_OVERLAP = 100
+RAG_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# --- Ingestion Cache ---
+# Parsed pages, splits and embedding vectors keyed by file content + splitter settings + embedding model
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", "cache/ingest")
+INGEST_CACHE_MAX_MB = int(os.getenv("INGEST_CACHE_MAX_MB", "1024"))
+ingest_cache = DiskCache(INGEST_CACHE_DIR, max_bytes=INGEST_CACHE_MAX_MB * 1024 * 1024)
+
+# --- Persistent Document Corpus ---
+CORPUS_DIR = os.getenv("CORPUS_DIR", "cache/corpus")
+# Dense retrieval for the active document: "chroma" (the corpus) or "numpy" (in-process memory-mapped
+# matrix). Multi-document queries always go through the Chroma corpus.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# /query/batch: LLM generations in flight at once, and the most questions accepted per request
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+QUERY_BATCH_MAX_QUESTIONS = int(os.getenv("QUERY_BATCH_MAX_QUESTIONS", "100"))
+
 class HybridRAGSystem:
-    def __init__(self, model_name: str = "llama2"):
+    def __init__(self, model_name: str = "llama2", embeddings: Optional[HuggingFaceEmbeddings] = None,
+                 corpus: Optional[DocumentCorpus] = None, reranker=None,
+                 answer_cache: Optional[SemanticAnswerCache] = None):
         self.model_name = model_name
         self.documents = []
         self.splits = [] # Initialize splits
-        self.full_text: str | None = None # Make sure this is populated
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=100,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+        self.text_splitter = make_text_splitter(RAG_CHUNK_SIZE, RAG_CHUNK_OVERLAP, RAG_SEPARATORS)
+        # Embedding model and corpus are shared when a fresh system is built for a new upload
+        self.embeddings = embeddings or HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME
         )
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2"
-        )
-        self.vectorstore = None
-        self.bm25_retriever = None
-        self.semantic_retriever = None
-        self.ensemble_retriever = None
+        self.split_vectors = [] # Embeddings for self.splits, same order (float32 array once loaded)
+        self.ingest_stats: Dict = {}
+        self.doc_id: Optional[str] = None # Content hash of the loaded document
+        self.filename: Optional[str] = None
+        self.corpus = corpus or DocumentCorpus(CORPUS_DIR, self.embeddings)
+        self.vectorstore = self.corpus.vectorstore
+        self.dense_index: Optional[DenseVectorIndex] = None
+        # Shared across uploads so the local reranker's model and score cache survive document swaps
+        self.reranker = reranker or build_reranker(COHERE_API_KEY)
+        self.answer_cache = answer_cache or SemanticAnswerCache(self.embeddings)
+        self.llm = None
+        self._scoped_retrievers = {} # tuple(doc_ids) -> retriever for multi-document queries
+        self.fusion_retriever = None
         self.compression_retriever = None
-        self.rag_chain = None
-
-    def load_single_document(self, file_path: str) -> None:
-        """Load a single document and store its full text."""
-        print(f"\n[Backend] Loading document: {file_path}")
-        if file_path.endswith('.txt'):
-            loader = TextLoader(file_path)
-            self.documents = loader.load()
-        elif file_path.endswith('.pdf'):
-            loader = PyPDFLoader(file_path)
-            self.documents = loader.load()
-            print(f"[Backend] Loaded PDF with {len(self.documents)} pages.")
-        else:
-             raise ValueError(f"Unsupported file type: {Path(file_path).suffix}")
+        self.ready = False # Set by setup_rag() once the document's retrievers are in place
+
+    def ingest_cache_key(self, file_hash: str) -> str:
+        """Cache key covering file content, splitter settings and embedding model."""
+        splitter = self.text_splitter
+        return make_cache_key(
+            file_hash, splitter._chunk_size, splitter._chunk_overlap,
+            splitter._separators, splitter._add_start_index, EMBEDDING_MODEL_NAME,
+        )
 
+    @property
+    def full_text(self) -> Optional[str]:
+        """Document text for structured extraction, built on demand rather than kept as another copy."""
         if not self.documents:
-            raise ValueError("Document loaded but resulted in no content.")
-
-        # --- Store full text ---
-        self.full_text = "\n\n".join([doc.page_content for doc in self.documents])
-        print(f"[Backend] Stored full text (length: {len(self.full_text)} chars).")
-        # -----------------------------
-
-        self.splits = self.text_splitter.split_documents(self.documents)
-        if not self.splits:
-             print("Warning: Text splitting resulted in zero chunks. Using full document text as one chunk.")
-             if self.full_text: self.splits = [Document(page_content=self.full_text)]
-             else: raise ValueError("Cannot proceed: No text content found.")
-        print(f"[Backend] Created {len(self.splits)} chunks from the document")
+            return None
+        return "\n\n".join([doc.page_content for doc in self.documents])
+
+    def memory_bytes(self) -> int:
+        """Approximate memory this instance owns (see registry.owned_memory_bytes); shared corpus indexes excluded."""
+        return owned_memory_bytes(self.documents, self.splits, self.split_vectors, self.dense_index)
+
+    def restore(self, doc_id: str, filename: Optional[str], documents: List[Document], splits: List[Document],
+                split_vectors: np.ndarray, ingest_stats: Optional[Dict] = None) -> None:
+        """Load previously ingested state (e.g. spilled by the registry) without parsing or embedding."""
+        self.doc_id = doc_id
+        self.filename = filename
+        self.documents = documents
+        self.splits = splits
+        self.split_vectors = split_vectors
+        self.ingest_stats = ingest_stats or {}
+        self._tag_splits()
+
+    def spawn(self) -> "HybridRAGSystem":
+        """Empty system sharing this one's embedding model, corpus and LLM client."""
+        fresh = HybridRAGSystem(self.model_name, embeddings=self.embeddings, corpus=self.corpus, reranker=self.reranker,
+                                answer_cache=self.answer_cache)
+        fresh.llm = self._get_llm() # Created once on the base, not per upload
+        return fresh
+
+    def load_single_document(self, file_path: str, executor: Optional[Executor] = None,
+                             progress: Optional[Callable[[str, float], None]] = None,
+                             filename: Optional[str] = None) -> None:
+        """
+        Load a single document, reusing cached pages/splits/vectors when the same content was seen before.
+        On a miss, pages are extracted in parallel on `executor` (e.g. a process pool) and streamed through
+        the splitter into batched embedding in the calling thread. `filename` is the name shown to users
+        (defaults to the file's own name).
+        """
+        progress = progress or (lambda stage, fraction: None)
+        progress("hashing", 0.05)
+        self.doc_id = file_sha256(file_path) # Document identity in the corpus is its content hash
+        self.filename = filename or Path(file_path).name
+        cache_key = self.ingest_cache_key(self.doc_id)
+        cached = ingest_cache.get(cache_key)
+        if cached:
+            self.documents = cached["documents"]
+            self.splits = cached["splits"]
+            self.split_vectors = decode_vectors(cached["vectors"])
+            self.ingest_stats = {"cache_hit": True, "chunks": len(self.splits)}
+            self._tag_splits()
+            debug(f"[Backend] Ingestion cache hit for {file_path}: {len(self.splits)} chunks, skipping parse and embed.")
+            return
+
+        progress("parsing", 0.1)
+        embedding_stage = EmbeddingStage(self.embeddings) # Repeated headers/boilerplate are embedded once
+        pipeline = IngestionPipeline(self.text_splitter, embedding_stage.embed, executor=executor)
+        self.documents, self.splits, vectors = pipeline.run(file_path, progress)
+        self.split_vectors = np.asarray(vectors, dtype=np.float32)
+        self.ingest_stats = {"cache_hit": False, **embedding_stage.stats()}
+        debug(f"[Backend] Embedded {embedding_stage.embedded} unique chunks of {embedding_stage.requested} "
+              f"({embedding_stage.saved} saved by dedup).")
+        self._tag_splits()
+        try:
+            ingest_cache.set(cache_key, {"documents": self.documents, "splits": self.splits,
+                                         "vectors": encode_vectors(self.split_vectors)})
+        except Exception as e:
+            print(f"[Backend] Warning: could not write ingestion cache entry: {e}")
+
+    def _tag_splits(self) -> None:
+        """Attach document identity to every chunk so the corpus can filter and delete by document."""
+        for doc in self.documents:
+            doc.metadata["source"] = self.filename # Not the upload's temporary path
+        for i, doc in enumerate(self.splits):
+            doc.metadata["source"] = self.filename
+            doc.metadata["doc_id"] = self.doc_id
+            doc.metadata["chunk_id"] = f"{self.doc_id}:{i}"
+            doc.metadata["chunk_index"] = i
 
     def setup_retrievers(self) -> None:
-        """Set up base retrievers and the compression retriever with reranking."""
+        """Index the loaded document in the corpus (once) and set up retrievers scoped to it."""
         if not self.splits:
              raise ValueError("Documents must be loaded and split before setting up retrievers.")
 
-        print("\n[RAG DEBUG] Setting up base retrievers (Semantic + BM25)...")
-        self.vectorstore = Chroma.from_documents(
-            documents=self.splits, embedding=self.embeddings, collection_name="hybrid_rag"
-        )
-        self.semantic_retriever = self.vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 10}) # Increase initial K
-        self.bm25_retriever = BM25Retriever.from_documents(self.splits)
-        self.bm25_retriever.k = 10 # Increase initial K
-
-        self.ensemble_retriever = EnsembleRetriever(retrievers=[self.semantic_retriever, self.bm25_retriever], weights=[0.7, 0.3]) # Adjust weights if needed
-        print("[RAG DEBUG] Base ensemble retriever setup complete (k=10).")
-
-        if COHERE_API_KEY:
-            print("[RAG DEBUG] COHERE_API_KEY found. Setting up Cohere Rerank...")
-            try:
-                reranker = CohereRerank(model="rerank-english-v2.0", top_n=5) # Increase top_n slightly
-                self.compression_retriever = ContextualCompressionRetriever(base_compressor=reranker, base_retriever=self.ensemble_retriever)
-                print("[RAG DEBUG] ContextualCompressionRetriever with CohereRerank(top_n=5) setup complete.")
-            except Exception as e:
-                print(f"[RAG DEBUG] Error setting up CohereRerank: {e}. Falling back to ensemble retriever.")
-                self.compression_retriever = self.ensemble_retriever
+        with span("index_build"):
+            # Reuse vectors computed (or cached) at load time instead of re-running the transformer
+            self.corpus.add_document(self.doc_id, self.filename, self.splits, self.split_vectors)
+            if VECTOR_BACKEND == "numpy":
+                dense_dir = str(Path(DENSE_INDEX_DIR) / self.doc_id)
+                if DenseVectorIndex.exists(dense_dir):
+                    self.dense_index = DenseVectorIndex.load(dense_dir)
+                else:
+                    self.dense_index = DenseVectorIndex.build(self.split_vectors, self.splits, dense_dir)
+                debug(f"[RAG DEBUG] Memory-mapped dense index ready ({len(self.dense_index)} vectors).")
+        self._scoped_retrievers.clear()
+        self.fusion_retriever, self.compression_retriever = self.build_retrievers([self.doc_id])
+
+    def build_retrievers(self, doc_ids: List[str]):
+        """Build the dense + BM25 fusion retriever (with optional reranking) scoped to the given documents."""
+        debug(f"\n[RAG DEBUG] Setting up base retrievers (Semantic + BM25) for {len(doc_ids)} document(s)...")
+        doc_ids = list(doc_ids)
+        if self.dense_index is not None and doc_ids == [self.doc_id]:
+            dense_index, embeddings = self.dense_index, self.embeddings
+            dense_search = lambda query, k: dense_index.search(embeddings.embed_query(query), k)
+            dense_search_batch = lambda vectors, k: dense_index.search_batch(vectors, k)
         else:
-            print("[RAG DEBUG] COHERE_API_KEY not found. Using standard ensemble retriever without reranking.")
-            self.compression_retriever = self.ensemble_retriever
+            corpus = self.corpus
+            dense_search = lambda query, k: corpus.similarity_search(query, k, doc_ids)
+            dense_search_batch = lambda vectors, k: corpus.similarity_search_by_vectors(vectors, k, doc_ids)
+        # Corpus-wide incremental BM25 index, filtered to the requested documents at query time
+        lexical_index = self.corpus.lexical_index
+        lexical_search = lambda query, k: lexical_index.search(query, k, doc_ids)
+
+        fusion_retriever = HybridFusionRetriever(
+            dense_search=timed("dense_retrieval", dense_search), lexical_search=timed("bm25", lexical_search),
+            dense_search_batch=timed("dense_retrieval", dense_search_batch),
+            k=10, weights=[0.7, 0.3] # Adjust weights if needed
+        )
+        debug("[RAG DEBUG] Base fusion retriever setup complete (k=10, rrf).")
 
-    def setup_rag(self) -> None:
-        """Set up the RAG chain using the compression retriever."""
+        compression_retriever = fusion_retriever
+        if self.reranker is not None:
+            compression_retriever = TimedCompressionRetriever(base_compressor=self.reranker, base_retriever=fusion_retriever)
+            debug(f"[RAG DEBUG] ContextualCompressionRetriever with {self.reranker.__class__.__name__}(top_n={self.reranker.top_n}) setup complete.")
+        else:
+            debug(f"[RAG DEBUG] No reranker available (RERANKER_BACKEND={RERANKER_BACKEND}). Using fusion retriever without reranking.")
+        return fusion_retriever, compression_retriever
+
+    def retriever_for(self, doc_ids: Optional[List[str]] = None, options: Optional[Dict] = None):
+        """The scope's retriever, with per-request fusion overrides (k, weights, method) applied to a copy."""
+        retriever = self.scoped_retriever(doc_ids)
+        if not options:
+            return retriever
+        if isinstance(retriever, ContextualCompressionRetriever):
+            return TimedCompressionRetriever(base_compressor=retriever.base_compressor,
+                                             base_retriever=retriever.base_retriever.with_options(**options))
+        return retriever.with_options(**options)
+
+    def _get_llm(self):
+        if self.llm is None:
+            # Every instance shares the process-wide pooled client (llm_client.py) behind this wrapper
+            self.llm = PooledOllama(model=self.model_name, base_url=OLLAMA_BASE_URL, temperature=0.2,
+                                    callbacks=[StageTimingCallback("llm_generation")])
+        return self.llm
+
+    def page_text(self, key: PageKey) -> Optional[str]:
+        """Text of the loaded document's page a chunk was split from; None for other documents."""
+        doc_id, page = key
+        if doc_id != self.doc_id:
+            return None
+        if page is None:
+            return self.documents[0].page_content if len(self.documents) == 1 else None
+        if isinstance(page, int) and 0 <= page < len(self.documents) and self.documents[page].metadata.get("page") == page:
+            return self.documents[page].page_content
+        return None
+
+    def build_context(self, docs: List[Document]) -> str:
+        """Prompt context for retrieved chunks: overlap merged, in document order, within the token budget."""
+        return assemble_context(docs, page_text=self.page_text)
+
+    def setup_rag(self, invalidate_answers: bool = True) -> None:
+        """Mark the loaded document ready for queries (retrieval via the compression retriever, then generate_answer)."""
         if not self.compression_retriever:
-             raise ValueError("Retrievers must be set up before setting up the RAG chain.")
-        retriever_type = "Compression Retriever (Cohere Rerank)" if isinstance(self.compression_retriever, ContextualCompressionRetriever) and isinstance(self.compression_retriever.base_compressor, CohereRerank) else "Ensemble/Semantic Retriever"
-        print(f"\n[RAG DEBUG] Setting up RAG chain with retriever type: {retriever_type}")
-        try:
-            llm_rag = Ollama(model=self.model_name, base_url="http://localhost:11434", temperature=0.2)
-            self.rag_chain = RetrievalQA.from_chain_type(
-                llm=llm_rag, chain_type="stuff", retriever=self.compression_retriever,
-                return_source_documents=True, chain_type_kwargs={"prompt": PROMPT}
-            )
-            print("[RAG DEBUG] RAG chain setup complete.")
-        except Exception as e: print(f"[RAG DEBUG] Error setting up RAG chain: {str(e)}"); raise
-
-    def query(self, question: str) -> Tuple[str, List[Document]]:
-        """Query the RAG system"""
-        if not self.rag_chain:
-            raise ValueError("RAG chain not initialized. Please call setup_rag() first after loading data.")
-
-        retriever_in_use = self.rag_chain.retriever.__class__.__name__
+             raise ValueError("Retrievers must be set up before setting up RAG.")
+        retriever_type = f"Compression Retriever ({self.compression_retriever.base_compressor.__class__.__name__})" if isinstance(self.compression_retriever, ContextualCompressionRetriever) else "Ensemble/Semantic Retriever"
+        debug(f"\n[RAG DEBUG] Setting up RAG with retriever type: {retriever_type}")
+        if invalidate_answers: # Answers from a previous build of this document are stale (not after a rehydrate)
+            self.answer_cache.invalidate(self.doc_id)
+        self.ready = True
+        debug("[RAG DEBUG] RAG setup complete.")
+
+    def scoped_retriever(self, doc_ids: Optional[List[str]] = None):
+        """Retriever (+ reranker) for the loaded document, or one scoped to specific corpus documents."""
+        if not doc_ids or list(doc_ids) == [self.doc_id]:
+            if not self.ready:
+                raise ValueError("RAG not initialized. Please call setup_rag() first after loading data.")
+            return self.compression_retriever
+        unknown = [d for d in doc_ids if not self.corpus.has_document(d)]
+        if unknown:
+            raise ValueError(f"Unknown document IDs: {unknown}")
+        scope = tuple(sorted(doc_ids))
+        if scope not in self._scoped_retrievers:
+            *_, self._scoped_retrievers[scope] = self.build_retrievers(list(scope))
+        return self._scoped_retrievers[scope]
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Remove a document from the corpus and drop any state that referenced it."""
+        deleted = self.corpus.delete_document(doc_id)
+        self._scoped_retrievers.clear()
+        self.answer_cache.invalidate(doc_id)
+        if deleted:
+            shutil.rmtree(Path(DENSE_INDEX_DIR) / doc_id, ignore_errors=True)
+        if deleted and doc_id == self.doc_id:
+            self.documents, self.splits, self.split_vectors = [], [], []
+            self.dense_index = None
+            self.doc_id = None
+            self.ready = False
+        return deleted
+
+    def query(self, question: str, doc_ids: Optional[List[str]] = None,
+              options: Optional[Dict] = None) -> Tuple[str, List[Document]]:
+        """
+        Query the RAG system, optionally restricted to the given corpus document IDs.
+        `options` overrides fusion settings for this request: k, weights, method ("rrf" | "score").
+        """
+        retriever = self.retriever_for(doc_ids, options)
+        scope = self.answer_scope(doc_ids)
+        # Embedded once: the answer cache lookup and the dense search both use this vector
+        question_vector = self.answer_cache.embed_question(question)
+        cached = None if options else self.answer_cache.lookup(scope, question, vector=question_vector)
+        if cached:
+            answer, source_docs, _ = cached
+            return answer, source_docs
+
+        retriever_in_use = retriever.__class__.__name__
         base_retriever_type = "N/A"; compressor_type = "N/A"
 
-        if isinstance(self.rag_chain.retriever, ContextualCompressionRetriever):
+        if isinstance(retriever, ContextualCompressionRetriever):
              retriever_in_use = "ContextualCompressionRetriever"
-             base_retriever_type = self.rag_chain.retriever.base_retriever.__class__.__name__
-             compressor_type = self.rag_chain.retriever.base_compressor.__class__.__name__ if hasattr(self.rag_chain.retriever, 'base_compressor') else "None"
-        elif hasattr(self.rag_chain.retriever, '__class__'): # Handle cases where it's not a compression retriever
-            retriever_in_use = self.rag_chain.retriever.__class__.__name__
+             base_retriever_type = retriever.base_retriever.__class__.__name__
+             compressor_type = retriever.base_compressor.__class__.__name__ if hasattr(retriever, 'base_compressor') else "None"
 
-        print(f"\n[RAG DEBUG] Invoking RAG chain with question: '{question}'")
-        print(f"[RAG DEBUG] Retriever in use by chain: {retriever_in_use}")
+        debug(f"\n[RAG DEBUG] Answering question: '{question}'")
+        debug(f"[RAG DEBUG] Retriever in use: {retriever_in_use}")
         if retriever_in_use == "ContextualCompressionRetriever":
-            print(f"[RAG DEBUG]   Base Retriever: {base_retriever_type}")
-            print(f"[RAG DEBUG]   Compressor: {compressor_type}")
+            debug(f"[RAG DEBUG]   Base Retriever: {base_retriever_type}")
+            debug(f"[RAG DEBUG]   Compressor: {compressor_type}")
 
-        result = self.rag_chain.invoke({"query": question}) # Ensure input key matches chain expectation
-        print("[RAG DEBUG] RAG chain invocation complete.")
+        # The dense search reuses the question vector instead of embedding the question again
+        source_docs = retriever.invoke(question, query_vector=question_vector)
+        answer = self.generate_answer(question, source_docs)
+        debug("[RAG DEBUG] Answer generated.")
 
-        answer = result.get("result", "Error: Could not parse answer from RAG chain result.")
-        source_docs = result.get("source_documents", [])
-
-        print(f"[RAG DEBUG] Number of source documents returned to LLM: {len(source_docs)}")
+        debug(f"[RAG DEBUG] Number of source documents returned to LLM: {len(source_docs)}")
 
+        if not options:
+            self.answer_cache.store(scope, question, answer, source_docs, vector=question_vector)
         return answer, source_docs
 
+    def answer_scope(self, doc_ids: Optional[List[str]] = None) -> List[str]:
+        return list(doc_ids) if doc_ids else [self.doc_id]
+
+    def retrieve(self, question: str, doc_ids: Optional[List[str]] = None, options: Optional[Dict] = None,
+                 query_vector: Optional[np.ndarray] = None) -> List[Document]:
+        """Run only the retrieval (+ rerank) stage of query(); `query_vector` skips embedding the question again."""
+        return self.retriever_for(doc_ids, options).invoke(question, query_vector=query_vector)
+
+    def generate_answer(self, question: str, docs: List[Document]) -> str:
+        """Answer for already-retrieved documents: PROMPT with the assembled context (build_context)."""
+        context = self.build_context(docs)
+        return self._get_llm().invoke(PROMPT.format(context=context, question=question))
+
+    def query_batch(self, questions: List[str], doc_ids: Optional[List[str]] = None, options: Optional[Dict] = None,
+                    max_concurrency: int = QUERY_BATCH_CONCURRENCY) -> Tuple[List[Dict], Dict[str, float]]:
+        """
+        Answer several questions against one scope. Questions are embedded in one forward pass, retrieved
+        together (one batched dense search) and reranked together; generations then run with at most
+        `max_concurrency` in flight. Returns per-question results in input order and stage timings (ms);
+        a question whose generation failed gets answer None and an "error" instead of failing the batch.
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        def mark(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = round((now - since) * 1000, 1)
+            return now
+
+        retriever = self.retriever_for(doc_ids, options)
+        if isinstance(retriever, ContextualCompressionRetriever):
+            fusion, reranker = retriever.base_retriever, retriever.base_compressor
+        else:
+            fusion, reranker = retriever, None
+        scope = self.answer_scope(doc_ids)
+
+        vectors = self.answer_cache.embed_questions(questions)
+        stage = mark("embedding_ms", started)
+
+        results: List[Optional[Dict]] = [None] * len(questions)
+        if not options:
+            for i, question in enumerate(questions):
+                cached = self.answer_cache.lookup(scope, question, vector=vectors[i])
+                if cached:
+                    answer, sources, similarity = cached
+                    results[i] = {"question": question, "answer": answer, "sources": sources,
+                                  "cache_hit": True, "similarity": similarity}
+        todo = [i for i, res in enumerate(results) if res is None]
+        stage = mark("cache_ms", stage)
+
+        candidates = [fusion.with_fused_scores(scored)
+                      for scored in fusion.search_batch([questions[i] for i in todo], vectors[todo])]
+        stage = mark("retrieval_ms", stage)
+        reranked = rerank_batch(reranker, [questions[i] for i in todo], candidates)
+        stage = mark("rerank_ms", stage)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch-llm") as pool:
+            futures = [submit(pool, self.generate_answer, questions[i], docs) for i, docs in zip(todo, reranked)]
+            for i, docs, future in zip(todo, reranked, futures):
+                results[i] = {"question": questions[i], "answer": None, "sources": docs, "cache_hit": False}
+                try:
+                    results[i]["answer"] = future.result()
+                except Exception as e: # One failed generation shouldn't sink the rest of the batch
+                    results[i]["error"] = str(e)
+                    print(f"Warning: Batch question {i} failed: {e}")
+                    continue
+                if not options:
+                    self.answer_cache.store(scope, questions[i], results[i]["answer"], docs, vector=vectors[i])
+        mark("generation_ms", stage)
+        mark("total_ms", started)
+        debug(f"[RAG DEBUG] Batch of {len(questions)} questions ({len(questions) - len(todo)} cached), timings: {timings}")
+        return results, timings
+
+    def stream_answer(self, question: str, docs: List[Document]) -> Iterator[str]:
+        """Stream answer tokens for already-retrieved documents, with the same prompt and context as generate_answer."""
+        context = self.build_context(docs)
+        return self._get_llm().stream(PROMPT.format(context=context, question=question))
+
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Initialize RAG system
-rag_system = HybridRAGSystem(model_name="mistral")
-
-class QueryRequest(BaseModel):
-    question: str
-
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+# Initialize RAG system: a document-less base holding the shared models, corpus and caches, and one
+# instance per uploaded document spawned from it
+base_system = HybridRAGSystem(model_name="mistral")
+
+def load_ingested_state(doc_id: str) -> Optional[Dict]:
+    """Rehydration fallback when an instance was never spilled (e.g. after a restart): the ingestion cache."""
+    if not base_system.corpus.has_document(doc_id):
+        return None
+    state = ingest_cache.get(base_system.ingest_cache_key(doc_id))
+    if state is None:
+        return None
+    info = next((d for d in base_system.corpus.list_documents() if d["doc_id"] == doc_id), {})
+    return {**state, "filename": info.get("filename")}
+
+rag_registry = RAGRegistry(base_system, fallback_loader=load_ingested_state)
+
+# Background ingestion: parsing on a process pool, embedding/indexing on job threads
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+job_manager = JobManager(process_workers=INGEST_WORKERS)
+
+def run_ingestion_job(job, file_path: str, filename: str, session_id: Optional[str] = None) -> dict:
+    """Build the uploaded document's own system; other documents keep serving queries meanwhile."""
+    new_system = base_system.spawn()
+    try:
+        new_system.load_single_document(file_path, executor=job_manager.process_pool, progress=job.update,
+                                        filename=filename)
+    finally:
+        # Pages, splits and vectors are in memory (and the ingestion cache) now; the upload is no longer read
+        Path(file_path).unlink(missing_ok=True)
+    job.update("indexing", 0.8)
+    new_system.setup_retrievers()
+    new_system.setup_rag()
+    rag_registry.register(new_system, session_id=session_id)
+    return {"filename": new_system.filename, "doc_id": new_system.doc_id,
+            "pages": len(new_system.documents), "chunks": len(new_system.splits),
+            "ingest_stats": new_system.ingest_stats}
+
+def resolve_system(scope: Optional[List[str]], session_id: Optional[str]) -> HybridRAGSystem:
+    system = rag_registry.resolve(scope, session_id)
+    if system is None:
+        raise HTTPException(status_code=400, detail="RAG system not initialized. Please upload a document first.")
+    return system
+
+def save_upload(file: UploadFile, file_path: Path) -> None:
     try:
-        print(f"\n[Backend] Received file upload: {file.filename}")
-        # Save the uploaded file
-        file_path = UPLOAD_DIR / file.filename
         with file_path.open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
-        print(f"\n[Backend] File saved at: {file_path}")
+    except Exception:
+        file_path.unlink(missing_ok=True)
+        raise
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    job_manager.shutdown()
 
-        # Load and process the document
-        rag_system.load_single_document(str(file_path))
-        # Setup retrievers and RAG chain *after* loading
-        rag_system.setup_retrievers()
-        rag_system.setup_rag()
+class QueryRequest(BaseModel):
+    question: str
 
-        print("\n[Backend] Document processed and RAG system initialized successfully")
-        # Return filename along with success message
-        return {"message": "File uploaded and RAG system ready", "filename": file.filename}
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    doc_ids: Optional[List[str]] = None
+    k: Optional[int] = None
+    weights: Optional[List[float]] = None
+    fusion: Optional[str] = None
+    session_id: Optional[str] = None
+    max_concurrency: Optional[int] = None # LLM generations in flight; defaults to QUERY_BATCH_CONCURRENCY
+
+def parse_doc_ids(doc_ids: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated document IDs from a form field, or None for the current document."""
+    if not doc_ids:
+        return None
+    parsed = [d.strip() for d in doc_ids.split(",") if d.strip()]
+    return parsed or None
+
+@app.post("/upload", status_code=202)
+async def upload_file(file: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    try:
+        debug(f"\n[Backend] Received file upload: {file.filename}")
+        # The client's filename is display metadata only. Each upload gets its own path, so a second upload
+        # with the same name can't overwrite a file a job is still reading, and names can't escape UPLOAD_DIR.
+        filename = Path(file.filename or "upload").name
+        file_path = UPLOAD_DIR / f"{uuid.uuid4().hex}{Path(filename).suffix.lower()}"
+        # Save the uploaded file (off the event loop; large PDFs take a while to write)
+        await asyncio.to_thread(save_upload, file, file_path)
+        debug(f"\n[Backend] File saved at: {file_path}")
+
+        # Parse, embed and index in the background; poll /jobs/{job_id} for progress
+        job = job_manager.submit("ingest", lambda j: run_ingestion_job(j, str(file_path), filename, session_id),
+                                 filename=filename)
+        return {"message": "File uploaded, processing started", "filename": filename,
+                "job_id": job.job_id, "status_url": f"/jobs/{job.job_id}"}
     except Exception as e:
         error_message = f"Error during upload/processing: {str(e)}"
         print(f"\n[Backend] {error_message}")
         # Use HTTPException for clearer error status codes
         raise HTTPException(status_code=500, detail=error_message)
 
+def format_sources(sources: List[Document]) -> List[Dict]:
+    formatted_sources = []
+    for doc in sources:
+        formatted_sources.append({
+            "content": doc.page_content,
+            "metadata": doc.metadata,
+            "relevance_score": doc.metadata.get('relevance_score', 'N/A'), # Check if reranker adds score
+            "fused_score": doc.metadata.get('fused_score', 'N/A'),
+        })
+    return formatted_sources
+
+def check_retrieval_options(k: Optional[int], weights: Optional[List[float]], fusion: Optional[str]) -> Optional[Dict]:
+    """Validated fusion overrides (400 on a bad value); None keeps the configured defaults."""
+    try:
+        return retrieval_options(k, weights, fusion or None) or None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def parse_retrieval_options(k: Optional[int], weights: Optional[str], fusion: Optional[str]) -> Optional[Dict]:
+    """Per-request fusion overrides from form fields ("0.7,0.3" for weights)."""
+    parsed_weights = None
+    if weights:
+        try:
+            parsed_weights = [float(w) for w in weights.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid weights: {weights}")
+    return check_retrieval_options(k, parsed_weights, fusion)
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @app.post("/query")
-async def query_endpoint(question: str = Form(...)): # Renamed to avoid conflict
+async def query_endpoint(question: str = Form(...), doc_ids: Optional[str] = Form(None), # Renamed to avoid conflict
+                         k: Optional[int] = Form(None), weights: Optional[str] = Form(None),
+                         fusion: Optional[str] = Form(None), session_id: Optional[str] = Form(None)):
     try:
-        print(f"\n[Backend] Received question: {question}")
+        debug(f"\n[Backend] Received question: {question}")
         processed_question = question.strip()
+        scope = parse_doc_ids(doc_ids)
+        options = parse_retrieval_options(k, weights, fusion)
 
-        if not hasattr(rag_system, 'rag_chain') or rag_system.rag_chain is None:
-             raise HTTPException(status_code=400, detail="RAG system not initialized. Please upload a document first.")
-
-        answer, sources = rag_system.query(processed_question)
-        print(f"\n[Backend] Generated answer length: {len(answer)}")
+        # Resolving may rehydrate an evicted document from disk, so keep it off the event loop
+        system = await asyncio.to_thread(resolve_system, scope, session_id)
+        answer, sources = await asyncio.to_thread(system.query, processed_question, doc_ids=scope, options=options)
+        debug(f"\n[Backend] Generated answer length: {len(answer)}")
 
-        formatted_sources = []
-        for doc in sources:
-            formatted_sources.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "relevance_score": doc.metadata.get('relevance_score', 'N/A') # Check if reranker adds score
-            })
+        formatted_sources = format_sources(sources)
 
         response_data = {"answer": answer, "sources": formatted_sources}
-        print(f"\n[Backend] Sending response with {len(formatted_sources)} sources.")
+        debug(f"\n[Backend] Sending response with {len(formatted_sources)} sources.")
         return response_data
 
+    except HTTPException:
+        raise
+    except OllamaBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         error_message = f"Error during query: {str(e)}"
         print(f"\n[Backend] {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
 
-# --- MODIFIED/RENAMED ENDPOINT for Structured Extraction ---
-@app.get("/analyze-rfp-details")
-async def get_rfp_analysis():
+@app.post("/query/batch")
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """
+    Answer a list of questions (e.g. a compliance checklist) against one document scope in a single
+    request. Results come back in question order, with aggregate stage timings (ms); failed questions
+    carry an "error" and are counted in "errors".
+    """
+    questions = [q.strip() for q in request.questions]
+    debug(f"\n[Backend] Received batch of {len(questions)} questions")
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="questions must be a non-empty list of non-empty strings.")
+    if len(questions) > QUERY_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX_QUESTIONS} questions per batch.")
+    options = check_retrieval_options(request.k, request.weights, request.fusion)
+    system = await asyncio.to_thread(resolve_system, request.doc_ids, request.session_id)
+    try:
+        results, timings = await asyncio.to_thread(
+            system.query_batch, questions, doc_ids=request.doc_ids, options=options,
+            max_concurrency=request.max_concurrency or QUERY_BATCH_CONCURRENCY,
+        )
+    except OllamaBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        error_message = f"Error during batch query: {str(e)}"
+        print(f"\n[Backend] {error_message}")
+        raise HTTPException(status_code=500, detail=error_message)
+    return {
+        "results": [{**res, "sources": format_sources(res["sources"])} for res in results],
+        "timings": timings,
+        "cache_hits": sum(1 for res in results if res["cache_hit"]),
+        "errors": sum(1 for res in results if "error" in res),
+    }
+
+@app.post("/query/stream")
+async def query_stream_endpoint(question: str = Form(...), doc_ids: Optional[str] = Form(None),
+                                k: Optional[int] = Form(None), weights: Optional[str] = Form(None),
+                                fusion: Optional[str] = Form(None), session_id: Optional[str] = Form(None)):
     """
-    Endpoint to trigger structured LLM extraction on the last uploaded document.
+    Server-Sent Events variant of /query: a `sources` event right after retrieval/reranking,
+    then one `token` event per generated chunk, then `done` with per-stage timings (ms).
     """
-    print("\n[Backend] Received request for /analyze-rfp-details")
-    if not rag_system.full_text:
+    debug(f"\n[Backend] Received streaming question: {question}")
+    processed_question = question.strip()
+    scope = parse_doc_ids(doc_ids)
+    options = parse_retrieval_options(k, weights, fusion)
+    # Pinned for the whole stream, so an eviction mid-stream can't pull the indexes out from under it
+    system = await asyncio.to_thread(resolve_system, scope, session_id)
+
+    def event_stream():
+        # Sync generator: Starlette iterates it in a worker thread, so blocking calls are fine here
+        started = time.perf_counter()
+        timings = {}
+        try:
+            cache_scope = system.answer_scope(scope)
+            question_vector = system.answer_cache.embed_question(processed_question)
+            cached = None if options else system.answer_cache.lookup(cache_scope, processed_question, vector=question_vector)
+            if cached:
+                answer, sources, similarity = cached
+                yield sse_event("sources", format_sources(sources))
+                yield sse_event("token", {"token": answer})
+                timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                yield sse_event("done", {"timings": timings, "cache_hit": True, "similarity": similarity})
+                return
+
+            sources = system.retrieve(processed_question, doc_ids=scope, options=options, query_vector=question_vector)
+            timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event("sources", format_sources(sources))
+
+            generation_started = time.perf_counter()
+            tokens = []
+            for token in system.stream_answer(processed_question, sources):
+                if "first_token_ms" not in timings:
+                    timings["first_token_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                tokens.append(token)
+                yield sse_event("token", {"token": token})
+            answer = "".join(tokens)
+            answer_length = len(answer)
+            if not options:
+                system.answer_cache.store(cache_scope, processed_question, answer, sources, vector=question_vector)
+            timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 1)
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            debug(f"[Backend] Streamed answer of {answer_length} chars, timings: {timings}")
+            yield sse_event("done", {"timings": timings, "cache_hit": False})
+        except Exception as e:
+            print(f"\n[Backend] Error during streaming query: {e}")
+            yield sse_event("error", {"detail": f"Error during query: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition: per-stage and per-route latency histograms."""
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"jobs": job_manager.list_jobs()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a background ingestion job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+@app.get("/documents")
+async def list_documents():
+    """List every document indexed in the persistent corpus."""
+    return {"documents": base_system.corpus.list_documents(), "current_doc_id": rag_registry.default_doc_id,
+            "instances": rag_registry.stats()}
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    """Remove a document's vectors from the corpus without re-indexing the rest."""
+    if not base_system.delete_document(doc_id):
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    rag_registry.drop(doc_id)
+    return {"message": "Document deleted", "doc_id": doc_id}
+
+# --- MODIFIED/RENAMED ENDPOINT for Structured Extraction ---
+async def resolve_analysis_text(doc_id: Optional[str], session_id: Optional[str]) -> Tuple[HybridRAGSystem, str]:
+    """The system and full text to analyze: `doc_id`, else the session's last upload, else the last upload."""
+    system = await asyncio.to_thread(rag_registry.resolve, [doc_id] if doc_id else None, session_id)
+    full_text = system.full_text if system is not None else None
+    if not full_text:
         print("[Backend] Error: No document text loaded for analysis.")
         raise HTTPException(status_code=400, detail="No document has been uploaded and processed yet.")
+    return system, full_text
+
+@app.get("/analyze-rfp-details")
+async def get_rfp_analysis(doc_id: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    Endpoint to trigger structured LLM extraction on a document: `doc_id`, else the session's
+    last upload, else the last uploaded document.
+    """
+    debug("\n[Backend] Received request for /analyze-rfp-details")
+    system, full_text = await resolve_analysis_text(doc_id, session_id)
 
     try:
-        print("[Backend] Calling extract_structured_rfp_data function...")
+        debug("[Backend] Calling extract_structured_rfp_data function...")
         # Pass the stored full text to the extraction function
-        structured_data = extract_structured_rfp_data(rag_system.full_text)
-        print(f"[Backend] Structured extraction complete.")
+        # The retrieval embeddings double as the router's section-similarity model (ANALYSIS_ROUTING_EMBEDDINGS)
+        structured_data = await asyncio.to_thread(
+            extract_structured_rfp_data, full_text, embeddings=system.embeddings
+        )
+        debug(f"[Backend] Structured extraction complete.")
 
         if "error" in structured_data: # Check for errors from the extraction function
              print(f"[Backend] Error returned from extraction function: {structured_data['error']}")
@@ -280,6 +787,34 @@ async def get_rfp_analysis():
         print(f"[Backend] {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.get("/analyze-rfp-details/stream")
+async def stream_rfp_analysis(doc_id: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    Server-Sent Events variant of /analyze-rfp-details: a `partial` event with the analysis merged so far
+    (plus `completed`/`total` packs) after each chunk result, then `done` with the final analysis, or `error`.
+    """
+    debug("\n[Backend] Received request for /analyze-rfp-details/stream")
+    system, full_text = await resolve_analysis_text(doc_id, session_id)
+
+    def event_stream():
+        # Sync generator run in a worker thread; closing it (client gone) cancels the queued chunks
+        try:
+            for event in iter_structured_rfp_data(full_text, embeddings=system.embeddings):
+                analysis = event["analysis"]
+                if event["event"] == "partial":
+                    yield sse_event("partial", {key: value for key, value in event.items() if key != "event"})
+                elif "error" in analysis:
+                    print(f"[Backend] Error returned from extraction function: {analysis['error']}")
+                    yield sse_event("error", {"detail": f"Structured extraction failed: {analysis['error']}"})
+                else:
+                    yield sse_event("done", analysis)
+        except Exception as e:
+            print(f"[Backend] Error during streaming structured analysis: {e}")
+            yield sse_event("error", {"detail": f"Error during structured analysis: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     import uvicorn
     # Corrected the reference to 'app' for uvicorn.run
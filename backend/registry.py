@@ -0,0 +1,190 @@
+# registry.py
+# Document-scoped RAG instances with a memory budget: least recently used instances are spilled to disk
+# and rebuilt on their next query.
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from disk_cache import DiskCache
+from embedding import decode_vectors, encode_vectors
+from telemetry import debug
+
+RAG_MEMORY_BUDGET_MB = float(os.getenv("RAG_MEMORY_BUDGET_MB", "512"))
+RAG_SPILL_DIR = os.getenv("RAG_SPILL_DIR", "cache/instances")
+RAG_SPILL_MAX_MB = int(os.getenv("RAG_SPILL_MAX_MB", "4096"))
+RAG_MAX_SESSIONS = int(os.getenv("RAG_MAX_SESSIONS", "1000"))
+
+StateLoader = Callable[[str], Optional[Dict]]
+
+
+def owned_memory_bytes(documents: List, splits: List, split_vectors, dense_index=None) -> int:
+    """
+    Approximate memory one instance alone holds, i.e. what spilling it frees: chunk vectors, page and chunk
+    text, and the dense index's copy of the chunks. Shared state (the corpus's Chroma collection and BM25
+    postings) and the memory-mapped dense matrix (OS page cache) are not counted.
+    """
+    vectors = np.asarray(split_vectors).nbytes if split_vectors is not None and len(split_vectors) else 0
+    text = sum(len(doc.page_content) for doc in documents) + sum(len(doc.page_content) for doc in splits)
+    if dense_index is not None and dense_index.documents is not splits:
+        text += sum(len(doc.page_content) for doc in dense_index.documents)
+    return vectors + text
+
+
+class RAGRegistry:
+    """
+    One HybridRAGSystem per document (keyed by content hash), all spawned from a shared base system so
+    the embedding model, corpus, reranker and answer cache exist once.
+
+    Instances are kept in LRU order with their approximate memory footprint. When the loaded total
+    exceeds `budget_bytes`, the least recently used ones are written to `spill_dir` and dropped; the
+    next `get` rebuilds them from the spill (or from `fallback_loader`, e.g. the ingestion cache).
+    Sessions map a client session ID to the document it uploaded last.
+    """
+
+    def __init__(self, base, budget_bytes: float = RAG_MEMORY_BUDGET_MB * 1024 * 1024,
+                 spill_dir: str = RAG_SPILL_DIR, fallback_loader: Optional[StateLoader] = None,
+                 max_sessions: int = RAG_MAX_SESSIONS):
+        self.base = base
+        self.budget_bytes = budget_bytes
+        self.spill = DiskCache(spill_dir, max_bytes=RAG_SPILL_MAX_MB * 1024 * 1024)
+        self.fallback_loader = fallback_loader
+        self.max_sessions = max_sessions
+        self._instances: "OrderedDict[str, object]" = OrderedDict() # doc_id -> HybridRAGSystem, LRU first
+        self._sizes: Dict[str, int] = {}
+        self._sessions: "OrderedDict[str, str]" = OrderedDict() # session_id -> doc_id
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.default_doc_id: Optional[str] = None # Most recent upload, for clients that send no scope
+        self.evictions = 0
+        self.rehydrations = 0
+
+    # --- Registration and lookup ---
+
+    def register(self, system, session_id: Optional[str] = None) -> None:
+        """Add a fully built instance (replacing any previous one for the same document)."""
+        doc_id = system.doc_id
+        size = system.memory_bytes()
+        with self._lock:
+            self._instances[doc_id] = system
+            self._instances.move_to_end(doc_id)
+            self._sizes[doc_id] = size
+            self.default_doc_id = doc_id
+            if session_id:
+                self._bind_session(session_id, doc_id)
+        debug(f"[Registry] Registered {system.filename} ({doc_id[:12]}), ~{size / 1e6:.1f} MB.")
+        self._enforce_budget(keep=doc_id)
+
+    def get(self, doc_id: str):
+        """The instance for `doc_id`, rehydrated from disk if it was evicted; None if it cannot be rebuilt."""
+        with self._lock:
+            system = self._instances.get(doc_id)
+            if system is not None:
+                self._instances.move_to_end(doc_id)
+                return system
+            loading = self._loading.setdefault(doc_id, threading.Lock())
+        with loading: # One rebuild per document even when several queries arrive at once
+            with self._lock:
+                system = self._instances.get(doc_id)
+            if system is None:
+                system = self._rehydrate(doc_id)
+        with self._lock:
+            self._loading.pop(doc_id, None)
+        return system
+
+    def resolve(self, doc_ids: Optional[List[str]] = None, session_id: Optional[str] = None):
+        """
+        The system that should answer a request: the document's own instance for a single document,
+        the base (corpus-scoped retrievers) for several, else the session's document, else the latest upload.
+        """
+        if doc_ids and len(doc_ids) > 1:
+            return self.base
+        doc_id = doc_ids[0] if doc_ids else self.session_doc(session_id) or self.default_doc_id
+        if doc_id is None:
+            return None
+        system = self.get(doc_id)
+        if system is None and doc_ids:
+            return self.base # Indexed in the corpus but no local state: corpus-scoped retrieval
+        return system
+
+    def session_doc(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id:
+            return None
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def drop(self, doc_id: str) -> None:
+        """Forget a document entirely (memory, spill file and session bindings), e.g. after deletion."""
+        with self._lock:
+            self._instances.pop(doc_id, None)
+            self._sizes.pop(doc_id, None)
+            for session_id in [s for s, d in self._sessions.items() if d == doc_id]:
+                del self._sessions[session_id]
+            if self.default_doc_id == doc_id: # Fall back to the most recently used document, loaded or spilled
+                self.default_doc_id = next(reversed(self._instances), None) or next(reversed(self._sessions.values()), None)
+        self.spill.delete(doc_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "loaded": [{"doc_id": d, "filename": s.filename, "memory_bytes": self._sizes.get(d, 0)}
+                           for d, s in self._instances.items()],
+                "memory_bytes": sum(self._sizes.values()),
+                "budget_bytes": int(self.budget_bytes),
+                "sessions": len(self._sessions),
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
+
+    # --- Eviction and rehydration ---
+
+    def _bind_session(self, session_id: str, doc_id: str) -> None:
+        self._sessions[session_id] = doc_id
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Spill least recently used instances until the loaded total fits the budget (never `keep`)."""
+        while True:
+            with self._lock:
+                if sum(self._sizes.values()) <= self.budget_bytes:
+                    return
+                victim = next((d for d in self._instances if d != keep), None)
+                if victim is None:
+                    return
+                system = self._instances.pop(victim)
+                size = self._sizes.pop(victim)
+            self._spill(system)
+            self.evictions += 1
+            debug(f"[Registry] Evicted {system.filename} ({victim[:12]}, ~{size / 1e6:.1f} MB) to disk.")
+
+    def _spill(self, system) -> None:
+        # doc_id is a content hash, so an existing spill file already holds the same state
+        if system.doc_id not in self.spill:
+            self.spill.set(system.doc_id, {
+                "filename": system.filename, "documents": system.documents, "splits": system.splits,
+                "vectors": encode_vectors(system.split_vectors), "ingest_stats": system.ingest_stats,
+            })
+
+    def _rehydrate(self, doc_id: str):
+        state = self.spill.get(doc_id)
+        if state is None and self.fallback_loader is not None:
+            state = self.fallback_loader(doc_id)
+        if state is None:
+            return None
+        system = self.base.spawn()
+        system.restore(doc_id, state.get("filename"), state["documents"], state["splits"],
+                       decode_vectors(state["vectors"]), state.get("ingest_stats"))
+        system.setup_retrievers() # Already in the corpus, so this only rebuilds in-memory retrievers
+        system.setup_rag(invalidate_answers=False)
+        size = system.memory_bytes()
+        with self._lock:
+            self._instances[doc_id] = system
+            self._sizes[doc_id] = size
+        self.rehydrations += 1
+        debug(f"[Registry] Rehydrated {system.filename} ({doc_id[:12]}) from disk.")
+        self._enforce_budget(keep=doc_id)
+        return system
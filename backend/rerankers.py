@@ -0,0 +1,184 @@
+# rerankers.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain_core.callbacks import Callbacks, CallbackManagerForRetrieverRun
+from langchain.retrievers.document_compressors.base import BaseDocumentCompressor # The class ContextualCompressionRetriever validates against
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from telemetry import debug, span
+
+LOCAL_RERANK_MODEL = os.getenv("LOCAL_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "auto").lower() # auto | cohere | local | none
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "0")) or None
+RERANK_BATCH_CONCURRENCY = int(os.getenv("RERANK_BATCH_CONCURRENCY", "4")) # Parallel requests to a remote reranker
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_cross_encoder(model_name: str):
+    """Load (once per process) a CPU cross-encoder."""
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import CrossEncoder
+            debug(f"[Rerank] Loading local cross-encoder: {model_name}")
+            _models[model_name] = CrossEncoder(model_name, device="cpu")
+        return _models[model_name]
+
+
+class LocalCrossEncoderReranker(BaseDocumentCompressor):
+    """
+    Offline reranker: scores every (query, chunk) pair with a local cross-encoder in one batched forward pass.
+
+    Scores are cached per (query, chunk text). With `latency_budget_ms` set, only as many uncached pairs
+    as fit in the budget (estimated from the measured per-pair cost) are scored; the rest keep their
+    incoming order behind the scored ones.
+
+    If the model can't be loaded (e.g. no network and no local copy) or scoring fails, documents keep
+    their fused order, truncated to `top_n`: a degraded answer rather than a failed request.
+    """
+
+    model_name: str = LOCAL_RERANK_MODEL
+    top_n: int = 5
+    latency_budget_ms: Optional[float] = None
+    cache_size: int = 4096
+
+    _score_cache: "OrderedDict[Tuple[str, str], float]" = PrivateAttr(default_factory=OrderedDict)
+    _cache_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _ms_per_pair: Optional[float] = PrivateAttr(default=None)
+    _unavailable: bool = PrivateAttr(default=False) # Model failed to load; don't retry on every query
+    _warned: bool = PrivateAttr(default=False)
+
+    def _cache_key(self, query: str, doc: Document) -> Tuple[str, str]:
+        return query, hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+    def _pair_limit(self) -> Optional[int]:
+        if not self.latency_budget_ms or not self._ms_per_pair:
+            return None
+        return max(1, int(self.latency_budget_ms / self._ms_per_pair))
+
+    def score(self, query: str, documents: Sequence[Document]) -> List[Optional[float]]:
+        """Cross-encoder score per document (None where the latency budget ran out)."""
+        return self.score_batch([query], [documents])[0]
+
+    def score_batch(self, queries: Sequence[str], document_lists: Sequence[Sequence[Document]]) -> List[List[Optional[float]]]:
+        """score() for several queries, with every uncached pair scored in a single forward pass."""
+        keys = [[self._cache_key(query, doc) for doc in documents] for query, documents in zip(queries, document_lists)]
+        with self._cache_lock:
+            scores: List[List[Optional[float]]] = [[self._score_cache.get(key) for key in row] for row in keys]
+        todo = [(q, i) for q, row in enumerate(scores) for i, s in enumerate(row) if s is None]
+        limit = self._pair_limit()
+        if limit is not None and len(todo) > limit:
+            debug(f"[Rerank] Latency budget allows {limit}/{len(todo)} uncached pairs.")
+            todo = todo[:limit]
+        if todo and not self._unavailable:
+            started = time.perf_counter()
+            pairs = [(queries[q], document_lists[q][i].page_content) for q, i in todo]
+            try:
+                model = load_cross_encoder(self.model_name)
+            except Exception as e:
+                self._unavailable = True
+                self._warn(f"could not load {self.model_name} ({e})")
+                return scores
+            try:
+                predicted = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            except Exception as e:
+                self._warn(f"scoring failed ({e})")
+                return scores
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            per_pair = elapsed_ms / len(pairs)
+            self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+            with self._cache_lock:
+                for (q, i), value in zip(todo, predicted):
+                    scores[q][i] = float(value)
+                    self._score_cache[keys[q][i]] = float(value)
+                    self._score_cache.move_to_end(keys[q][i])
+                while len(self._score_cache) > self.cache_size:
+                    self._score_cache.popitem(last=False)
+        return scores
+
+    def _warn(self, reason: str) -> None:
+        if not self._warned:
+            self._warned = True
+            print(f"[Rerank] Warning: cross-encoder {reason}; keeping the fused order without reranking.")
+
+    def _top_documents(self, documents: Sequence[Document], scores: List[Optional[float]]) -> List[Document]:
+        # Scored documents by score, then unscored ones in their incoming order
+        order = sorted(range(len(documents)), key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i))
+        reranked = []
+        for i in order[:self.top_n]:
+            doc = documents[i]
+            metadata = {**doc.metadata, "relevance_score": scores[i] if scores[i] is not None else "N/A"}
+            reranked.append(Document(page_content=doc.page_content, metadata=metadata))
+        return reranked
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if not documents:
+            return []
+        return self._top_documents(documents, self.score(query, documents))
+
+    def compress_batch(self, queries: Sequence[str], document_lists: Sequence[Sequence[Document]]) -> List[List[Document]]:
+        """compress_documents for several queries sharing one cross-encoder forward pass."""
+        scores = self.score_batch(queries, document_lists)
+        return [self._top_documents(documents, row) for documents, row in zip(document_lists, scores)]
+
+
+class TimedCompressionRetriever(ContextualCompressionRetriever):
+    """ContextualCompressionRetriever that records the compressor (reranker) call as a "rerank" span."""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        docs = self.base_retriever.get_relevant_documents(query, callbacks=run_manager.get_child(), **kwargs)
+        if not docs:
+            return []
+        with span("rerank"):
+            return list(self.base_compressor.compress_documents(docs, query, callbacks=run_manager.get_child()))
+
+
+def rerank_batch(reranker: Optional[BaseDocumentCompressor], queries: Sequence[str],
+                 document_lists: Sequence[Sequence[Document]],
+                 max_concurrency: int = RERANK_BATCH_CONCURRENCY) -> List[List[Document]]:
+    """
+    Rerank the candidates of several queries at once: one forward pass for the local cross-encoder,
+    concurrent requests (at most `max_concurrency`) for remote rerankers such as Cohere.
+    """
+    if reranker is None:
+        return [list(documents) for documents in document_lists]
+    with span("rerank"):
+        if isinstance(reranker, LocalCrossEncoderReranker):
+            return reranker.compress_batch(queries, document_lists)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(queries))), thread_name_prefix="rerank") as pool:
+            return list(pool.map(lambda args: list(reranker.compress_documents(args[1], args[0])) if args[1] else [],
+                                 zip(queries, document_lists)))
+
+
+def build_reranker(cohere_api_key: Optional[str], top_n: int = RERANK_TOP_N,
+                   backend: str = RERANKER_BACKEND) -> Optional[BaseDocumentCompressor]:
+    """
+    Reranker for the configured backend. "auto" prefers Cohere when an API key is set and falls back
+    to the local cross-encoder, so air-gapped deployments still get reranking.
+    """
+    if backend == "none":
+        return None
+    if backend in ("auto", "cohere") and cohere_api_key:
+        try:
+            from langchain_cohere import CohereRerank
+            return CohereRerank(model="rerank-english-v2.0", top_n=top_n)
+        except Exception as e:
+            print(f"[Rerank] Error setting up CohereRerank: {e}.")
+            if backend == "cohere":
+                return None
+    elif backend == "cohere":
+        print("[Rerank] RERANKER_BACKEND=cohere but COHERE_API_KEY is not set.")
+        return None
+    return LocalCrossEncoderReranker(top_n=top_n, latency_budget_ms=RERANK_LATENCY_BUDGET_MS)
@@ -0,0 +1,207 @@
+# telemetry.py
+# Stage timing spans, Prometheus text-format histograms for /metrics, per-request timings for the
+# Server-Timing header, and debug logging that can be switched off.
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# DEBUG_LOGGING=false silences the per-request/per-chunk progress logs; warnings and errors still print
+DEBUG_LOGGING = os.getenv("DEBUG_LOGGING", "true").lower() in ("1", "true", "yes")
+# Adds a Server-Timing header (stage;dur=ms, ...) to every response
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+
+# Seconds; spans range from sub-millisecond BM25 lookups to multi-minute extraction calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def debug(message: str) -> None:
+    if DEBUG_LOGGING:
+        print(message)
+
+
+# --- Histograms ---
+
+class Histogram:
+    """Cumulative-bucket histogram with label values, rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[float, int]]:
+        """(sum, count) per label set."""
+        with self._lock:
+            return {labels: (values[-2], values[-1]) for labels, values in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = f"{labels}," if labels else ""
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with label values, rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def totals(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.totals().items()):
+            labels = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(self.label_names, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram("rfp_stage_duration_seconds", "Time spent per pipeline stage.", ["stage"])
+REQUEST_SECONDS = Histogram("rfp_http_request_duration_seconds",
+                            "HTTP request time until the response starts.", ["method", "route", "status"])
+LLM_REQUESTS = Counter("rfp_llm_requests_total",
+                       "LLM client requests by outcome (upstream, coalesced, retried, failed, rejected).", ["outcome"])
+METRICS = [STAGE_SECONDS, REQUEST_SECONDS, LLM_REQUESTS]
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+# --- Spans ---
+
+class RequestTimings:
+    """Stage totals for one HTTP request, filled by spans running in its context (and threads it hands work to)."""
+
+    def __init__(self):
+        self.stages: Dict[str, List] = {} # stage -> [seconds, count]
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def server_timing(self, total_seconds: Optional[float] = None) -> str:
+        with self._lock:
+            parts = [f"{stage};dur={seconds * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+                     for stage, (seconds, count) in self.stages.items()]
+        if total_seconds is not None:
+            parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def observe(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def timed(stage: str, fn: Callable) -> Callable:
+    """`fn` with every call recorded as a `stage` span."""
+    def wrapper(*args, **kwargs):
+        with span(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def timed_iter(stage: str, items: Iterable) -> Iterator:
+    """Yields from `items`, recording the time spent producing each item (not consuming it) as `stage`."""
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(stage, time.perf_counter() - started)
+        yield item
+
+
+def submit(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit that runs `fn` in a copy of the caller's context, so its spans count toward the request."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class StageTimingCallback(BaseCallbackHandler):
+    """LangChain callback recording each LLM call (including streamed ones) as a `stage` span."""
+
+    def __init__(self, stage: str = "llm_generation"):
+        self.stage = stage
+        self._started: Dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            observe(self.stage, time.perf_counter() - started)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self.on_llm_end(None, run_id=run_id)
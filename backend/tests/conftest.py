@@ -0,0 +1,13 @@
+# Backend modules import each other from the backend directory (as when running `uvicorn rag:app` there)
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Module-level caches are created at import time; keep them out of the working tree
+_CACHE_ROOT = Path(tempfile.mkdtemp(prefix="rfp-tests-"))
+for _name, _sub in (("ANALYSIS_CACHE_DIR", "analysis"), ("INGEST_CACHE_DIR", "ingest"), ("CORPUS_DIR", "corpus"),
+                    ("DENSE_INDEX_DIR", "dense"), ("RAG_SPILL_DIR", "instances")):
+    os.environ.setdefault(_name, str(_CACHE_ROOT / _sub))
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+import models.analysis as analysis
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.fixtures import synthetic_rfp_pages
+from disk_cache import DiskCache
+from llm_client import PooledOllama
+
+
+class FakeExtraction:
+    """Stands in for _extract_chunk: each chunk text names its behaviour ("ok", "slow", "fail")."""
+
+    def __init__(self, work_seconds=0.0):
+        self.work_seconds = work_seconds
+        self.release = threading.Event() # Lets "slow" chunks finish when the test is done with them
+        self.started = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, chunk, i, total):
+        with self._lock:
+            self.started.append(i)
+        if chunk == "slow":
+            self.release.wait(10)
+        elif chunk == "fail":
+            raise RuntimeError("upstream exploded")
+        time.sleep(self.work_seconds)
+        return {"chunk": i}, {"prompt_tokens": 1, "completion_tokens": 1, "estimated_prompt_tokens": 1}
+
+
+@pytest.fixture
+def fake_extraction(monkeypatch):
+    fake = FakeExtraction()
+    monkeypatch.setattr(analysis, "_extract_chunk", fake)
+    yield fake
+    fake.release.set()
+
+
+def run(chunks, max_concurrency, chunk_timeout=5.0):
+    indices = list(range(len(chunks)))
+    return list(analysis._run_chunks([None] * len(chunks), chunks, indices, max_concurrency, chunk_timeout))
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_every_chunk_reports_once_and_errors_stay_per_chunk(fake_extraction, max_concurrency):
+    results = run(["ok", "fail", "ok", "ok"], max_concurrency)
+    assert sorted(i for i, *_ in results) == [0, 1, 2, 3]
+    failed = {i: (result, is_failed) for i, result, _, is_failed in results}
+    assert failed[1] == (None, True)
+    assert all(failed[i] == ({"chunk": i}, False) for i in (0, 2, 3))
+
+
+def test_sequential_mode_abandons_a_chunk_at_its_deadline(fake_extraction):
+    started = time.monotonic()
+    results = run(["slow", "ok"], max_concurrency=1, chunk_timeout=0.3)
+    assert time.monotonic() - started < 1.5
+    assert results == [(0, None, None, True), (1, {"chunk": 1}, results[1][2], False)]
+
+
+def test_concurrent_mode_abandons_a_stuck_chunk_without_blocking_the_rest(fake_extraction):
+    started = time.monotonic()
+    results = run(["slow", "ok", "ok", "ok"], max_concurrency=2, chunk_timeout=0.3)
+    assert time.monotonic() - started < 3.0 # Deadlines are checked at least once a second
+    assert results[-1] == (0, None, None, True)
+    assert sorted(i for i, _, _, failed in results if not failed) == [1, 2, 3]
+
+
+def test_timeout_counts_from_start_not_from_queueing(monkeypatch):
+    fake = FakeExtraction(work_seconds=0.3)
+    monkeypatch.setattr(analysis, "_extract_chunk", fake)
+    # Six 0.3s chunks on two workers take ~0.9s, past the 0.5s timeout, but none runs longer than 0.3s
+    results = run(["ok"] * 6, max_concurrency=2, chunk_timeout=0.5)
+    assert not any(failed for *_, failed in results)
+
+
+def test_closing_the_stream_cancels_queued_chunks(fake_extraction):
+    stream = analysis._run_chunks([None] * 6, ["ok"] + ["slow"] * 5, list(range(6)), 2, 5.0)
+    assert next(stream)[0] == 0
+    stream.close()
+    fake_extraction.release.set()
+    time.sleep(0.2)
+    assert len(fake_extraction.started) <= 3 # The finished chunk plus the two that had a worker
+
+
+# --- End to end against the benchmark's fake Ollama ---
+
+RFP_TEXT = "\n\n".join("\n".join(lines) for lines in synthetic_rfp_pages(12, seed=3))
+
+
+@pytest.fixture
+def ollama(monkeypatch, tmp_path):
+    server = FakeOllamaServer(token_latency_ms=0, prompt_ms_per_1k_chars=0).start()
+    monkeypatch.setattr(analysis, "llm", PooledOllama(model="fake", base_url=server.base_url, temperature=0.1,
+                                                      num_ctx=analysis.ANALYSIS_NUM_CTX))
+    monkeypatch.setattr(analysis, "analysis_cache", DiskCache(str(tmp_path), max_bytes=1 << 26))
+    yield server
+    server.stop()
+
+
+def test_extraction_merges_pack_results_and_caches_the_document(ollama):
+    result = analysis.extract_structured_rfp_data(RFP_TEXT, max_concurrency=2)
+    assert result["issuing_agency"] == "Department of Benchmark Services"
+    assert result["submission_details"]["deadline_date"] == "2025-03-14"
+    assert result["extraction_stats"]["llm_calls"] == ollama.stats["requests"] > 0
+
+    again = analysis.extract_structured_rfp_data(RFP_TEXT, max_concurrency=2)
+    assert again["extraction_stats"]["document_cache_hit"]
+    assert ollama.stats["requests"] == result["extraction_stats"]["llm_calls"]
+
+
+def test_an_unparseable_pack_keeps_the_document_out_of_the_cache(ollama):
+    calls = []
+    respond = ollama.response_tokens
+
+    def first_call_garbled(prompt):
+        calls.append(prompt)
+        return ["this is not json"] if len(calls) == 1 else respond(prompt)
+
+    ollama.response_tokens = first_call_garbled
+    first = analysis.extract_structured_rfp_data(RFP_TEXT, max_concurrency=1)
+    assert first["extraction_stats"]["packs"] > 1
+    assert "document_cache_hit" not in first["extraction_stats"]
+
+    second = analysis.extract_structured_rfp_data(RFP_TEXT, max_concurrency=1)
+    assert "document_cache_hit" not in second["extraction_stats"]
+    assert second["extraction_stats"]["llm_calls"] == 1 # Only the garbled pack is retried
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from answer_cache import SemanticAnswerCache
+
+# Questions map to fixed directions; paraphrases share a direction
+VECTORS = {
+    "what is the deadline?": [1.0, 0.0, 0.0],
+    "when is the deadline?": [0.99, 0.14, 0.0],
+    "who is the contact?": [0.0, 1.0, 0.0],
+    "what is the budget?": [0.0, 0.0, 2.0],
+}
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.query_calls = 0
+        self.document_calls = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return VECTORS[text]
+
+    def embed_documents(self, texts):
+        self.document_calls += 1
+        return [VECTORS[text] for text in texts]
+
+
+SOURCES = [Document(page_content="Proposals are due May 1.")]
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+
+def test_paraphrase_hits_within_the_same_scope(embeddings):
+    cache = SemanticAnswerCache(embeddings, threshold=0.9)
+    cache.store(["b", "a"], "what is the deadline?", "May 1", SOURCES)
+    answer, sources, similarity = cache.lookup(["a", "b"], "when is the deadline?")
+    assert (answer, sources) == ("May 1", SOURCES)
+    assert similarity > 0.9
+    assert cache.lookup(["a", "b"], "who is the contact?") is None
+    assert cache.lookup(["a"], "what is the deadline?") is None # Different scope
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_empty_scope_misses_without_embedding(embeddings):
+    cache = SemanticAnswerCache(embeddings)
+    assert cache.lookup(["a"], "what is the deadline?") is None
+    assert embeddings.query_calls == 0
+
+
+def test_precomputed_vector_is_reused(embeddings):
+    cache = SemanticAnswerCache(embeddings, threshold=0.9)
+    vector = cache.embed_question("what is the deadline?")
+    cache.store(["a"], "what is the deadline?", "May 1", SOURCES, vector=vector)
+    assert cache.lookup(["a"], "what is the deadline?", vector=vector)[0] == "May 1"
+    assert embeddings.query_calls == 1
+
+
+def test_batch_embeddings_match_single_embeddings(embeddings):
+    cache = SemanticAnswerCache(embeddings)
+    questions = ["what is the deadline?", "what is the budget?"]
+    batch = cache.embed_questions(questions)
+    assert embeddings.document_calls == 1
+    for row, question in zip(batch, questions):
+        np.testing.assert_allclose(row, cache.embed_question(question), rtol=1e-6)
+    assert np.linalg.norm(batch[1]) == pytest.approx(1.0)
+
+
+def test_invalidate_drops_entries_touching_a_document(embeddings):
+    cache = SemanticAnswerCache(embeddings)
+    cache.store(["a"], "what is the deadline?", "May 1", SOURCES)
+    cache.store(["a", "b"], "who is the contact?", "Jane", SOURCES)
+    cache.store(["c"], "what is the budget?", "$1M", SOURCES)
+    assert cache.invalidate("b") == 1
+    assert cache.lookup(["a", "b"], "who is the contact?") is None
+    assert cache.invalidate() == 2
+
+
+def test_least_recently_used_entry_is_evicted(embeddings):
+    cache = SemanticAnswerCache(embeddings, threshold=0.9, max_entries=2)
+    cache.store(["a"], "what is the deadline?", "May 1", SOURCES)
+    cache.store(["a"], "who is the contact?", "Jane", SOURCES)
+    assert cache.lookup(["a"], "what is the deadline?") is not None # Refreshes the first entry
+    cache.store(["a"], "what is the budget?", "$1M", SOURCES)
+    assert cache.lookup(["a"], "who is the contact?") is None
+    assert cache.lookup(["a"], "what is the deadline?") is not None
+
+
+def test_expired_entries_are_not_served(embeddings):
+    cache = SemanticAnswerCache(embeddings, ttl_seconds=-1)
+    cache.store(["a"], "what is the deadline?", "May 1", SOURCES)
+    assert cache.lookup(["a"], "what is the deadline?") is None
+    assert not cache._entries
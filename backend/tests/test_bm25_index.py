@@ -0,0 +1,159 @@
+import json
+import math
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from bm25_index import SparseBM25Index, tokenize
+
+
+def chunks(word: str, n: int):
+    return [Document(page_content=f"{word} clause {i} term{i}", metadata={"chunk_index": i}) for i in range(n)]
+
+
+def make_index() -> SparseBM25Index:
+    index = SparseBM25Index()
+    index.add_documents("a", chunks("apple", 3))
+    index.add_documents("b", chunks("banana", 3))
+    return index
+
+
+def texts(results):
+    return [doc.page_content for doc, _ in results]
+
+
+def test_search_ranks_matching_chunks_and_scopes_by_document():
+    index = make_index()
+    assert texts(index.search("banana term1", k=2))[0] == "banana clause 1 term1"
+    assert all(t.startswith("apple") for t in texts(index.search("clause term1", k=10, doc_ids=["a"])))
+    assert index.search("nothing matches this") == []
+
+
+def test_removed_document_is_tombstoned_without_touching_others():
+    index = make_index()
+    index.COMPACT_RATIO = 1.0 # Keep the tombstones
+    assert index.remove_document("a")
+    assert not index.has_document("a")
+    assert index.live_count == 3 and len(index.slot_docs) == 6
+    assert all(t.startswith("banana") for t in texts(index.search("clause", k=10)))
+    assert not index.remove_document("a")
+
+
+def test_compaction_keeps_scores_and_renumbers_slots():
+    index = make_index()
+    index.COMPACT_RATIO = 1.0
+    index.remove_document("a")
+    before = index.search("banana term2", k=3)
+    index.compact()
+    assert len(index.slot_docs) == 3
+    assert index.owner_ranges == {"b": (0, 3)}
+    after = index.search("banana term2", k=3)
+    assert texts(after) == texts(before)
+    assert [score for _, score in after] == [score for _, score in before]
+
+
+def test_re_adding_a_document_replaces_its_chunks():
+    index = make_index()
+    index.add_documents("a", chunks("avocado", 2))
+    assert index.search("apple") == []
+    assert texts(index.search("avocado term1", k=1)) == ["avocado clause 1 term1"]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_index()
+    index.save(str(tmp_path))
+    loaded = SparseBM25Index.load(str(tmp_path))
+    for query in ("apple term0", "banana clause", "term2"):
+        assert loaded.search(query, k=4) == index.search(query, k=4)
+    assert loaded.owner_ranges == index.owner_ranges
+
+
+def test_save_writes_one_segment_per_document_and_leaves_others_alone(tmp_path):
+    index = make_index()
+    index.save(str(tmp_path))
+    segment_a = tmp_path / "segments" / "a.json"
+    written = segment_a.stat().st_mtime_ns
+    assert "docs" not in json.loads((tmp_path / "meta.json").read_text())
+
+    index.add_documents("c", chunks("cherry", 2))
+    index.remove_document("b")
+    index.save(str(tmp_path))
+    assert sorted(p.name for p in (tmp_path / "segments").iterdir()) == ["a.json", "c.json"]
+    assert segment_a.stat().st_mtime_ns == written
+
+    loaded = SparseBM25Index.load(str(tmp_path))
+    assert texts(loaded.search("cherry term1", k=1)) == ["cherry clause 1 term1"]
+    assert loaded.search("banana") == []
+
+
+def test_loads_the_older_inline_layout_and_migrates_it(tmp_path):
+    index = make_index()
+    index.save(str(tmp_path))
+    meta = json.loads((tmp_path / "meta.json").read_text())
+    meta["owner_slots"] = {doc_id: list(range(*r)) for doc_id, r in index.owner_ranges.items()}
+    meta["docs"] = [{"page_content": d.page_content, "metadata": d.metadata} for d in index.slot_docs]
+    del meta["owners"]
+    (tmp_path / "meta.json").write_text(json.dumps(meta))
+    for segment in (tmp_path / "segments").iterdir():
+        segment.unlink()
+
+    loaded = SparseBM25Index.load(str(tmp_path))
+    assert loaded.search("apple term1", k=2) == index.search("apple term1", k=2)
+    loaded.save(str(tmp_path))
+    assert sorted(p.name for p in (tmp_path / "segments").iterdir()) == ["a.json", "b.json"]
+    assert SparseBM25Index.load(str(tmp_path)).search("banana", k=3) == index.search("banana", k=3)
+
+
+def test_load_or_create_starts_empty_on_a_damaged_index(tmp_path):
+    index = make_index()
+    index.save(str(tmp_path))
+    (tmp_path / "segments" / "a.json").unlink()
+    assert SparseBM25Index.load_or_create(str(tmp_path)).live_count == 0
+
+
+def reference_scores(index, query, doc_ids=None):
+    """Plain-Python BM25 over the live chunks, scoped like the index (positive scores only)."""
+    live = [(doc_id, slot) for doc_id, (start, end) in index.owner_ranges.items() for slot in range(start, end)]
+    tokens = {slot: tokenize(index.slot_docs[slot].page_content) for _, slot in live}
+    avgdl = sum(len(t) for t in tokens.values()) / len(tokens)
+    scores = {}
+    for doc_id, slot in live:
+        if doc_ids is not None and doc_id not in doc_ids:
+            continue
+        tf, score = Counter(tokens[slot]), 0.0
+        for term, qtf in Counter(tokenize(query)).items():
+            df = sum(1 for t in tokens.values() if term in t)
+            if tf[term]:
+                idf = math.log((len(tokens) - df + 0.5) / (df + 0.5) + 1.0)
+                norm = index.k1 * (1 - index.b + index.b * len(tokens[slot]) / avgdl)
+                score += qtf * idf * tf[term] * (index.k1 + 1) / (tf[term] + norm)
+        if score > 0:
+            scores[index.slot_docs[slot].page_content] = score
+    return scores
+
+
+def test_scores_match_plain_bm25_with_and_without_scope():
+    index = make_index()
+    index.add_documents("c", [Document(page_content="apple banana clause clause term1")])
+    index.COMPACT_RATIO = 1.0
+    index.add_documents("d", chunks("durian", 4))
+    index.remove_document("d") # Tombstoned, not compacted
+    for query, scope in [("clause term1", None), ("apple banana term2", ["a", "c"]),
+                         ("clause", ["b"]), ("term0 term0 durian", None), ("clause", ["c", "missing"])]:
+        results = index.search(query, k=100, doc_ids=scope)
+        expected = reference_scores(index, query, scope)
+        assert {doc.page_content for doc, _ in results} == set(expected)
+        for doc, score in results:
+            assert abs(score - expected[doc.page_content]) < 1e-4
+        assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+    assert index.search("clause", doc_ids=[]) == []
+    assert index.search("clause", doc_ids=["d"]) == []
+
+
+def test_a_document_without_chunks_survives_save_and_load(tmp_path):
+    index = make_index()
+    index.add_documents("empty", [])
+    index.save(str(tmp_path))
+    loaded = SparseBM25Index.load(str(tmp_path))
+    assert loaded.has_document("empty")
+    assert loaded.search("apple", k=3) == index.search("apple", k=3)
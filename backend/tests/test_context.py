@@ -0,0 +1,85 @@
+from langchain_core.documents import Document
+
+from context import assemble_context
+from ingestion import make_text_splitter
+
+WORDS = ["alpha", "beta", "gamma", "delta", "proposal", "deadline", "agency", "submit", "page"]
+
+
+def page_text(salt: str = "") -> str:
+    # One paragraph, so consecutive chunks share the splitter's 100-char overlap
+    return " ".join(f"{WORDS[i % len(WORDS)]}{salt}{i}" for i in range(400))
+
+
+PAGE = page_text()
+
+
+def page_chunks(doc_id: str = "doc", page: int = 0, text: str = PAGE):
+    splitter = make_text_splitter(500, 100, ["\n\n", "\n", " ", ""])
+    chunks = splitter.split_documents([Document(page_content=text, metadata={"source": "rfp.pdf", "page": page})])
+    for i, chunk in enumerate(chunks):
+        chunk.metadata.update(doc_id=doc_id, chunk_index=i)
+    return chunks
+
+
+def span_of(chunks, first: int, last: int) -> str:
+    start = chunks[first].metadata["start_index"]
+    return PAGE[start:chunks[last].metadata["start_index"] + len(chunks[last].page_content)]
+
+
+def lookup(key):
+    return PAGE if key == ("doc", 0) else None
+
+
+def test_overlapping_hits_merge_into_one_block_in_document_order():
+    chunks = page_chunks()
+    context = assemble_context([chunks[3], chunks[1], chunks[2], chunks[6]], token_budget=0, page_text=lookup)
+    assert context == span_of(chunks, 1, 3) + "\n\n" + chunks[6].page_content
+
+
+def test_without_page_text_the_overlap_is_still_read_once():
+    chunks = page_chunks()
+    assert chunks[1].metadata["start_index"] < chunks[0].metadata["start_index"] + len(chunks[0].page_content)
+    assert assemble_context([chunks[2], chunks[1]], token_budget=0) == span_of(chunks, 1, 2)
+
+
+def test_repeated_hits_are_kept_once():
+    chunks = page_chunks()
+    assert assemble_context([chunks[4], chunks[4]], token_budget=0) == chunks[4].page_content
+    legacy = [Document(page_content=c.page_content, metadata={"doc_id": "doc"}) for c in (chunks[4], chunks[4])]
+    assert assemble_context(legacy, token_budget=0) == chunks[4].page_content
+
+
+def test_budget_keeps_the_best_ranked_blocks_that_fit():
+    chunks = page_chunks()
+    best, third = chunks[6], chunks[3]
+    budget = -(-len(best.page_content) // 3) + -(-len(third.page_content) // 3) + 5
+    # chunks 0 and 1 merge into the second-ranked block, which doesn't fit after the first; the third still does
+    context = assemble_context([best, chunks[0], third, chunks[1]], token_budget=budget, chars_per_token=3.0)
+    assert context == third.page_content + "\n\n" + best.page_content
+
+
+def test_an_oversized_best_block_is_truncated_to_the_budget():
+    chunks = page_chunks()
+    context = assemble_context([chunks[2]], token_budget=50, chars_per_token=3.0)
+    assert context == chunks[2].page_content[:150]
+
+
+def test_short_hits_are_widened_to_the_parent_window():
+    chunks = page_chunks()
+    hit = Document(page_content=PAGE[1000:1040], metadata={"doc_id": "doc", "page": 0, "start_index": 1000})
+    context = assemble_context([hit], token_budget=0, page_text=lookup, parent_chars=400)
+    assert PAGE[1000:1040] in context
+    assert 400 <= len(context) < 450
+    assert PAGE.find(context) >= 0
+
+
+def test_documents_are_ordered_by_best_hit_then_page_and_offset():
+    late_page = page_chunks("doc", page=2, text=page_text("p2_"))
+    early_page = page_chunks("doc", page=1, text=page_text("p1_"))
+    other_doc = page_chunks("other", page=0, text=page_text("o_"))
+    docs = [other_doc[5], late_page[0], early_page[6], other_doc[0]]
+    context = assemble_context(docs, token_budget=0)
+    expected = [other_doc[0], other_doc[5], early_page[6], late_page[0]]
+    assert context == "\n\n".join(d.page_content for d in expected)
+
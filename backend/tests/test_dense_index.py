@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from dense_index import DenseVectorIndex, normalize_rows
+
+
+def corpus(n=50, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    documents = [Document(page_content=f"chunk {i}", metadata={"chunk_index": i}) for i in range(n)]
+    return vectors, documents
+
+
+def brute_force(vectors, query, k):
+    scores = normalize_rows(vectors) @ normalize_rows([query])[0]
+    return list(np.argsort(-scores, kind="stable")[:k])
+
+
+def test_search_matches_brute_force():
+    vectors, documents = corpus()
+    index = DenseVectorIndex.build(vectors, documents)
+    query = vectors[3] + 0.1
+    results = index.search(query, k=5)
+    assert [doc.metadata["chunk_index"] for doc, _ in results] == brute_force(vectors, query, 5)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert index.search(vectors[7], k=1)[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_k_larger_than_the_index_returns_everything():
+    vectors, documents = corpus(n=4)
+    index = DenseVectorIndex.build(vectors, documents)
+    assert len(index.search(vectors[0], k=10)) == 4
+    assert index.search(vectors[0], k=0) == []
+
+
+def test_search_batch_matches_search():
+    vectors, documents = corpus()
+    index = DenseVectorIndex.build(vectors, documents)
+    queries = vectors[:3] + 0.05
+    for single, batched in zip([index.search(q, k=4) for q in queries], index.search_batch(queries, k=4)):
+        assert [d.page_content for d, _ in single] == [d.page_content for d, _ in batched]
+        np.testing.assert_allclose([s for _, s in single], [s for _, s in batched], rtol=1e-5)
+    assert index.search_batch([], k=4) == []
+
+
+def test_build_saves_and_loads_memory_mapped(tmp_path):
+    vectors, documents = corpus()
+    directory = str(tmp_path / "dense")
+    assert not DenseVectorIndex.exists(directory)
+    built = DenseVectorIndex.build(vectors, documents, directory=directory)
+    assert DenseVectorIndex.exists(directory)
+    assert not list((tmp_path / "dense").glob("*.tmp*"))
+    assert isinstance(built.vectors, np.memmap)
+
+    loaded = DenseVectorIndex.load(directory, mmap=False)
+    assert len(loaded) == len(documents)
+    assert loaded.documents[5].metadata == {"chunk_index": 5}
+    np.testing.assert_allclose(loaded.vectors, normalize_rows(vectors))
+
+
+def test_float16_storage_keeps_the_ranking():
+    vectors, documents = corpus()
+    index = DenseVectorIndex.build(vectors, documents, dtype="float16")
+    assert index.vectors.dtype == np.float16
+    assert index.search(vectors[11], k=1)[0][0].metadata["chunk_index"] == 11
+
+
+def test_mismatched_lengths_are_rejected():
+    vectors, documents = corpus(n=3)
+    with pytest.raises(ValueError):
+        DenseVectorIndex(normalize_rows(vectors), documents[:2])
+
+
+def test_zero_rows_are_not_divided_by_zero():
+    assert not np.isnan(normalize_rows([[0.0, 0.0], [3.0, 4.0]])).any()
+
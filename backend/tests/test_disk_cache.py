@@ -0,0 +1,43 @@
+import os
+
+from disk_cache import DiskCache, file_sha256, make_cache_key
+
+
+def test_round_trip_and_delete(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    assert cache.get("missing") is None
+    cache.set("key", {"splits": [1, 2, 3]})
+    assert "key" in cache
+    assert cache.get("key") == {"splits": [1, 2, 3]}
+    cache.delete("key")
+    assert "key" not in cache
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unreadable_entry_is_dropped(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+    assert cache.get("broken") is None
+    assert "broken" not in cache
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=2500)
+    for i, key in enumerate(["a", "b"]):
+        cache.set(key, b"x" * 1000)
+        os.utime(tmp_path / f"{key}.pkl", (1000 + i, 1000 + i))
+    cache.get("a") # Bumps "a" past "b"
+    cache.set("c", b"x" * 1000)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.size_bytes() <= 2500
+
+
+def test_keys_are_stable_and_setting_sensitive(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(b"hello" * 100000)
+    digest = file_sha256(str(path), block_size=4096)
+    assert digest == file_sha256(str(path))
+    assert make_cache_key(digest, 1000, 200) == make_cache_key(digest, 1000, 200)
+    assert make_cache_key(digest, 1000, 200) != make_cache_key(digest, 1000, 201)
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from embedding import EmbeddingStage, decode_vectors, encode_vectors
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def normalized(rows: np.ndarray) -> np.ndarray:
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def vectors() -> np.ndarray:
+    return normalized(np.random.default_rng(0).standard_normal((500, 768)).astype(np.float32))
+
+
+def test_float32_storage_is_the_default_and_exact(vectors):
+    packed = encode_vectors(vectors)
+    assert packed["dtype"] == "float32"
+    assert np.array_equal(decode_vectors(packed), vectors)
+
+
+def random_queries(count: int = 20) -> np.ndarray:
+    # Unrelated random queries: the top-10 scores are nearly tied, the hardest case for rounding
+    return normalized(np.random.default_rng(1).standard_normal((count, 768)).astype(np.float32))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_storage_keeps_cosine(vectors, dtype):
+    decoded = decode_vectors(encode_vectors(vectors, dtype))
+    assert decoded.dtype == np.float32 and decoded.shape == vectors.shape
+    assert np.sum(normalized(decoded) * vectors, axis=1).min() >= 0.999
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-4), ("int8", 5e-3)])
+def test_compact_storage_keeps_top_k_order_up_to_rounding(vectors, dtype, tolerance):
+    # Random queries leave the top-10 scores nearly tied; neighbours may only swap where exact scores
+    # are within `tolerance`, and anything pushed out of the top-k must have been tied with the k-th
+    decoded = decode_vectors(encode_vectors(vectors, dtype))
+    for query in random_queries():
+        exact, compact = vectors @ query, decoded @ query
+        exact_top, compact_top = np.argsort(-exact)[:10], np.argsort(-compact)[:10]
+        assert all(exact[a] >= exact[b] - tolerance for a, b in zip(compact_top, compact_top[1:]))
+        assert all(exact[i] <= exact[exact_top[-1]] + tolerance for i in set(exact_top) - set(compact_top))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_storage_finds_each_stored_vector_first(vectors, dtype):
+    decoded = decode_vectors(encode_vectors(vectors, dtype))
+    assert np.array_equal(np.argmax(decoded @ vectors.T, axis=0), np.arange(len(vectors)))
+
+
+def test_int8_handles_zero_rows():
+    decoded = decode_vectors(encode_vectors(np.zeros((2, 4), dtype=np.float32), "int8"))
+    assert np.array_equal(decoded, np.zeros((2, 4), dtype=np.float32))
+
+
+def test_plain_lists_from_older_cache_entries_decode():
+    assert decode_vectors([[1, 2], [3, 4]]).dtype == np.float32
+
+
+def test_embedding_stage_embeds_each_normalized_text_once():
+    model = CountingEmbeddings()
+    stage = EmbeddingStage(model, batch_size=2)
+    vectors = stage.embed(["Page 1 of 9", "page 1  of 9", "Scope of work", "Page 1 of 9"])
+    assert vectors[0] == vectors[1] == vectors[3]
+    assert sum(len(batch) for batch in model.calls) == 2
+    assert stage.stats() == {"chunks": 4, "embedded": 2, "saved_by_dedup": 2}
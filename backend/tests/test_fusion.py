@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from fusion import RRF_K, HybridFusionRetriever, fuse, retrieval_options
+
+
+def doc(name: str) -> Document:
+    return Document(page_content=f"text of {name}", metadata={"chunk_id": name})
+
+
+A, B, C, D = doc("a"), doc("b"), doc("c"), doc("d")
+
+
+def names(results):
+    return [d.metadata["chunk_id"] for d, _ in results]
+
+
+def test_rrf_sums_weighted_reciprocal_ranks_by_chunk_id():
+    dense = [(A, 0.9), (B, 0.8), (C, 0.1)]
+    lexical = [(C, 12.0), (B, 3.0)]
+    fused = dict((d.metadata["chunk_id"], s) for d, s in fuse([dense, lexical], [0.7, 0.3], "rrf"))
+    assert fused["a"] == pytest.approx(0.7 / (RRF_K + 1))
+    assert fused["b"] == pytest.approx(0.7 / (RRF_K + 2) + 0.3 / (RRF_K + 2))
+    assert fused["c"] == pytest.approx(0.7 / (RRF_K + 3) + 0.3 / (RRF_K + 1))
+    assert names(fuse([dense, lexical], [0.7, 0.3], "rrf")) == ["b", "c", "a"]
+
+
+def test_same_chunk_from_both_sources_appears_once():
+    copy_of_a = Document(page_content=A.page_content, metadata={"chunk_id": "a", "bm25_score": 2.0})
+    assert names(fuse([[(A, 0.5)], [(copy_of_a, 2.0)]], [0.5, 0.5])) == ["a"]
+
+
+def test_score_fusion_min_max_normalizes_each_source():
+    dense = [(A, 0.9), (B, 0.5)]
+    lexical = [(B, 40.0), (C, 20.0), (D, 0.0)]
+    fused = dict((d.metadata["chunk_id"], s) for d, s in fuse([dense, lexical], [0.5, 0.5], "score"))
+    assert fused == pytest.approx({"a": 0.5, "b": 0.5, "c": 0.25, "d": 0.0})
+
+
+def test_score_fusion_of_a_constant_source_counts_every_hit_fully():
+    fused = fuse([[(A, 3.0), (B, 3.0)], []], [1.0, 1.0], "score")
+    assert [s for _, s in fused] == [1.0, 1.0]
+
+
+def test_empty_inputs_and_unknown_method():
+    assert fuse([[], []], [0.5, 0.5]) == []
+    with pytest.raises(ValueError):
+        fuse([[(A, 1.0)]], [1.0], "borda")
+
+
+def test_retriever_fuses_truncates_and_reuses_a_query_vector():
+    calls = []
+
+    def dense_search(query, k):
+        calls.append("dense")
+        return [(A, 0.9), (B, 0.8)]
+
+    def dense_search_batch(vectors, k):
+        calls.append(("dense_batch", np.asarray(vectors).shape))
+        return [[(B, 0.9), (A, 0.8)]]
+
+    retriever = HybridFusionRetriever(dense_search=dense_search, lexical_search=lambda query, k: [(C, 5.0)],
+                                      dense_search_batch=dense_search_batch, k=2, weights=[0.5, 0.5])
+    results = retriever.invoke("question")
+    assert [d.metadata["chunk_id"] for d in results] == ["a", "c"]
+    assert all("fused_score" in d.metadata for d in results)
+
+    results = retriever.invoke("question", query_vector=np.ones(4, dtype=np.float32))
+    assert [d.metadata["chunk_id"] for d in results] == ["b", "c"]
+    assert calls == ["dense", ("dense_batch", (1, 4))]
+
+
+def test_with_options_validates_overrides():
+    retriever = HybridFusionRetriever(dense_search=None, lexical_search=None)
+    assert retriever.with_options(k=3, method="score").k == 3
+    with pytest.raises(ValueError):
+        retriever.with_options(weights=[1.0])
+    with pytest.raises(ValueError):
+        retriever.with_options(method="borda")
+
+
+@pytest.mark.parametrize("options", [
+    {"k": 0}, {"k": -5}, {"k": True}, {"k": "10"},
+    {"weights": [0.7]}, {"weights": [0.5, 0.3, 0.2]}, {"weights": [float("nan"), 0.3]},
+    {"weights": [float("inf"), 0.3]}, {"weights": [-0.1, 1.0]}, {"weights": [0, 0]}, {"weights": ["a", "b"]},
+    {"method": "borda"}, {"method": ""},
+])
+def test_retrieval_options_rejects_bad_values(options):
+    with pytest.raises(ValueError):
+        retrieval_options(**options)
+
+
+def test_retrieval_options_keeps_only_set_values():
+    assert retrieval_options() == {}
+    assert retrieval_options(k=5, weights=(1, 0), method="score") == {"k": 5, "weights": [1.0, 0.0], "method": "score"}
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ingestion
+from benchmarks.fixtures import synthetic_fixture
+from benchmarks.run import HashEmbeddings
+from ingestion import IngestionPipeline, make_text_splitter
+
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+def splitter_threads():
+    return [t for t in threading.enumerate() if t.name == "ingest-split" and t.is_alive()]
+
+
+def pipeline(embed_batch=None, **kwargs) -> IngestionPipeline:
+    return IngestionPipeline(make_text_splitter(200, 20, SEPARATORS),
+                             embed_batch or HashEmbeddings(size=64).embed_documents, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def rfp_pdf(tmp_path_factory):
+    return str(synthetic_fixture(6, tmp_path_factory.mktemp("fixtures"), seed=1))
+
+
+def test_text_file_is_split_and_embedded_in_order(tmp_path):
+    path = tmp_path / "rfp.txt"
+    path.write_text("\n\n".join(f"Section {i}. The offeror shall provide item {i} as specified." for i in range(40)))
+    embeddings = HashEmbeddings(size=64)
+    pages, splits, vectors = pipeline(batch_size=4, queue_batches=1).run(str(path))
+    assert len(pages) == 1 and len(splits) > 4
+    assert vectors == embeddings.embed_documents([doc.page_content for doc in splits])
+    assert [doc.metadata["start_index"] for doc in splits] == sorted(doc.metadata["start_index"] for doc in splits)
+
+
+def test_pdf_pages_arrive_in_order_from_the_executor(rfp_pdf):
+    progress = []
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        pages, splits, vectors = pipeline(executor=executor, batch_size=8, queue_batches=2).run(
+            rfp_pdf, lambda stage, fraction: progress.append(fraction))
+    assert [page.metadata["page"] for page in pages] == list(range(6))
+    assert len(vectors) == len(splits)
+    assert [doc.metadata["page"] for doc in splits] == sorted(doc.metadata["page"] for doc in splits)
+    assert progress == sorted(progress) and progress[-1] == pytest.approx(0.8)
+
+
+def test_an_embedding_failure_propagates_and_stops_the_splitter(rfp_pdf):
+    calls = []
+
+    def failing_embed(texts):
+        calls.append(texts)
+        raise RuntimeError("embedder exploded")
+
+    # A one-batch queue leaves the splitter blocked on put() when the embedder fails
+    with pytest.raises(RuntimeError, match="embedder exploded"):
+        pipeline(failing_embed, batch_size=1, queue_batches=1).run(rfp_pdf)
+    assert len(calls) == 1
+    assert splitter_threads() == []
+
+
+def test_a_page_extraction_failure_mid_stream_reaches_the_caller(tmp_path, monkeypatch):
+    long_pdf = str(synthetic_fixture(20, tmp_path, seed=2)) # Three page ranges; the second one fails
+    extract = ingestion.extract_pdf_pages
+
+    def failing_extract(file_path, start, end):
+        if start > 0:
+            raise OSError("page range unreadable")
+        return extract(file_path, start, end)
+
+    monkeypatch.setattr(ingestion, "extract_pdf_pages", failing_extract)
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return HashEmbeddings(size=64).embed_documents(texts)
+
+    with pytest.raises(OSError, match="page range unreadable"):
+        pipeline(embed, batch_size=1).run(long_pdf)
+    assert embedded # The first range was already flowing through the pipeline
+    assert splitter_threads() == []
+
+
+def test_unsupported_file_types_are_rejected(tmp_path):
+    path = tmp_path / "rfp.docx"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        pipeline().run(str(path))
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fixtures import synthetic_fixture
+from ingestion import count_pdf_pages, extract_pdf_pages
+from jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(process_workers=1, job_threads=1, max_finished_jobs=3)
+    yield manager
+    manager.shutdown()
+
+
+def wait_for(job, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in (JOB_DONE, JOB_FAILED):
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+def test_a_job_moves_from_queued_through_running_to_done(manager):
+    release = threading.Event()
+    blocker = manager.submit("block", lambda job: release.wait(10) and {})
+    seen = []
+
+    def work(job):
+        seen.append(job.status)
+        job.update("parsing", 0.5)
+        return {"answer": 42}
+
+    job = manager.submit("work", work, filename="rfp.pdf")
+    assert job.status == JOB_QUEUED and job.started_at is None # The only job thread is busy
+    release.set()
+    wait_for(job)
+    assert seen == [JOB_RUNNING]
+    assert job.result == {"answer": 42} and job.error is None
+    assert (job.stage, job.progress) == ("done", 1.0)
+    assert job.created_at <= job.started_at <= job.finished_at
+    assert manager.get(job.job_id).to_dict()["params"] == {"filename": "rfp.pdf"}
+    wait_for(blocker)
+
+
+def test_a_failing_job_records_its_error(manager):
+    def explode(job):
+        job.update("embedding", 0.4)
+        raise ValueError("Document loaded but resulted in no content.")
+
+    job = wait_for(manager.submit("ingest", explode))
+    assert job.status == JOB_FAILED and job.stage == "failed"
+    assert job.error == "Document loaded but resulted in no content."
+    assert job.result is None and job.finished_at is not None
+    assert job.progress == 0.4 # Left where the job failed
+
+
+def test_a_job_can_hand_work_to_the_process_pool(manager, tmp_path):
+    pdf = str(synthetic_fixture(3, tmp_path, seed=5))
+
+    def ingest(job):
+        pages = manager.process_pool.submit(extract_pdf_pages, pdf, 0, count_pdf_pages(pdf)).result()
+        return {"pages": [page.metadata["page"] for page in pages]}
+
+    assert wait_for(manager.submit("ingest", ingest), timeout=60).result == {"pages": [0, 1, 2]}
+
+
+def test_only_the_newest_finished_jobs_are_kept(manager):
+    finished = [wait_for(manager.submit("work", lambda job: {})) for _ in range(5)]
+    release = threading.Event()
+    running = manager.submit("block", lambda job: release.wait(10) and {})
+    kept = {job["job_id"] for job in manager.list_jobs()}
+    assert kept == {job.job_id for job in finished[-3:]} | {running.job_id}
+    assert manager.get(finished[0].job_id) is None
+    release.set()
+    wait_for(running)
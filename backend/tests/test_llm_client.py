@@ -0,0 +1,115 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from llm_client import OllamaBusyError, OllamaClient, OllamaError, PooledOllama
+
+
+@pytest.fixture
+def server():
+    fake = FakeOllamaServer(token_latency_ms=0, prompt_ms_per_1k_chars=0, answer_tokens=3).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def flaky_server():
+    """Answers each /api/generate with the next status in `statuses` (200 once they run out)."""
+    statuses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status = statuses.pop(0) if statuses else 200
+            body = b'{"response": "ok", "done": true}' if status == 200 else b'{"error": "busy"}'
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address[:2]
+    yield f"http://{host}:{port}", statuses
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_generate_returns_the_answer_and_token_counts(server):
+    result = OllamaClient(server.base_url).generate({"model": "fake", "prompt": "hello there"})
+    assert result["response"] == "token0 token1 token2 "
+    assert result["eval_count"] == 3
+    assert result["prompt_eval_count"] == len("hello there") // 4
+
+
+def test_stream_yields_messages_and_frees_its_slot(server):
+    client = OllamaClient(server.base_url, max_concurrency=1, admission_timeout=1)
+    messages = list(client.stream({"model": "fake", "prompt": "hi"}))
+    assert "".join(m["response"] for m in messages) == "token0 token1 token2 "
+    assert messages[-1]["done"]
+    assert client.generate({"model": "fake", "prompt": "again"})["done"] # The slot was released
+
+
+def test_identical_concurrent_requests_share_one_upstream_call(server):
+    server.token_latency_ms = 50
+    client = OllamaClient(server.base_url)
+    results = [None] * 4
+
+    def call(i):
+        results[i] = client.generate({"model": "fake", "prompt": "same prompt"})
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result == results[0] for result in results)
+    assert server.stats["requests"] < 4
+
+
+def test_transient_errors_are_retried(flaky_server):
+    base_url, statuses = flaky_server
+    statuses.extend([503, 429])
+    client = OllamaClient(base_url, max_retries=2, retry_backoff=0.01)
+    assert client.generate({"model": "fake", "prompt": "x"})["response"] == "ok"
+
+
+def test_retries_give_up_with_an_ollama_error(flaky_server):
+    base_url, statuses = flaky_server
+    statuses.extend([503, 503, 503])
+    with pytest.raises(OllamaError, match="after 2 attempts"):
+        OllamaClient(base_url, max_retries=1, retry_backoff=0.01).generate({"model": "fake", "prompt": "x"})
+
+
+def test_missing_model_is_not_retried(flaky_server):
+    base_url, statuses = flaky_server
+    statuses.extend([404, 404])
+    with pytest.raises(OllamaError, match="ollama pull fake"):
+        OllamaClient(base_url, retry_backoff=0.01).generate({"model": "fake", "prompt": "x"})
+    assert statuses == [404]
+
+
+def test_admission_timeout_raises_busy(server):
+    client = OllamaClient(server.base_url, max_concurrency=1, admission_timeout=0.05)
+    stream = client.stream({"model": "fake", "prompt": "hold the slot"})
+    next(stream)
+    with pytest.raises(OllamaBusyError):
+        client.generate({"model": "fake", "prompt": "queued"})
+    list(stream)
+
+
+def test_pooled_llm_invoke_and_stream(server):
+    llm = PooledOllama(model="fake", base_url=server.base_url, temperature=0)
+    assert llm.invoke("question") == "token0 token1 token2 "
+    assert "".join(llm.stream("question")) == "token0 token1 token2 "
+    result = llm.generate(["question"])
+    assert result.generations[0][0].generation_info["eval_count"] == 3
@@ -0,0 +1,114 @@
+import itertools
+
+from models.merging import IncrementalAnalysisMerger, identifier_tokens, normalize_text, similar
+
+COVER = {"issuing_agency": "Department of Health", "solicitation_number": "HHS-2024-007",
+         "submission_details": {"deadline_date": "August 30, 2024"}}
+FORMATTING = {"formatting_requirements": {
+    "font_details": "Times New Roman 11pt",
+    "page_limits": [{"section": "Technical Proposal", "page_limit": 30}],
+    "required_sections": ["Table of Contents", "Executive Summary"]}}
+ELIGIBILITY = {"eligibility_criteria": [
+    {"requirement_type": "Registration", "details": "Must be registered in SAM.gov.", "is_mandatory": None},
+    {"requirement_type": "Experience", "details": "At least 5 years of federal cloud migrations", "is_mandatory": True}]}
+REPEATS = {
+    "issuing_agency": "Dept. of Health (amended)",
+    "submission_details": {"deadline_date": "September 15, 2024", "submission_method": "FedConnect"},
+    "formatting_requirements": {
+        "page_limits": [{"section": "technical proposals", "page_limit": 30}],
+        "required_sections": ["Tables of Contents", "Pricing Volume"]},
+    "eligibility_criteria": [
+        {"requirement_type": "registration", "details": "Offerors must be registered in SAM.gov", "is_mandatory": True}]}
+
+
+def merged(results_with_positions):
+    merger = IncrementalAnalysisMerger()
+    for result, position in results_with_positions:
+        merger.add(result, position)
+    return merger
+
+
+def test_normalize_text_drops_filler_and_plurals():
+    assert normalize_text("Offerors must be registered in SAM.gov.") == "registered in sam gov"
+    assert normalize_text("Tables of Contents") == normalize_text("Table of Content")
+    assert normalize_text(None) == ""
+
+
+def test_similar_uses_the_threshold():
+    assert similar("registered in sam gov", "registered in sam gov")
+    assert similar("at least 5 year federal cloud migration", "at least 5 year of federal cloud migration")
+    assert not similar("registered in sam gov", "5 year experience")
+    assert not similar("", "anything")
+
+
+def test_list_items_are_deduplicated_fuzzily():
+    result = merged([(FORMATTING, 0), (ELIGIBILITY, 1), (REPEATS, 2)]).result()
+    formatting = result["formatting_requirements"]
+    assert formatting["page_limits"] == [{"section": "Technical Proposal", "page_limit": 30}]
+    assert formatting["required_sections"] == ["Table of Contents", "Executive Summary", "Pricing Volume"]
+    assert [c["details"] for c in result["eligibility_criteria"]] == [
+        "Must be registered in SAM.gov.", "At least 5 years of federal cloud migrations"]
+
+
+def test_duplicate_fills_in_a_missing_mandatory_flag():
+    result = merged([(ELIGIBILITY, 1), (REPEATS, 2)]).result()
+    assert result["eligibility_criteria"][0]["is_mandatory"] is True
+
+
+def test_scalars_come_from_the_earliest_position_that_has_them():
+    result = merged([(REPEATS, 5), (COVER, 0)]).result()
+    assert result["issuing_agency"] == "Department of Health"
+    assert result["solicitation_number"] == "HHS-2024-007"
+    assert result["submission_details"] == {"deadline_date": "August 30, 2024", "deadline_time": None,
+                                            "submission_method": "FedConnect"}
+
+
+def test_result_does_not_depend_on_arrival_order():
+    packs = [(COVER, 0), (FORMATTING, 1), (ELIGIBILITY, 2), (REPEATS, 3)]
+    expected = merged(packs).result()
+    for order in itertools.permutations(packs):
+        assert merged(order).result() == expected
+
+
+def test_empty_sections_are_none_and_merged_count_tracks_adds():
+    merger = merged([({"eligibility_criteria": []}, 0), ({}, 1)])
+    assert merger.merged_count == 2
+    assert merger.result() == {"issuing_agency": None, "solicitation_number": None, "submission_details": None,
+                               "formatting_requirements": None, "eligibility_criteria": []}
+
+
+def eligibility(*details, requirement_type="Certification"):
+    return {"eligibility_criteria": [{"requirement_type": requirement_type, "details": d, "is_mandatory": True}
+                                     for d in details]}
+
+
+def test_identifier_tokens():
+    assert identifier_tokens("Attachment B, Volume II") == ("b", "ii")
+    assert identifier_tokens("$1,000,000 per occurrence") == ("1000000",)
+    assert identifier_tokens("A minimum of 5 years, e.g. in a U.S. agency") == ("5",)
+    assert identifier_tokens("Registered in SAM.gov") == ()
+
+
+def test_items_differing_only_in_identifiers_are_kept_apart():
+    iso = merged([(eligibility("ISO 9001 certified", "ISO 27001 certified", "ISO 27002 certified"), 0)]).result()
+    assert len(iso["eligibility_criteria"]) == 3
+    experience = merged([(eligibility("At least 3 years of experience", "At least 5 years of experience",
+                                      requirement_type="Experience"), 0)]).result()
+    assert len(experience["eligibility_criteria"]) == 2
+    insurance = merged([(eligibility("General liability insurance of $1,000,000",
+                                     "General liability insurance of $2,000,000", requirement_type="Insurance"), 0)]).result()
+    assert len(insurance["eligibility_criteria"]) == 2
+
+
+def test_lettered_and_numbered_sections_are_kept_apart():
+    sections = ["Attachment A", "Attachment B", "Attachment C", "Volume I", "Volume II"]
+    limits = [{"section": "Volume I", "page_limit": 20}, {"section": "Volume II", "page_limit": 20}]
+    result = merged([({"formatting_requirements": {"required_sections": sections, "page_limits": limits}}, 0)]).result()
+    assert result["formatting_requirements"]["required_sections"] == sections
+    assert result["formatting_requirements"]["page_limits"] == limits
+
+
+def test_identifiers_still_dedup_when_the_wording_differs():
+    result = merged([(eligibility("Must hold ISO 9001 certification"), 0),
+                     (eligibility("Offerors must hold ISO 9001 certifications"), 1)]).result()
+    assert len(result["eligibility_criteria"]) == 1
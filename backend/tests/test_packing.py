@@ -0,0 +1,50 @@
+from models.packing import GAP_MARKER, estimate_tokens, pack_segments, pack_text
+
+SECTIONS = ("identity", "submission", "formatting", "eligibility")
+TEXT = "".join(f"segment-{i:02d} " * 10 for i in range(10)) # 110 chars per segment
+SPANS = [(i * 110, (i + 1) * 110) for i in range(10)]
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("abcdefg", chars_per_token=3.0) == 3
+    assert estimate_tokens("", chars_per_token=3.0) == 0
+
+
+def test_pack_text_reads_overlap_once_and_marks_gaps():
+    text = "0123456789abcdefghij"
+    assert pack_text(text, [(0, 6), (4, 10)]) == "0123456789"
+    assert pack_text(text, [(0, 4), (4, 8)]) == "01234567"
+    assert pack_text(text, [(0, 3), (10, 13)]) == "012" + GAP_MARKER + "abc"
+
+
+def test_packs_consecutive_segments_up_to_the_budget():
+    routes = [("eligibility",)] * 10
+    packs = pack_segments(TEXT, SPANS, routes, lambda sections: 120, SECTIONS, chars_per_token=2.5)
+    # 110 chars at 2.5 chars/token = 44 tokens per segment: two fit in 120 tokens, three don't
+    assert [pack.indices for pack in packs] == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+    assert packs[0].text == TEXT[0:220]
+
+
+def test_unrouted_segments_are_skipped_and_sections_unioned_in_schema_order():
+    routes = [("submission",), (), ("eligibility",), ("identity",), ()]
+    packs = pack_segments(TEXT, SPANS[:5], routes, lambda sections: 10_000, SECTIONS)
+    assert len(packs) == 1
+    assert packs[0].indices == [0, 2, 3]
+    assert packs[0].sections == ("identity", "submission", "eligibility")
+    assert packs[0].text == TEXT[0:110] + GAP_MARKER + TEXT[220:440]
+
+
+def test_budget_depends_on_the_pack_sections():
+    routes = [("identity",), ("eligibility",)]
+    budget = lambda sections: 100 if "eligibility" in sections else 1_000
+    packs = pack_segments(TEXT, SPANS[:2], routes, budget, SECTIONS, chars_per_token=1.0)
+    assert [pack.sections for pack in packs] == [("identity",), ("eligibility",)]
+
+
+def test_an_oversized_segment_still_gets_its_own_pack():
+    packs = pack_segments(TEXT, SPANS[:3], [("formatting",)] * 3, lambda sections: 5, SECTIONS)
+    assert [pack.indices for pack in packs] == [[0], [1], [2]]
+
+
+def test_no_routed_segments_means_no_packs():
+    assert pack_segments(TEXT, SPANS[:3], [(), (), ()], lambda sections: 100, SECTIONS) == []
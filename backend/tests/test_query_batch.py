@@ -0,0 +1,77 @@
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("cohere")
+pytest.importorskip("chromadb")
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.fixtures import synthetic_rfp_pages
+from benchmarks.run import HashEmbeddings, configure_environment
+
+QUESTIONS = [
+    "What is the proposal submission deadline?",
+    "Who is the issuing agency?",
+    "What is the page limit for the technical proposal?",
+    "What insurance coverage is required?",
+    "How will proposals be evaluated?",
+]
+
+
+@pytest.fixture(scope="module")
+def rag():
+    server = FakeOllamaServer(token_latency_ms=0, prompt_ms_per_1k_chars=0).start()
+    # Each answer echoes its question, so answers can be matched back to the input order
+    server.response_tokens = lambda prompt: [re.search(r"Question: (.*)\n", prompt).group(1)]
+    configure_environment(Path(tempfile.mkdtemp(prefix="rfp-batch-")), server.base_url, "none")
+    os.environ["ANSWER_CACHE_THRESHOLD"] = "0.92" # The benchmark disables the cache; these tests use it
+    # rag builds its base system at import time; swap the model class in before that happens
+    import langchain_community.embeddings
+    langchain_community.embeddings.HuggingFaceEmbeddings = HashEmbeddings
+    import rag
+    yield rag
+    rag.job_manager.shutdown()
+    server.stop()
+
+
+@pytest.fixture
+def system(rag, tmp_path):
+    path = tmp_path / "rfp.txt"
+    path.write_text("\n\n".join("\n".join(lines) for lines in synthetic_rfp_pages(8, seed=4)))
+    system = rag.base_system.spawn()
+    system.load_single_document(str(path))
+    system.setup_retrievers()
+    system.setup_rag(invalidate_answers=True)
+    return system
+
+
+def test_answers_come_back_in_question_order(system):
+    results, timings = system.query_batch(QUESTIONS, max_concurrency=3)
+    assert [res["question"] for res in results] == QUESTIONS
+    assert [res["answer"].strip() for res in results] == QUESTIONS
+    assert all(res["sources"] and not res["cache_hit"] for res in results)
+    assert {"embedding_ms", "retrieval_ms", "generation_ms", "total_ms"} <= timings.keys()
+
+
+def test_a_failed_generation_is_reported_on_its_question_only(system, monkeypatch):
+    generate = system.generate_answer
+
+    def flaky_generate(question, docs):
+        if question == QUESTIONS[2]:
+            raise RuntimeError("model crashed")
+        return generate(question, docs)
+
+    monkeypatch.setattr(system, "generate_answer", flaky_generate)
+    results, _ = system.query_batch(QUESTIONS, max_concurrency=2)
+    assert results[2]["answer"] is None and results[2]["error"] == "model crashed"
+    assert all("error" not in res and res["answer"].strip() == res["question"]
+               for i, res in enumerate(results) if i != 2)
+
+    monkeypatch.setattr(system, "generate_answer", generate)
+    again, _ = system.query_batch(QUESTIONS)
+    # Successful answers were cached; the failed one was not and is generated this time
+    assert [res["cache_hit"] for res in again] == [True, True, False, True, True]
+    assert again[2]["answer"].strip() == QUESTIONS[2]
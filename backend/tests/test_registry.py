@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from bm25_index import SparseBM25Index
+from dense_index import DenseVectorIndex
+from registry import RAGRegistry, owned_memory_bytes
+
+MB = 1024 * 1024
+
+
+class FakeSystem:
+    """Stands in for HybridRAGSystem: just the state and hooks the registry touches."""
+
+    def __init__(self, doc_id=None, size=MB):
+        self.doc_id = doc_id
+        self.filename = f"{doc_id}.pdf" if doc_id else None
+        self.size = size
+        self.documents, self.splits, self.split_vectors, self.ingest_stats = [], [], None, None
+        self.spawned = []
+
+    def memory_bytes(self):
+        return self.size
+
+    def spawn(self):
+        child = FakeSystem(size=self.size)
+        self.spawned.append(child)
+        return child
+
+    def restore(self, doc_id, filename, documents, splits, vectors, ingest_stats):
+        self.doc_id, self.filename, self.documents, self.splits = doc_id, filename, documents, splits
+        self.split_vectors, self.ingest_stats = vectors, ingest_stats
+
+    def setup_retrievers(self):
+        pass
+
+    def setup_rag(self, invalidate_answers=True):
+        pass
+
+
+def loaded_system(doc_id, size=MB):
+    system = FakeSystem(doc_id, size)
+    system.splits = [f"{doc_id} split"]
+    system.split_vectors = np.ones((1, 4), dtype=np.float32)
+    return system
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return RAGRegistry(FakeSystem(), budget_bytes=2.5 * MB, spill_dir=str(tmp_path / "spill"))
+
+
+def test_least_recently_used_instance_is_spilled_and_rehydrated(registry):
+    for doc_id in ["a", "b"]:
+        registry.register(loaded_system(doc_id))
+    registry.get("a") # "b" is now least recently used
+    registry.register(loaded_system("c"))
+    assert [entry["doc_id"] for entry in registry.stats()["loaded"]] == ["a", "c"]
+    assert registry.evictions == 1
+
+    restored = registry.get("b")
+    assert restored.filename == "b.pdf"
+    assert restored.splits == ["b split"]
+    np.testing.assert_allclose(restored.split_vectors, np.ones((1, 4)))
+    assert registry.rehydrations == 1
+    assert registry.stats()["memory_bytes"] <= 2.5 * MB
+
+
+def test_concurrent_gets_rehydrate_once(registry):
+    registry.register(loaded_system("a", size=3 * MB))
+    registry.register(loaded_system("b", size=3 * MB)) # Spills "a"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.rehydrations == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_unknown_document_uses_the_fallback_loader(tmp_path):
+    states = {"x": {"filename": "x.pdf", "documents": [], "splits": ["x split"],
+                    "vectors": np.zeros((1, 4), dtype=np.float32)}}
+    registry = RAGRegistry(FakeSystem(), spill_dir=str(tmp_path), fallback_loader=states.get)
+    assert registry.get("x").splits == ["x split"]
+    assert registry.get("y") is None
+
+
+def test_resolve_scopes(registry):
+    assert registry.resolve() is None
+    registry.register(loaded_system("a"), session_id="s1")
+    registry.register(loaded_system("b"), session_id="s2")
+    assert registry.resolve(session_id="s1").doc_id == "a"
+    assert registry.resolve().doc_id == "b" # Latest upload
+    assert registry.resolve(["a"]).doc_id == "a"
+    assert registry.resolve(["a", "b"]) is registry.base
+    assert registry.resolve(["indexed-elsewhere"]) is registry.base
+
+
+def test_drop_forgets_sessions_and_spill(registry):
+    registry.register(loaded_system("a"), session_id="s1")
+    registry.register(loaded_system("b"), session_id="s2")
+    registry._spill(registry.get("b"))
+    registry.drop("b")
+    assert registry.session_doc("s2") is None
+    assert registry.default_doc_id == "a"
+    assert registry.get("b") is None
+
+
+def test_sessions_are_bounded(tmp_path):
+    registry = RAGRegistry(FakeSystem(), spill_dir=str(tmp_path), max_sessions=2)
+    system = loaded_system("a")
+    for session_id in ["s1", "s2", "s3"]:
+        registry.register(system, session_id=session_id)
+    assert registry.session_doc("s1") is None
+    assert registry.session_doc("s3") == "a"
+
+
+class OwnedMemorySystem(FakeSystem):
+    """Sized like HybridRAGSystem: only what the instance itself holds."""
+
+    def __init__(self, doc_id, lexical_index, chunks=20, chars=500):
+        super().__init__(doc_id)
+        self.documents = [Document(page_content="p" * chars * chunks)]
+        self.splits = [Document(page_content=f"{doc_id} word{i} " + "x" * chars) for i in range(chunks)]
+        self.split_vectors = np.ones((chunks, 64), dtype=np.float32)
+        self.dense_index = DenseVectorIndex.build(self.split_vectors, self.splits)
+        lexical_index.add_documents(doc_id, self.splits) # Shared across instances, like corpus.lexical_index
+
+    def memory_bytes(self):
+        return owned_memory_bytes(self.documents, self.splits, self.split_vectors, self.dense_index)
+
+
+def test_owned_memory_ignores_the_shared_lexical_index():
+    lexical_index = SparseBM25Index()
+    system = OwnedMemorySystem("a", lexical_index)
+    before = system.memory_bytes()
+    assert before == system.split_vectors.nbytes + 20 * 500 + sum(len(d.page_content) for d in system.splits)
+    OwnedMemorySystem("b", lexical_index) # Grows the shared index only
+    assert system.memory_bytes() == before
+
+
+def test_eviction_lowers_the_accounted_total(tmp_path):
+    lexical_index = SparseBM25Index()
+    systems = [OwnedMemorySystem(doc_id, lexical_index) for doc_id in "abc"]
+    size = systems[0].memory_bytes()
+    registry = RAGRegistry(FakeSystem(), budget_bytes=2.5 * size, spill_dir=str(tmp_path))
+    registry.register(systems[0])
+    registry.register(systems[1])
+    assert registry.stats()["memory_bytes"] == 2 * size
+    registry.register(systems[2])
+    stats = registry.stats()
+    assert registry.evictions == 1
+    assert stats["memory_bytes"] == 2 * size <= stats["budget_bytes"]
+    assert stats["memory_bytes"] == sum(entry["memory_bytes"] for entry in stats["loaded"])
@@ -0,0 +1,89 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import rerankers
+from rerankers import LocalCrossEncoderReranker, TimedCompressionRetriever, build_reranker, rerank_batch
+
+DOCS = [Document(page_content=f"chunk {i}", metadata={"chunk_id": str(i)}) for i in range(5)]
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, **kwargs):
+        self.pairs.extend(pairs)
+        # Higher chunk number = more relevant
+        return [float(text.split()[-1]) for _, text in pairs]
+
+
+class StaticRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        return list(DOCS)
+
+
+def contents(docs):
+    return [doc.page_content for doc in docs]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeCrossEncoder()
+    monkeypatch.setattr(rerankers, "load_cross_encoder", lambda name: fake)
+    return fake
+
+
+def test_reranks_by_score_and_caches_pairs(model):
+    reranker = LocalCrossEncoderReranker(top_n=2)
+    assert contents(reranker.compress_documents(DOCS, "q")) == ["chunk 4", "chunk 3"]
+    assert reranker.compress_documents(DOCS, "q")[0].metadata["relevance_score"] == 4.0
+    assert len(model.pairs) == 5 # Second call served from the score cache
+
+
+def test_compress_batch_scores_all_queries_together(model):
+    reranker = LocalCrossEncoderReranker(top_n=1)
+    results = reranker.compress_batch(["a", "b"], [DOCS[:2], DOCS[2:]])
+    assert [contents(r) for r in results] == [["chunk 1"], ["chunk 4"]]
+    assert len(model.pairs) == 5
+
+
+def test_falls_back_to_fused_order_when_the_model_cannot_load(monkeypatch, capsys):
+    attempts = []
+
+    def unavailable(name):
+        attempts.append(name)
+        raise OSError("no network")
+
+    monkeypatch.setattr(rerankers, "load_cross_encoder", unavailable)
+    reranker = LocalCrossEncoderReranker(top_n=3)
+    assert contents(reranker.compress_documents(DOCS, "q")) == ["chunk 0", "chunk 1", "chunk 2"]
+    assert [contents(r) for r in reranker.compress_batch(["a"], [DOCS[::-1]])] == [["chunk 4", "chunk 3", "chunk 2"]]
+    assert len(attempts) == 1
+    assert capsys.readouterr().out.count("Warning") == 1
+
+
+def test_falls_back_when_scoring_fails(monkeypatch):
+    class Broken:
+        def predict(self, pairs, **kwargs):
+            raise RuntimeError("bad batch")
+
+    monkeypatch.setattr(rerankers, "load_cross_encoder", lambda name: Broken())
+    assert contents(LocalCrossEncoderReranker(top_n=2).compress_documents(DOCS, "q")) == ["chunk 0", "chunk 1"]
+
+
+def test_local_reranker_plugs_into_the_compression_retriever(model):
+    retriever = TimedCompressionRetriever(base_compressor=LocalCrossEncoderReranker(top_n=2),
+                                          base_retriever=StaticRetriever())
+    assert contents(retriever.invoke("q")) == ["chunk 4", "chunk 3"]
+
+
+def test_rerank_batch_without_a_reranker_passes_candidates_through():
+    assert rerank_batch(None, ["q"], [DOCS]) == [DOCS]
+
+
+def test_build_reranker_backends():
+    assert build_reranker(None, backend="none") is None
+    assert build_reranker(None, backend="cohere") is None
+    assert isinstance(build_reranker(None, backend="auto"), LocalCrossEncoderReranker)
+    assert isinstance(build_reranker(None, backend="local", top_n=7), LocalCrossEncoderReranker)
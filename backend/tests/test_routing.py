@@ -0,0 +1,100 @@
+from langchain_core.embeddings import Embeddings
+
+from models.routing import SECTION_PROTOTYPES, detect_sections, route_chunks, routing_fingerprint
+
+SECTIONS = list(SECTION_PROTOTYPES)
+FILLER = "General background on the program and its goals."
+
+
+class FakeEmbeddings(Embeddings):
+    """Prototypes are one-hot per section; chunks embed to whatever `chunk_vectors` says (else neutral)."""
+
+    model_name = "fake-model"
+
+    def __init__(self, chunk_vectors=None):
+        self.chunk_vectors = chunk_vectors or {}
+
+    def _vector(self, text):
+        if text in SECTION_PROTOTYPES.values():
+            return [1.0 if SECTION_PROTOTYPES[s] == text else 0.0 for s in SECTIONS] + [0.0]
+        return self.chunk_vectors.get(text, [0.0] * len(SECTIONS) + [1.0])
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def toward(section, strength):
+    """A chunk vector with cosine `strength` to `section`'s prototype."""
+    return [strength if s == section else 0.0 for s in SECTIONS] + [(1 - strength ** 2) ** 0.5]
+
+
+def test_detectors_count_distinct_matches():
+    hits = detect_sections("Proposals are due by March 3, 2025 at 2:00 PM. The deadline is firm. 12-point Arial font.")
+    assert hits["submission"] >= 3
+    assert hits["formatting"] >= 2
+    assert "eligibility" not in hits
+    assert detect_sections("Page 3 of 40") == {}
+
+
+def test_keywords_only_without_embeddings():
+    chunks = [FILLER, "Offerors must be registered in SAM.gov.", "Another paragraph of background."]
+    assert route_chunks(chunks) == [("identity",), ("eligibility",), ()]
+
+
+def test_first_chunk_always_gets_identity():
+    assert route_chunks(["Font must be 12 point."])[0] == ("identity", "formatting")
+    assert route_chunks([]) == []
+
+
+def test_similarity_adds_sections_the_regexes_miss():
+    paraphrase = "Offers received after the stated cut-off will not be opened."
+    embeddings = FakeEmbeddings({paraphrase: toward("submission", 0.8)})
+    assert route_chunks([FILLER, paraphrase], embeddings, threshold=0.35)[1] == ("submission",)
+    assert route_chunks([FILLER, paraphrase], embeddings, threshold=0.9)[1] == ()
+
+
+def test_cap_applies_to_similarity_only_matches():
+    similar = [f"Paraphrased timing clause {i}." for i in range(5)]
+    embeddings = FakeEmbeddings({text: toward("submission", 0.5 + i / 10) for i, text in enumerate(similar)})
+    routes = route_chunks([FILLER] + similar, embeddings, threshold=0.35, max_chunks_per_section=2)
+    kept = [text for text, sections in zip([FILLER] + similar, routes) if "submission" in sections]
+    assert kept == similar[-2:] # The two most similar
+
+
+def test_keyword_matches_are_never_capped():
+    # An amended deadline late in the document must survive even when many chunks match by similarity
+    keyword = [f"Amendment {i}: proposals are due no later than June {i + 1}, 2025." for i in range(4)]
+    similar = [f"Paraphrased timing clause {i}." for i in range(3)]
+    embeddings = FakeEmbeddings({text: toward("submission", 0.9) for text in similar})
+    chunks = [FILLER] + similar + keyword
+    routes = route_chunks(chunks, embeddings, threshold=0.35, max_chunks_per_section=1)
+    assert all("submission" in sections for sections in routes[-len(keyword):])
+    assert sum("submission" in sections for sections in routes[1:1 + len(similar)]) == 1
+
+
+def test_multi_valued_sections_are_not_capped():
+    similar = [f"Qualification clause {i}." for i in range(4)]
+    embeddings = FakeEmbeddings({text: toward("eligibility", 0.7) for text in similar})
+    routes = route_chunks([FILLER] + similar, embeddings, max_chunks_per_section=1)
+    assert all(sections == ("eligibility",) for sections in routes[1:])
+
+
+def test_embedding_failure_falls_back_to_keywords():
+    class Broken(Embeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("model unavailable")
+
+        def embed_query(self, text):
+            raise RuntimeError("model unavailable")
+
+    assert route_chunks([FILLER, "Font must be Arial."], Broken()) == [("identity",), ("formatting",)]
+
+
+def test_fingerprint_distinguishes_routing_modes():
+    keywords = routing_fingerprint(None)
+    assert "keywords" in keywords
+    assert routing_fingerprint(FakeEmbeddings()) != keywords
+    assert "fake-model" in routing_fingerprint(FakeEmbeddings())
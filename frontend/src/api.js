@@ -4,11 +4,29 @@ const api = axios.create({
   baseURL: 'http://localhost:8000',
 });
 
+// Identifies this browser tab to the backend, which answers its queries from the document it uploaded
+export const SESSION_ID = window.crypto?.randomUUID?.() ?? `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+export const waitForJob = async (jobId, intervalMs = 1000) => {
+  while (true) {
+    const { data: job } = await api.get(`/jobs/${jobId}`);
+    console.log('[Frontend] Job status:', job.stage, job.progress);  // Debug log
+    if (job.status === 'done') {
+      return { message: 'File uploaded and RAG system ready', ...job.result };
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Document processing failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
 export const uploadFile = async (file) => {
   console.log('[Frontend] Uploading file:', file.name);  // Debug log
   
   const formData = new FormData();
   formData.append('file', file);
+  formData.append('session_id', SESSION_ID);
   
   try {
     const response = await api.post('/upload', formData, {
@@ -17,7 +35,8 @@ export const uploadFile = async (file) => {
       },
     });
     console.log('[Frontend] Upload response:', response.data);  // Debug log
-    return response.data;
+    // Ingestion runs as a background job; wait until the new document is active
+    return await waitForJob(response.data.job_id);
   } catch (error) {
     console.error('[Frontend] Upload error:', error);
     throw error;
@@ -29,6 +48,7 @@ export const queryDocument = async (question) => {
   
   const formData = new FormData();
   formData.append('question', question);
+  formData.append('session_id', SESSION_ID);
   
   try {
     const response = await api.post('/query', formData);
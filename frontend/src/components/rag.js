@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from 'react';
 import { FiUploadCloud, FiHelpCircle, FiCheckCircle, FiAlertTriangle, FiLoader, FiDatabase, FiTerminal, FiFileText, FiZap, FiCpu, FiClipboard, FiCalendar, FiPaperclip, FiCheckSquare, FiAlertCircle } from 'react-icons/fi';
+import { SESSION_ID } from '../api';
 
 // Minimalist Icon Components (Keep if preferred)
 const UploadIcon = () => <svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4M7 10l5 5 5-5M12 15V3"/></svg>;
@@ -150,16 +151,39 @@ export default function RAGInterface({
       setLogMessages(prev => [...prev, `REQ :: /analyze-rfp-details`]);
 
       try {
-          const response = await fetch('http://localhost:8000/analyze-rfp-details');
+          // Server-Sent Events: `partial` after each chunk (shown as it fills in), then `done` or `error`
+          const response = await fetch(`http://localhost:8000/analyze-rfp-details/stream?session_id=${encodeURIComponent(SESSION_ID)}`);
           if (!response.ok) {
               const errorData = await response.json();
               throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
           }
-          const data = await response.json();
-          if (data.error) {
-            throw new Error(data.error);
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          let finished = false;
+          while (!finished) {
+              const { value, done } = await reader.read();
+              if (done) break;
+              buffer += decoder.decode(value, { stream: true });
+              let boundary;
+              while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                  const block = buffer.slice(0, boundary);
+                  buffer = buffer.slice(boundary + 2);
+                  const event = block.match(/^event: (.*)$/m)?.[1];
+                  const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? 'null');
+                  if (event === 'partial') {
+                      setAnalysisResults(data.analysis);
+                  } else if (event === 'done') {
+                      setAnalysisResults(data);
+                      finished = true;
+                  } else if (event === 'error') {
+                      throw new Error(data.detail);
+                  }
+              }
+          }
+          if (!finished) {
+              throw new Error('Analysis stream ended before the result arrived.');
           }
-          setAnalysisResults(data);
       } catch (err) {
           console.error("RFP Analysis Fetch Error:", err);
           setAnalysisError(err.message || "Failed to fetch analysis details.");
@@ -291,7 +315,7 @@ export default function RAGInterface({
                          <span className="text-xs font-semibold">{analysisError}</span>
                        </div>
                      )}
-                     {!analysisError && analysisResults && !analysisLoading && (
+                     {!analysisError && analysisResults && (
                        <div className="space-y-5 text-xs">
                           <div>
                               <InfoItem label="Issuing Agency" value={analysisResults.issuing_agency} />